@@ -1,6 +1,4 @@
 import utils, quant_nest
-import pandas as pd
-import utils
 
 # 载入pd配置文件
 utils.load_pd_config()
@@ -8,31 +6,47 @@ utils.load_pd_config()
 # 载入期货商品配置文件，f表示future
 f_cfg = utils.load_future_config()
 
-# 导入期货商品数据
-df = pd.read_parquet(fr"../db_pq/latest/{f_cfg['commodity']}.parquet")
+# 记录每一步的耗时、内存和数据规模，配置在 future.toml 的 [instrument]
+recorder = utils.StageRecorder('back_test')
 
-# 计算 MA ,bias , MA = [5,10,20,30,60,120,250]
-df_ma_bias = utils.calc_ma_bias(df, f_cfg['date_start'], f_cfg['date_end'])
+# 结果缓存：源数据、策略代码和参数、future.toml 都没有变化时，直接读取上次的资金曲线和评价结果，配置在 [result_cache]
+cache = utils.ResultCache()
+key = utils.result_key(f_cfg['commodity'], quant_nest.s01_signal, f_cfg)
+cached = recorder.run('result_cache', cache.get, key)
+if cached is not None:
+    df_equity, df_evaluate = cached
+else:
+    # 列式回测上下文：K线和 MA ,bias 是指标缓存（../db_pq/features，内存映射）上的视图，只载入策略声明的列，不拷贝
+    # 之后每一步只在上下文里追加自己的输出列，不再每一步复制整张DataFrame
+    # 低内存模式（future.toml 的 low_memory）字符串列为category，价格无损降为float32，资金曲线不生成明细列
+    low_memory = f_cfg['low_memory']
+    ctx = recorder.run('load_context', utils.load_context, f_cfg['commodity'], f_cfg['date_start'], f_cfg['date_end'],
+                       columns=utils.strategy_columns(quant_nest.s01_signal), compact=low_memory, adjust=f_cfg['adjust'])
 
-# ['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量', '涨跌幅', 'MA5', 'bias5', 'MA10', 'bias10', 'MA20', 'bias20', 'MA30', 'bias30', 'MA60', 'bias60', 'MA120', 'bias120', 'MA250', 'bias250']
-# print(df_ma_bias.columns)
+    # ['交易日期', '开盘价', '最高价', '最低价', '收盘价', 'MA60']
+    # print(ctx.names)
 
-# ************* 最重要！核心！ 运行策略，计算开平仓信号  *******************
-df_signal = quant_nest.s01(df_ma_bias)
-# ['交易日期', '开盘价', 't_signal', 'signal']
-# print(df_signal.columns)
-# *********************************************************************
+    # ************* 最重要！核心！ 运行策略，计算开平仓信号  *******************
+    recorder.run('strategy', utils.run_stage, ctx, utils.signal_stage, strategy=quant_nest.s01_signal)
+    # *********************************************************************
 
-# 增加pos列，表示持仓情况。 用三元表达式判断交易模式
-df_pos = (utils.next(df_signal) if f_cfg['trade_mode'] == 'NEXT' else utils.instant(df_signal))
-# ['交易日期', '开盘价', 't_signal', 'signal', 'position']
-# print(df_pos.columns)
+    # 增加 position_side 列，表示持仓情况
+    recorder.run('position', utils.run_stage, ctx, utils.position_stage, trade_mode=f_cfg['trade_mode'])
 
-# 计算账户净值曲线
-df_equity = utils.equity_curve(df_pos, f_cfg)
+    # 计算账户净值曲线
+    recorder.run('equity_curve', utils.run_stage, ctx, utils.equity_stage, cfg=f_cfg, detail=not low_memory)
 
-# 评价策略
-df_evaluate = utils.evaluate_strategy(df_equity)
+    # 评价策略
+    df_evaluate = recorder.run('evaluate', utils.evaluate_context, ctx)
+
+    # 只有要存进结果缓存时才把资金曲线拼成DataFrame（列名和 equity_curve 的结果相同），缓存关闭时不拷贝
+    if cache.enabled:
+        df_equity = utils.equity_frame(ctx, detail=not low_memory)
+        cache.put(key, (df_equity, df_evaluate))
 
 print(df_evaluate.T)
 # utils.myprint(df_evaluate.T)
+
+# 每一步的耗时和内存
+print(recorder.report())
+print(f"报告已保存：{recorder.save()}")
@@ -0,0 +1,31 @@
+import utils, quant_nest, sys, tomllib
+
+# 回测流程的基准测试：用合成K线分别测量每一步的耗时和内存，以及parquet读写，结果保存为json
+# 用法：python main_benchmark.py                 运行并保存结果
+#       python main_benchmark.py 基准结果.json    运行后和基准结果比较，有步骤变慢时返回码为1
+#       python main_benchmark.py 旧.json 新.json  只比较两个已有的结果
+if __name__ == "__main__":
+    # 载入pd配置文件
+    utils.load_pd_config()
+
+    with open("./utils/benchmark.toml", "rb") as f:
+        b_cfg = tomllib.load(f)["benchmark"]
+
+    if len(sys.argv) == 3:
+        base_path, new_path = sys.argv[1], sys.argv[2]
+    else:
+        # 回测参数用 future.toml 的配置，数据是合成的
+        f_cfg = utils.load_future_config()
+        pq_cfg = utils.load_writer_options()
+        print(f"{'K线数':>10} {'步骤':<20} {'耗时':>11} {'CPU时间':>11} {'内存峰值':>12} {'arrow内存':>11}")
+        results = utils.run_benchmark(b_cfg['sizes'], f_cfg, pq_cfg, quant_nest.s01, b_cfg['repeat'], b_cfg['output'])
+        new_path = utils.save_results(results, b_cfg['output'])
+        print(f"结果已保存：{new_path}")
+        base_path = sys.argv[1] if len(sys.argv) == 2 else None
+
+    if base_path is not None:
+        df = utils.compare_results(base_path, new_path, b_cfg['threshold'])
+        print(df)
+        if df['regression'].any():
+            print(f"❌ 有步骤比基准结果慢或内存增加超过{b_cfg['threshold']:.0%}")
+            sys.exit(1)
@@ -0,0 +1,26 @@
+import utils, quant_nest as qn
+import pandas as pd
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future
+f_cfg = utils.load_future_config()
+
+# 多个策略写成表达式，编译成一张计算图：收盘价的移位、各条均线、上穿下穿的比较在所有策略间共用，只算一次
+strategies = {f's01_{n}': qn.s01_expr(n) for n in [20, 60, 120]}
+strategies['bias20'] = qn.signal(long=qn.bias(20) < -0.05, short=qn.bias(20) > 0.05)
+strategies['ma5_ma20'] = qn.signal(long=qn.cross_up(qn.ma(5), qn.ma(20)), short=qn.cross_down(qn.ma(5), qn.ma(20)))
+graph = qn.compile_strategies(strategies)
+
+# 只载入计算图用到的列
+df = utils.load_ma_bias(f_cfg['commodity'], f_cfg['date_start'], f_cfg['date_end'], columns=graph.inputs + ['开盘价', '最高价', '最低价'])
+df_signal = graph.evaluate(df)
+
+# 所有策略的信号一起计算持仓、资金曲线和评价，每个策略一行
+signal = df_signal[list(strategies)].to_numpy()
+res = utils.equity_2d(utils.position_2d(signal, f_cfg['trade_mode']), df['开盘价'], df['最高价'], df['最低价'], df['收盘价'], f_cfg)
+equity, position_side = res['equity_curve'], res['position_side']
+df_evaluate = utils.evaluate_2d(df['交易日期'], equity, position_side)
+df_evaluate.index = pd.Index(list(strategies), name='策略')
+print(df_evaluate)
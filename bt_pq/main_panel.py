@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import utils
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future
+f_cfg = utils.load_future_config()
+
+# 所有品种对齐到共同的交易日历，保存在 ../db_pq/panel；数据库更新后再运行，只重新读取有变化的品种
+panel = utils.build_panel()
+
+# 截面动量：20日涨幅在所有品种之间的排名和标准化，直接在面板数组上计算
+window = panel.window(f_cfg['date_start'], f_cfg['date_end'])
+close = panel.field('收盘价')[:, window]
+momentum = np.full(close.shape, np.nan)
+momentum[:, 20:] = close[:, 20:] / close[:, :-20] - 1
+rank, zscore = utils.cs_rank(momentum), utils.cs_zscore(momentum)
+
+# 最后一个交易日的动量排名
+df = pd.DataFrame({'20日涨幅': momentum[:, -1], '截面排名': rank[:, -1], '截面标准分': zscore[:, -1]}, index=pd.Index(panel.symbols, name='品种'))
+print(f"交易日期：{panel.dates[window][-1]}")
+print(df.dropna().sort_values('截面排名', ascending=False))
@@ -0,0 +1,20 @@
+import utils, quant_nest
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future
+f_cfg = utils.load_future_config()
+
+# 参数网格：均线长度 n = 5 ~ 250
+grid = {'n': range(5, 251)}
+
+# 导入期货商品全部历史K线和网格里所有长度的均线，均线从指标缓存读取，只有第一次运行时计算
+df = utils.load_ma_bias(f_cfg['commodity'], ma_list=list(grid['n']))
+
+# 整个网格一次性计算信号、持仓、资金曲线，每组参数一行评价结果
+# 每组参数再做一次蒙特卡洛稳健性分析（future.toml 的 [robustness]），看最好的参数是不是靠运气
+df_sweep = utils.param_sweep(df, f_cfg, quant_nest.s01_grid, grid, robust=utils.load_robustness_config())
+
+# 按 年化收益/回撤比 排序，看最好的参数
+print(df_sweep.sort_values(by='年化收益/回撤比', ascending=False).head(20))
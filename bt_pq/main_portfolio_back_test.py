@@ -0,0 +1,24 @@
+import utils, quant_nest
+from functools import partial
+
+# 多进程回测所有品种，子进程会重新导入本文件，所以主流程必须放在 __main__ 里面
+if __name__ == "__main__":
+    # 载入pd配置文件
+    utils.load_pd_config()
+
+    # 载入期货商品配置文件（公共参数），以及每个品种的单独配置
+    f_cfg = utils.load_future_config()
+    s_cfg = utils.load_symbol_config()
+
+    # 策略及其参数，partial 可以被 pickle 传到子进程
+    strategy = partial(quant_nest.s01, n=60)
+
+    # 回测数据集里的所有品种；数据、策略和配置都没有变化的品种直接读取结果缓存
+    df_portfolio, df_symbols, df_curves = utils.portfolio_back_test(f_cfg, s_cfg, strategy, cache=utils.ResultCache())
+
+    # 每个品种的评价结果
+    print(df_symbols)
+
+    # 评价组合资金曲线
+    df_evaluate = utils.evaluate_strategy(df_portfolio)
+    print(df_evaluate.T)
@@ -0,0 +1,6 @@
+import utils
+
+# 从 db_pq 的1分钟K线数据集合成 5/15/30/60 分钟K线，缓存在 ../db_pq/resampled 下
+# 已有缓存且分钟数据没有更新的品种直接跳过；回测时用 utils.load_resampled(品种, 分钟数) 读取
+n = utils.build_resampled()
+print(f"{n}个品种的 {utils.RESAMPLE_MINUTES} 分钟K线已生成")
@@ -0,0 +1,18 @@
+import utils, quant_nest
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future；蒙特卡洛模拟的配置在 future.toml 的 [robustness]
+f_cfg = utils.load_future_config()
+r_cfg = utils.load_robustness_config()
+
+# 和 main_back_test 相同的回测流程
+df_ma_bias = utils.load_ma_bias(f_cfg['commodity'], f_cfg['date_start'], f_cfg['date_end'])
+df_signal = quant_nest.s01(df_ma_bias)
+df_pos = utils.next(df_signal) if f_cfg['trade_mode'] == 'NEXT' else utils.instant(df_signal)
+df_equity = utils.equity_curve(df_pos, f_cfg)
+
+# 回测本身只是一条资金曲线；把每笔交易的收益率重新抽样，看最终净值和最大回撤的分布
+print(utils.evaluate_strategy(df_equity).T)
+print(utils.robustness(df_equity, **r_cfg).T)
@@ -0,0 +1,16 @@
+import utils, quant_nest
+
+# 常驻回测服务：启动时载入配置和所有品种的K线、指标，之后的回测请求不再重复导入、解码
+#   utils.request_back_test({'symbol': '螺纹钢主连', 'strategy': 's01', 'params': {'n': 20},
+#                            'config': {'date_start': '2020-01-01', 'slippage': 2}})
+# 数据库更新后发送 utils.request_back_test({}, path='/refresh')，只重新读取有变化的品种
+utils.load_pd_config()
+
+f_cfg = utils.load_future_config()
+s_cfg = utils.load_symbol_config()
+server_cfg = utils.load_server_config()
+
+backtest = utils.BacktestServer(f_cfg, {'s01': quant_nest.s01}, s_cfg)
+if server_cfg['preload']:
+    print(f"已载入{backtest.preload()}个品种")
+utils.serve(backtest, server_cfg['host'], server_cfg['port'])
@@ -0,0 +1,21 @@
+import utils, quant_nest, os
+from functools import partial
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future
+f_cfg = utils.load_future_config()
+
+# 逐根K线版本的策略，参数和 main_back_test 里的 s01 相同
+strategy = partial(quant_nest.s01_step, n=60)
+
+# 引擎状态保存在检查点文件里：第一次运行用数据库里的全部历史K线预热，
+# 之后每次只读取检查点之后的新K线，每根K线的均线、信号、持仓都是 O(1) 更新
+checkpoint_path = os.path.join('./checkpoint', f"{f_cfg['commodity']}_s01.json")
+engine, rows = utils.catch_up(f_cfg['commodity'], strategy, f_cfg['trade_mode'], checkpoint_path)
+
+print(f"{f_cfg['commodity']} 新处理K线{len(rows)}根，最后一根K线：{engine.last_time}")
+if rows:
+    last = rows[-1]
+    print(f"收盘价 {last['收盘价']}  MA60 {last['MA60']:.2f}  信号 {last['signal']}  持仓方向 {last['position_side']}")
@@ -0,0 +1,27 @@
+import os
+import time
+import utils, quant_nest
+
+# 载入pd配置文件
+utils.load_pd_config()
+
+# 载入期货商品配置文件，f表示future
+f_cfg = utils.load_future_config()
+
+# 和 main_back_test 相同的回测流程，交易明细保存在 report 文件夹
+df_ma_bias = utils.load_ma_bias(f_cfg['commodity'], f_cfg['date_start'], f_cfg['date_end'])
+df_signal = quant_nest.s01(df_ma_bias)
+df_pos = utils.next(df_signal) if f_cfg['trade_mode'] == 'NEXT' else utils.instant(df_signal)
+df_equity = utils.equity_curve(df_pos, f_cfg)
+
+df_ledger = utils.trade_ledger(df_equity, f_cfg)
+print(df_ledger)
+utils.write_ledger(df_ledger, os.path.join('report', f"ledger-{f_cfg['commodity']}.parquet"))
+
+# 整个参数网格的交易明细：均线长度 n = 5 ~ 250，“列”对应 param_sweep 结果的行号
+grid = {'n': range(5, 251)}
+df = utils.load_ma_bias(f_cfg['commodity'], ma_list=list(grid['n']))
+t = time.perf_counter()
+df_sweep_ledger = utils.param_ledger(df, f_cfg, quant_nest.s01_grid, grid)
+print(f"{len(grid['n'])}组参数，{len(df_sweep_ledger)}笔交易，耗时{time.perf_counter() - t:.2f}秒")
+utils.write_ledger(df_sweep_ledger, os.path.join('report', f"ledger-{f_cfg['commodity']}-sweep.parquet"))
@@ -0,0 +1,27 @@
+import utils, quant_nest
+
+# 多进程计算每个窗口，子进程会重新导入本文件，所以主流程必须放在 __main__ 里面
+if __name__ == "__main__":
+    # 载入pd配置文件
+    utils.load_pd_config()
+
+    # 载入期货商品配置文件，以及滚动样本外测试的窗口配置
+    f_cfg = utils.load_future_config()
+    wf_cfg = utils.load_walk_forward_config()
+
+    # 参数网格：均线长度 n = 5 ~ 250
+    grid = {'n': range(5, 251)}
+
+    # 全部历史K线和网格里所有长度的均线，只把价格和均线放进共享内存
+    df = utils.load_ma_bias(f_cfg['commodity'], ma_list=list(grid['n']))
+    columns = ['开盘价', '最高价', '最低价', '收盘价'] + [f'MA{n}' for n in grid['n']]
+
+    # 每个训练窗口选参数，随后的测试窗口回测，测试窗口的资金曲线拼接成样本外资金曲线
+    df_oos, df_windows = utils.walk_forward(df, f_cfg, wf_cfg, quant_nest.s01_grid, grid, columns)
+
+    # 每个窗口选出的参数和训练、测试结果
+    print(df_windows)
+
+    # 评价样本外资金曲线
+    df_evaluate = utils.evaluate_strategy(df_oos)
+    print(df_evaluate.T)
@@ -1 +1,2 @@
 from .s01 import *
+from .expr import *
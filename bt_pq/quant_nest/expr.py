@@ -0,0 +1,189 @@
+# 声明式策略：用表达式描述信号，多个策略编译成一张计算图，相同的子表达式只计算一次
+#   close = col('收盘价')
+#   strategies = {'s01_60': signal(long=cross_up(close, ma(60)), short=cross_down(close, ma(60))),
+#                 'bias_20': signal(long=bias(20) < -0.05, short=bias(20) > 0.05)}
+#   df_signal = compile_strategies(strategies).evaluate(df_ma_bias)
+# 表达式按结构判断是否相同：两个策略里的 ma(60)、close.shift(1) 是同一个节点
+import numpy as np
+import pandas as pd
+
+
+class Expr:
+    def __init__(self, op: str, *args):
+        self.op = op
+        self.args = args
+        # 节点的结构，用作缓存的键
+        self.key = (op, *[a.key if isinstance(a, Expr) else a for a in args])
+
+    def shift(self, n: int = 1):
+        return Expr('shift', self, int(n))
+
+    def __gt__(self, other):
+        return Expr('>', self, _wrap(other))
+
+    def __ge__(self, other):
+        return Expr('>=', self, _wrap(other))
+
+    def __lt__(self, other):
+        return Expr('<', self, _wrap(other))
+
+    def __le__(self, other):
+        return Expr('<=', self, _wrap(other))
+
+    def __and__(self, other):
+        return Expr('&', self, _wrap(other))
+
+    def __or__(self, other):
+        return Expr('|', self, _wrap(other))
+
+    def __invert__(self):
+        return Expr('~', self)
+
+    def __add__(self, other):
+        return Expr('+', self, _wrap(other))
+
+    def __sub__(self, other):
+        return Expr('-', self, _wrap(other))
+
+    def __mul__(self, other):
+        return Expr('*', self, _wrap(other))
+
+    def __truediv__(self, other):
+        return Expr('/', self, _wrap(other))
+
+    def __repr__(self):
+        return f"Expr{self.key}"
+
+
+def _wrap(value):
+    return value if isinstance(value, Expr) else Expr('const', float(value))
+
+
+# K线里的一列
+def col(name: str) -> Expr:
+    return Expr('col', name)
+
+
+# n日均线：K线里有 MA{n} 列（load_ma_bias 的结果）时直接使用，否则用收盘价计算，和 calc_ma_bias 相同
+def ma(n: int) -> Expr:
+    return Expr('ma', int(n))
+
+
+# n日乖离率：有 bias{n} 列时直接使用，否则按 calc_ma_bias 的公式 (收盘价 - MA) / MA 计算
+def bias(n: int) -> Expr:
+    return Expr('bias', int(n), ma(n))
+
+
+# 上穿：本根K线 a >= b，上一根 a < b
+def cross_up(a: Expr, b) -> Expr:
+    b = _wrap(b)
+    return (a >= b) & (a.shift(1) < b.shift(1))
+
+
+# 下穿：本根K线 a <= b，上一根 a > b
+def cross_down(a: Expr, b) -> Expr:
+    b = _wrap(b)
+    return (a <= b) & (a.shift(1) > b.shift(1))
+
+
+# 信号：long 成立为1（做多），short 成立为-1（做空），都成立时取-1，其余为NaN，和 s01 的 signal 列相同
+def signal(long: Expr = None, short: Expr = None) -> Expr:
+    return Expr('signal', long, short)
+
+
+def _shift(a: np.ndarray, n: int) -> np.ndarray:
+    if np.ndim(a) == 0:  # 常数
+        return a
+    out = np.full_like(a, False if a.dtype == bool else np.nan)
+    if n > 0:
+        out[n:] = a[:-n]
+    elif n < 0:
+        out[:n] = a[-n:]
+    else:
+        out[:] = a
+    return out
+
+
+_BINARY = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+    '&': np.logical_and, '|': np.logical_or,
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+}
+
+
+# 编译好的计算图：nodes 是按依赖顺序排好的不重复节点，每个节点只计算一次
+class StrategyGraph:
+    def __init__(self, strategies: dict):
+        self.strategies = strategies
+        self.nodes = []
+        seen = set()
+
+        def visit(expr):
+            if not isinstance(expr, Expr) or expr.key in seen:
+                return
+            for arg in expr.args:
+                visit(arg)
+            seen.add(expr.key)
+            self.nodes.append(expr)
+
+        for expr in strategies.values():
+            visit(expr)
+
+    # 计算需要的K线列，低内存模式下可以只载入这些列
+    @property
+    def inputs(self) -> list:
+        names = ['交易日期']
+        for node in self.nodes:
+            if node.op == 'col':
+                names.append(node.args[0])
+            elif node.op == 'ma':
+                names += ['收盘价', f'MA{node.args[0]}']
+            elif node.op == 'bias':
+                names.append(f'bias{node.args[0]}')
+        return list(dict.fromkeys(names))
+
+    def _node(self, node: Expr, df: pd.DataFrame, values: dict) -> np.ndarray:
+        op, args = node.op, node.args
+        arg = [values[a.key] if isinstance(a, Expr) else a for a in args]
+        if op == 'const':
+            return np.float64(args[0])
+        if op == 'col':
+            return df[args[0]].to_numpy(dtype='float64')
+        if op == 'ma':
+            if f'MA{args[0]}' in df:
+                return df[f'MA{args[0]}'].to_numpy(dtype='float64')
+            return df['收盘价'].astype('float64').rolling(args[0]).mean().to_numpy()
+        if op == 'bias':
+            if f'bias{args[0]}' in df:
+                return df[f'bias{args[0]}'].to_numpy(dtype='float64')
+            close, m = df['收盘价'].to_numpy(dtype='float64'), arg[1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return (close - m) / m
+        if op == 'shift':
+            return _shift(arg[0], arg[1])
+        if op == '~':
+            return np.logical_not(arg[0])
+        if op == 'signal':
+            out = np.full(len(df), np.nan)
+            if arg[0] is not None:
+                out[arg[0]] = 1
+            if arg[1] is not None:
+                out[arg[1]] = -1
+            return out
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return _BINARY[op](arg[0], arg[1])
+
+    # 计算所有策略的信号，返回 交易日期 + 每个策略一列信号
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        values = {}
+        for node in self.nodes:
+            values[node.key] = self._node(node, df, values)
+        columns = {'交易日期': df['交易日期'].to_numpy()}
+        for name, expr in self.strategies.items():
+            columns[name] = values[expr.key]
+        return pd.DataFrame(columns, index=df.index)
+
+
+# 把一组策略 {名称: signal(...)} 编译成一张计算图
+def compile_strategies(strategies: dict) -> StrategyGraph:
+    return StrategyGraph(strategies)
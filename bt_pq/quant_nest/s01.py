@@ -1,5 +1,8 @@
 # 60日单均线策略，上穿买入，下穿卖出
+import numpy as np
 import pandas as pd
+from utils.vectorized import shift_2d
+from .expr import Expr, col, ma, signal, cross_up, cross_down
 
 
 def s01(df: pd.DataFrame, n=60):
@@ -29,3 +32,70 @@ def s01(df: pd.DataFrame, n=60):
     columns = ['交易日期', '开盘价', '收盘价', '最高价', '最低价', 't_signal', 'signal']
 
     return df[columns].copy()
+
+
+# s01 用到的输入列，低内存模式下只载入这些列（见 utils.strategy_columns）
+def s01_inputs(n=60) -> list:
+    return ['交易日期', '开盘价', '最高价', '最低价', '收盘价', f'MA{n}']
+
+
+s01.inputs = s01_inputs
+
+
+# s01的声明式版本，多个策略可以用 compile_strategies 编译到一起计算，信号和 s01 的 signal 列相同
+def s01_expr(n=60) -> Expr:
+    close = col('收盘价')
+    return signal(long=cross_up(close, ma(n)), short=cross_down(close, ma(n)))
+
+
+# s01的参数网格版本：一次计算多组均线长度n的信号，返回 (K线数, 参数组数) 的数组
+# bars 需包含全部历史的'收盘价'，均线和 calc_ma_bias 一样用全部历史计算；window 是日期筛选后的行范围
+# bars 里已有 MA{n} 列（如 load_ma_bias 读出的缓存）时直接使用，不再计算
+def s01_grid(bars, window: slice, n) -> np.ndarray:
+    close = np.asarray(bars['收盘价'], dtype='float64')
+    n = np.asarray(n, dtype='int64')
+
+    # 每个不同的n只算一次均线。用pandas的rolling，保证和s01的MA列逐位相同
+    ma = np.empty((len(close), len(n)))
+    for value in np.unique(n):
+        if f'MA{value}' in bars:
+            ma[:, n == value] = np.asarray(bars[f'MA{value}'], dtype='float64').reshape(-1, 1)
+        else:
+            ma[:, n == value] = pd.Series(close).rolling(int(value)).mean().to_numpy().reshape(-1, 1)
+
+    c = close[window].reshape(-1, 1)
+    m = ma[window]
+    c_prev = shift_2d(c, 1)
+    m_prev = shift_2d(m, 1)
+
+    signal = np.full(m.shape, np.nan)
+    # 上穿做多
+    signal[(c >= m) & (c_prev < m_prev)] = 1
+    # 下穿做空
+    signal[(c <= m) & (c_prev > m_prev)] = -1
+    return signal
+
+
+# s01的逐根K线版本，给 utils.SignalEngine 使用
+# prev 保存上一根K线的收盘价和均线，row 是引擎算好的本根K线（含 MA{n} 列），返回本根K线的信号
+def s01_step(prev: dict, row: dict, n=60) -> float:
+    c, m = row['收盘价'], row[f'MA{n}']
+    c_prev, m_prev = prev.get('close', np.nan), prev.get('ma', np.nan)
+    prev['close'], prev['ma'] = c, m
+
+    # 上穿做多
+    if c >= m and c_prev < m_prev:
+        return 1.0
+    # 下穿做空
+    if c <= m and c_prev > m_prev:
+        return -1.0
+    return np.nan
+
+
+# s01的列式版本，给 utils.BacktestContext 使用：从上下文读取收盘价和 MA{n}，返回signal列，不拷贝K线
+# 上下文里的均线来自指标缓存，用全部历史计算，和 s01 的 MA 列相同
+def s01_signal(ctx, n=60) -> np.ndarray:
+    return s01_grid(ctx, slice(None), [n])[:, 0]
+
+
+s01_signal.inputs = s01_inputs
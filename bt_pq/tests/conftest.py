@@ -0,0 +1,53 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# 测试从 bt_pq 目录导入 utils、quant_nest，和 main_*.py 相同
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 和 future.toml 相同量级的回测参数，止损、止盈默认不用
+@pytest.fixture
+def cfg() -> dict:
+    return {
+        'initial_cash': 10000, 'invest_ratio': 1.0, 'slippage': 1.0, 'c_rate': 1.5 / 10000,
+        'invest_margin_ratio': 0.2, 'min_margin_ratio': 0.1, 'volume_per_lot': 10,
+        'trade_mode': 'NEXT', 'stop_loss': 0, 'take_profit': 0, 'trailing_stop': 0,
+    }
+
+
+# 随机的日K线：收盘价是随机游走，开盘价相对上一根收盘价有跳空，高低价包住开盘价和收盘价
+def random_bars(n: int, seed: int, volatility: float = 0.02) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+    open_ = np.append(3000, close[:-1]) * np.exp(rng.normal(0, volatility, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, volatility, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, volatility, n)))
+    return pd.DataFrame({
+        '交易日期': pd.date_range('2015-01-01', periods=n, freq='D'),
+        '开盘价': open_.round(), '最高价': high.round(), '最低价': low.round(), '收盘价': close.round(),
+    })
+
+
+# 随机的持仓：长度不等的多、空、空仓段
+def random_positions(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    ps = np.empty(n)
+    i = 0
+    while i < n:
+        length = rng.integers(1, 30)
+        ps[i:i + length] = rng.choice([-1.0, 0.0, 1.0])
+        i += length
+    return ps
+
+
+@pytest.fixture
+def bars():
+    return random_bars
+
+
+@pytest.fixture
+def positions():
+    return random_positions
@@ -0,0 +1,193 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from utils.calculate import equity_curve
+
+LATEST_ROOT = os.path.join(os.path.dirname(__file__), '..', '..', 'db_pq', 'latest')
+COLUMNS = ['trade_time', 'position_side', 'start_time', 'signal_entry_price', 'signal_exit_price', 'contract_num',
+           'entry_price', 'cash', 'exit_price', 'exit_fee', 'profit', 'net_value', 'price_min', 'profit_min',
+           'net_value_min', 'margin_ratio', 'is_liquidated', 'equity_change', 'equity_curve']
+
+
+# 改为数组内核之前的 equity_curve（NEXT 模式），逐列用pandas计算，作为 equity_2d 的参照
+def reference_equity_curve(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    df = df.copy().rename(columns={'交易日期': 'trade_time', '开盘价': 'open', '收盘价': 'close', '最高价': 'high', '最低价': 'low'})
+    initial_cash, slippage, c_rate = cfg['initial_cash'], cfg['slippage'], cfg['c_rate']
+    volume_per_lot = cfg['volume_per_lot']
+
+    current_pos_non_zero = df['position_side'] != 0
+    open_pos_condition = current_pos_non_zero & df['position_side'].ne(df['position_side'].shift(1))
+    close_pos_condition = current_pos_non_zero & df['position_side'].ne(df['position_side'].shift(-1))
+
+    df.loc[open_pos_condition, 'start_time'] = df['trade_time']
+    df['start_time'] = df['start_time'].ffill()
+    df.loc[df['position_side'] == 0, 'start_time'] = pd.NaT
+
+    df.loc[open_pos_condition, 'signal_entry_price'] = df['open']
+    df.loc[close_pos_condition, 'signal_exit_price'] = df['open'].shift(-1)
+
+    invest_cash = initial_cash * cfg['invest_ratio']
+    df.loc[open_pos_condition, 'contract_num'] = invest_cash / (volume_per_lot * (df['signal_entry_price'] + slippage * df['position_side']) * cfg['invest_margin_ratio'])
+    df['contract_num'] = np.floor(df['contract_num'])
+    df.loc[open_pos_condition, 'entry_price'] = (df['signal_entry_price'] + slippage * df['position_side'])
+    df['cash'] = initial_cash - df['entry_price'] * volume_per_lot * df['contract_num'] * c_rate
+    for column in ['contract_num', 'entry_price', 'cash']:
+        df.loc[df['position_side'] != 0, column] = df[column].ffill()
+    df.loc[df['position_side'] == 0, ['contract_num', 'entry_price', 'cash']] = None
+
+    df.loc[close_pos_condition, 'exit_price'] = (df['signal_exit_price'] - slippage * df['position_side'])
+    df.loc[close_pos_condition, 'exit_fee'] = df['exit_price'] * volume_per_lot * df['contract_num'] * c_rate
+
+    df['profit'] = volume_per_lot * df['contract_num'] * (df['close'] - df['entry_price']) * df['position_side']
+    df.loc[close_pos_condition, 'profit'] = volume_per_lot * df['contract_num'] * (df['exit_price'] - df['entry_price']) * df['position_side']
+    df['net_value'] = df['cash'] + df['profit']
+
+    df.loc[df['position_side'] == 1, 'price_min'] = df['low']
+    df.loc[df['position_side'] == -1, 'price_min'] = df['high']
+    df['profit_min'] = volume_per_lot * df['contract_num'] * (df['price_min'] - df['entry_price']) * df['position_side']
+    df['net_value_min'] = df['cash'] + df['profit_min']
+    df['margin_ratio'] = df['net_value_min'] / (volume_per_lot * df['contract_num'] * df['price_min'])
+    df.loc[df['margin_ratio'] <= (cfg['min_margin_ratio'] + c_rate), 'is_liquidated'] = 1
+
+    df.loc[close_pos_condition, 'net_value'] -= df['exit_fee']
+    df.loc[close_pos_condition & (df['net_value'] < 0), 'is_liquidated'] = 1
+    df['is_liquidated'] = df.groupby('start_time')['is_liquidated'].ffill()
+    df.loc[df['is_liquidated'] == 1, 'net_value'] = 0
+
+    df['equity_change'] = 0.0
+    if df.index[0] in df[open_pos_condition].index:
+        df.loc[open_pos_condition, 'equity_change'] = df['net_value'] / initial_cash - 1
+    else:
+        df.loc[open_pos_condition, 'equity_change'] = (df['net_value'] / df['net_value'].shift(1)) - 1
+    non_open_mask = ~df.index.isin(df[open_pos_condition].index)
+    df.loc[non_open_mask, 'equity_change'] = df['net_value'].pct_change(fill_method=None)
+    df['equity_change'] = df['equity_change'].fillna(0)
+    # 爆仓后下一笔交易的收益率是inf，累乘出现NaN，和原来的实现一样保留
+    with np.errstate(invalid='ignore'):
+        df['equity_curve'] = (1 + df['equity_change']).cumprod()
+    return df
+
+
+# INSTANTLY 模式的逐根K线参照：信号K线收盘价开仓，持仓期间是下一根K线，平仓K线的下一根收盘价平仓
+# 返回 entry_price、exit_price、profit、net_value、equity_curve 五列
+def reference_instantly(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    initial_cash, slippage, c_rate = cfg['initial_cash'], cfg['slippage'], cfg['c_rate']
+    volume_per_lot = cfg['volume_per_lot']
+    ps = df['position_side'].to_numpy('float64')
+    close, high, low = (df[c].to_numpy('float64') for c in ['收盘价', '最高价', '最低价'])
+    n = len(ps)
+    entry_price, exit_price, profit, net_value = (np.full(n, np.nan) for _ in range(4))
+
+    # 开仓价太高时合约数量为0，保证金比例除0，和数组内核一样保留inf/NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(n):
+            side = ps[i]
+            if side == 0:
+                continue
+            if i == 0 or ps[i - 1] != side:
+                entry = close[i] + slippage * side
+                contracts = np.floor(initial_cash * cfg['invest_ratio'] / (volume_per_lot * entry * cfg['invest_margin_ratio']))
+                cash = initial_cash - entry * volume_per_lot * contracts * c_rate
+                liquidated = False
+            closing = i == n - 1 or ps[i + 1] != side
+
+            entry_price[i] = entry
+            if closing:
+                exit_price[i] = (close[i + 1] if i < n - 1 else np.nan) - slippage * side
+                profit[i] = volume_per_lot * contracts * (exit_price[i] - entry) * side
+            else:
+                profit[i] = volume_per_lot * contracts * (close[i] - entry) * side
+            net = cash + profit[i]
+
+            # 持仓期间（下一根K线）的最不利价格算保证金比例
+            if i < n - 1:
+                price_min = low[i + 1] if side == 1 else high[i + 1]
+                margin_ratio = (cash + volume_per_lot * contracts * (price_min - entry) * side) / (volume_per_lot * contracts * price_min)
+                liquidated |= margin_ratio <= cfg['min_margin_ratio'] + c_rate
+            if closing:
+                net -= exit_price[i] * volume_per_lot * contracts * c_rate
+                liquidated |= net < 0
+            net_value[i] = 0 if liquidated else net
+
+    # 收益率和原来的实现相同：第一根K线就开仓时，所有开仓K线以初始资金为基准，其余是净值的pct_change
+    with np.errstate(divide='ignore', invalid='ignore'):
+        equity_change = net_value / np.append(np.nan, net_value[:-1]) - 1
+        if ps[0] != 0:
+            open_pos = (ps != 0) & (ps != np.append(np.nan, ps[:-1]))
+            equity_change[open_pos] = net_value[open_pos] / initial_cash - 1
+        equity_change[np.isnan(equity_change)] = 0
+        equity = np.cumprod(1 + equity_change)
+    return pd.DataFrame({'entry_price': entry_price, 'exit_price': exit_price, 'profit': profit,
+                         'net_value': net_value, 'equity_curve': equity})
+
+
+def _compare(df: pd.DataFrame, cfg: dict):
+    expected = reference_equity_curve(df, cfg)[COLUMNS]
+    actual = equity_curve(df, cfg)[COLUMNS]
+    # 参照实现里没有赋过值的列是object或全NaN，只比较数值
+    for column in COLUMNS:
+        a, e = actual[column], expected[column]
+        if column in ('trade_time', 'start_time'):
+            np.testing.assert_array_equal(a.to_numpy('datetime64[ns]'), e.to_numpy('datetime64[ns]'), err_msg=column)
+        else:
+            np.testing.assert_array_equal(a.to_numpy('float64'), e.to_numpy('float64'), err_msg=column)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('first_open', [False, True])
+def test_equity_curve_matches_pandas_reference(cfg, bars, positions, seed, first_open):
+    df = bars(800, seed)
+    ps = positions(800, seed + 100)
+    ps[0] = 1.0 if first_open else 0.0
+    df['position_side'] = ps
+    _compare(df, cfg)
+
+
+# 杠杆高、波动大时会爆仓，爆仓之后同一笔交易的净值为0
+def test_equity_curve_matches_with_liquidation(cfg, bars, positions):
+    cfg = {**cfg, 'invest_margin_ratio': 0.12}
+    df = bars(800, 1, volatility=0.05)
+    df['position_side'] = positions(800, 101)
+    expected = reference_equity_curve(df, cfg)
+    assert (expected['is_liquidated'] == 1).any()
+    _compare(df, cfg)
+
+
+# 仓库里的真实日K线
+@pytest.mark.parametrize('symbol', ['螺纹钢主连', '沪铜主连', '豆粕主连'])
+def test_equity_curve_matches_on_latest(cfg, positions, symbol):
+    path = os.path.join(LATEST_ROOT, f"{symbol}.parquet")
+    if not os.path.exists(path):
+        pytest.skip(f"没有 {path}")
+    df = pd.read_parquet(path, columns=['交易日期', '开盘价', '最高价', '最低价', '收盘价'])
+    df['交易日期'] = pd.to_datetime(df['交易日期'])
+    df['position_side'] = positions(len(df), 7)
+    _compare(df, cfg)
+
+
+def _compare_instantly(df: pd.DataFrame, cfg: dict):
+    expected = reference_instantly(df, cfg)
+    actual = equity_curve(df, cfg)
+    for column in expected.columns:
+        np.testing.assert_allclose(actual[column].to_numpy('float64'), expected[column].to_numpy('float64'),
+                                   rtol=1e-12, err_msg=column)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('first_open', [False, True])
+def test_equity_curve_instantly_matches_bar_loop(cfg, bars, positions, seed, first_open):
+    df = bars(800, seed)
+    ps = positions(800, seed + 100)
+    ps[0] = 1.0 if first_open else 0.0
+    df['position_side'] = ps
+    _compare_instantly(df, {**cfg, 'trade_mode': 'INSTANTLY'})
+
+
+def test_equity_curve_instantly_matches_with_liquidation(cfg, bars, positions):
+    cfg = {**cfg, 'trade_mode': 'INSTANTLY', 'invest_margin_ratio': 0.12}
+    df = bars(800, 1, volatility=0.05)
+    df['position_side'] = positions(800, 101)
+    expected = reference_instantly(df, cfg)
+    assert (expected['net_value'] == 0).any()
+    _compare_instantly(df, cfg)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from utils.calculate import calc_ma_bias
+from quant_nest.s01 import s01, s01_expr
+from quant_nest.expr import compile_strategies
+
+
+def _expected(df, n) -> np.ndarray:
+    return s01(calc_ma_bias(df, ma_list=[n]), n)['signal'].to_numpy('float64')
+
+
+# K线里有 MA{n} 列（load_ma_bias 的结果）时计算图直接使用
+@pytest.mark.parametrize('n', [5, 20, 60])
+@pytest.mark.parametrize('seed', range(5))
+def test_s01_expr_matches_s01_with_ma_column(bars, n, seed):
+    df = calc_ma_bias(bars(1500, seed), ma_list=[n])
+    actual = compile_strategies({'x': s01_expr(n)}).evaluate(df)['x'].to_numpy('float64')
+    np.testing.assert_array_equal(actual, _expected(df, n))
+    assert (actual == 1).any() and (actual == -1).any()
+
+
+# 没有 MA{n} 列时计算图自己用收盘价算均线，结果和 calc_ma_bias 的 MA 列相同
+@pytest.mark.parametrize('n', [5, 20, 60])
+@pytest.mark.parametrize('seed', range(5))
+def test_s01_expr_matches_s01_without_ma_column(bars, n, seed):
+    df = bars(1500, seed)
+    assert f'MA{n}' not in df
+    actual = compile_strategies({'x': s01_expr(n)}).evaluate(df)['x'].to_numpy('float64')
+    np.testing.assert_array_equal(actual, _expected(df, n))
+
+
+# 多个策略编译到一张图里，每个策略的信号和单独计算时相同
+def test_compiled_strategies_match_s01_each(bars):
+    df = bars(1500, 0)
+    ns = [5, 20, 60, 120]
+    result = compile_strategies({f's01_{n}': s01_expr(n) for n in ns}).evaluate(df)
+    np.testing.assert_array_equal(result['交易日期'].to_numpy(), df['交易日期'].to_numpy())
+    for n in ns:
+        np.testing.assert_array_equal(result[f's01_{n}'].to_numpy('float64'), _expected(df, n), err_msg=str(n))
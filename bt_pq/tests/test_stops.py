@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from utils.vectorized import equity_2d
+
+
+# 逐根K线的止损、止盈、移动止损状态机，作为 stops_2d 累计计算的参照
+# 返回 (调整后的持仓, 平仓价（含滑点，只有平仓K线有值）, 触发情况的计数)
+def reference_stops(ps, open_, high, low, close, cfg):
+    n = len(ps)
+    slippage = cfg['slippage']
+    stop_loss, take_profit, trailing_stop = cfg['stop_loss'], cfg['take_profit'], cfg['trailing_stop']
+    if cfg['trade_mode'] == 'NEXT':
+        trade_price, hold_open, hold_high, hold_low = open_, open_, high, low
+    else:
+        # INSTANTLY 在K线收盘时开仓，持仓期间是下一根K线
+        nan = np.array([np.nan])
+        trade_price = close
+        hold_open, hold_high, hold_low = (np.append(a[1:], nan) for a in (open_, high, low))
+
+    out = np.zeros(n)
+    fill = np.full(n, np.nan)
+    entry = extreme = None
+    exited = False
+    events = {'stop': 0, 'profit': 0, 'gap': 0, 'both': 0}
+    for t in range(n):
+        side = ps[t]
+        if side == 0:
+            entry, exited = None, False
+            continue
+        if t == 0 or ps[t - 1] != side:
+            entry = trade_price[t] + slippage * side
+            extreme = entry
+            exited = False
+        if exited:
+            continue
+        out[t] = side
+
+        if side == 1:
+            stops = []
+            if stop_loss:
+                stops.append(entry * (1 - stop_loss))
+            if trailing_stop:
+                stops.append(extreme * (1 - trailing_stop))
+            stop = max(stops) if stops else None
+            target = entry * (1 + take_profit) if take_profit else None
+            if stop is not None and hold_low[t] <= stop:
+                fill[t], exited = min(hold_open[t], stop), True
+                events['stop'] += 1
+                events['gap'] += fill[t] == hold_open[t]
+                events['both'] += target is not None and hold_high[t] >= target
+            elif target is not None and hold_high[t] >= target:
+                fill[t], exited = max(hold_open[t], target), True
+                events['profit'] += 1
+                events['gap'] += fill[t] == hold_open[t]
+            else:
+                extreme = max(extreme, hold_high[t])
+        else:
+            stops = []
+            if stop_loss:
+                stops.append(entry * (1 + stop_loss))
+            if trailing_stop:
+                stops.append(extreme * (1 + trailing_stop))
+            stop = min(stops) if stops else None
+            target = entry * (1 - take_profit) if take_profit else None
+            if stop is not None and hold_high[t] >= stop:
+                fill[t], exited = max(hold_open[t], stop), True
+                events['stop'] += 1
+                events['gap'] += fill[t] == hold_open[t]
+                events['both'] += target is not None and hold_low[t] <= target
+            elif target is not None and hold_low[t] <= target:
+                fill[t], exited = min(hold_open[t], target), True
+                events['profit'] += 1
+                events['gap'] += fill[t] == hold_open[t]
+            else:
+                extreme = min(extreme, hold_low[t])
+
+    # 平仓K线：持仓非空且和下一根不同；平仓价为触发价或下一根K线的参考价，加滑点
+    next_out = np.append(out[1:], 0.0)
+    close_pos = (out != 0) & (out != next_out)
+    exit_ref = np.where(np.isnan(fill), np.append(trade_price[1:], np.nan), fill)
+    exit_price = np.where(close_pos, exit_ref - slippage * out, np.nan)
+    return out, exit_price, events
+
+
+@pytest.mark.parametrize('trade_mode', ['NEXT', 'INSTANTLY'])
+@pytest.mark.parametrize('stops', [
+    {'stop_loss': 0.03},
+    {'take_profit': 0.05},
+    {'trailing_stop': 0.04},
+    {'stop_loss': 0.02, 'take_profit': 0.02},  # 波动大时同一根K线止损、止盈都触发
+    {'stop_loss': 0.05, 'take_profit': 0.08, 'trailing_stop': 0.03},
+])
+@pytest.mark.parametrize('seed', range(5))
+def test_stops_match_bar_loop(cfg, bars, positions, trade_mode, stops, seed):
+    cfg = {**cfg, 'trade_mode': trade_mode, **stops}
+    df = bars(600, seed, volatility=0.03)
+    ps = positions(600, seed + 100)
+    arrays = [df[c].to_numpy(dtype='float64') for c in ['开盘价', '最高价', '最低价', '收盘价']]
+
+    res = equity_2d(ps.reshape(-1, 1), *arrays, cfg)
+    expected_ps, expected_exit, _ = reference_stops(ps, *arrays, cfg)
+
+    np.testing.assert_array_equal(res['position_side'][:, 0], expected_ps)
+    np.testing.assert_array_equal(res['exit_price'][:, 0], expected_exit)
+
+
+# 随机数据确实覆盖了需要检查的情况：止损、止盈、跳空越过触发价按开盘价成交、同一根K线止损止盈都触发
+@pytest.mark.parametrize('trade_mode', ['NEXT', 'INSTANTLY'])
+def test_random_bars_cover_edge_cases(cfg, bars, positions, trade_mode):
+    cfg = {**cfg, 'trade_mode': trade_mode, 'stop_loss': 0.02, 'take_profit': 0.02}
+    events = {'stop': 0, 'profit': 0, 'gap': 0, 'both': 0}
+    for seed in range(5):
+        df = bars(600, seed, volatility=0.03)
+        arrays = [df[c].to_numpy(dtype='float64') for c in ['开盘价', '最高价', '最低价', '收盘价']]
+        _, _, e = reference_stops(positions(600, seed + 100), *arrays, cfg)
+        events = {k: events[k] + e[k] for k in events}
+    assert all(count > 0 for count in events.values()), events
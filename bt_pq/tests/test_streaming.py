@@ -0,0 +1,80 @@
+import os
+import json
+from functools import partial
+import numpy as np
+import pandas as pd
+import pytest
+from utils.streaming import RollingMean, SignalEngine
+from utils.calculate import calc_ma_bias
+from utils import position
+from quant_nest.s01 import s01, s01_step
+
+LATEST_ROOT = os.path.join(os.path.dirname(__file__), '..', '..', 'db_pq', 'latest')
+
+
+def _stream(values: np.ndarray, n: int) -> np.ndarray:
+    rolling = RollingMean(n)
+    return np.array([rolling.update(v) for v in values])
+
+
+# 随机数列：正负都有、夹杂NaN和连续相同的值（pandas对这些情况有专门的处理）
+def _series(seed: int, length: int = 2000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 1, length) * 10 ** rng.uniform(-3, 4, length)
+    values[rng.random(length) < 0.05] = np.nan
+    for start in rng.integers(0, length - 20, 10):
+        values[start:start + rng.integers(2, 20)] = values[start]
+    values[100:150] = np.abs(values[100:150])
+    values[200:250] = -np.abs(values[200:250])
+    return values
+
+
+@pytest.mark.parametrize('n', [1, 2, 5, 20, 60, 250])
+@pytest.mark.parametrize('seed', range(5))
+def test_rolling_mean_matches_pandas(n, seed):
+    values = _series(seed)
+    np.testing.assert_array_equal(_stream(values, n), pd.Series(values).rolling(n).mean().to_numpy())
+
+
+@pytest.mark.parametrize('n', [5, 60, 250])
+def test_rolling_mean_matches_pandas_on_latest(n):
+    path = os.path.join(LATEST_ROOT, '螺纹钢主连.parquet')
+    if not os.path.exists(path):
+        pytest.skip(f"没有 {path}")
+    close = pd.read_parquet(path, columns=['收盘价'])['收盘价'].to_numpy(dtype='float64')
+    np.testing.assert_array_equal(_stream(close, n), pd.Series(close).rolling(n).mean().to_numpy())
+
+
+# 从检查点恢复后继续更新，结果和不中断时相同
+def test_rolling_mean_checkpoint_round_trip():
+    values = _series(0)
+    rolling = RollingMean(20)
+    first = [rolling.update(v) for v in values[:1000]]
+    restored = RollingMean.from_state(rolling.state())
+    rest = [restored.update(v) for v in values[1000:]]
+    np.testing.assert_array_equal(np.array(first + rest), _stream(values, 20))
+
+
+# 信号引擎逐根K线输入，中途保存检查点（json往返）后恢复继续，
+# 结果和 calc_ma_bias(全部历史) -> s01 -> next/instant 逐位相同
+@pytest.mark.parametrize('trade_mode', ['NEXT', 'INSTANTLY'])
+@pytest.mark.parametrize('n', [5, 60])
+@pytest.mark.parametrize('seed', range(3))
+def test_signal_engine_matches_s01_with_checkpoint(bars, trade_mode, n, seed):
+    df = bars(1500, seed)
+    expected = s01(calc_ma_bias(df, ma_list=[n]), n)
+    expected = (position.next if trade_mode == 'NEXT' else position.instant)(expected)
+
+    strategy = partial(s01_step, n=n)
+    engine = SignalEngine(strategy, trade_mode, ma_list=[n])
+    columns = ['交易日期', '开盘价', '最高价', '最低价', '收盘价']
+    values = list(df[columns].itertuples(index=False))
+    rows = [engine.update(*v) for v in values[:700]]
+    engine = SignalEngine.restore(json.loads(json.dumps(engine.checkpoint())), strategy)
+    rows += [engine.update(*v) for v in values[700:]]
+
+    actual = pd.DataFrame(rows)
+    np.testing.assert_array_equal(actual[f'MA{n}'].to_numpy(), calc_ma_bias(df, ma_list=[n])[f'MA{n}'].to_numpy())
+    np.testing.assert_array_equal(actual['signal'].to_numpy('float64'), expected['t_signal'].to_numpy('float64'))
+    np.testing.assert_array_equal(actual['position_side'].to_numpy('float64'), expected['position_side'].to_numpy('float64'))
+    assert (expected['position_side'] != 0).any()
@@ -1,3 +1,19 @@
 from .methods import *
 from .position import *
 from .calculate import *
+from .sweep import *
+from .portfolio import *
+from .store import *
+from .features import *
+from .streaming import *
+from .shared import *
+from .walk_forward import *
+from .benchmark import *
+from .instrument import *
+from .resample import *
+from .context import *
+from .robustness import *
+from .ledger import *
+from .panel import *
+from .result_cache import *
+from .server import *
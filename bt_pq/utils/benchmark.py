@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import platform
+import datetime
+import tracemalloc
+import tomllib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .calculate import calc_ma_bias, equity_curve, evaluate_strategy
+from .position import next, instant
+
+
+# 生成合成K线，列和 db_pq/latest 里的文件相同
+# 价格是几何随机游走，按最小变动价位1取整；交易日期按分钟递增（日K线到10^7根会超出pandas的日期范围）
+def synthetic_bars(n: int, seed: int = 0, symbol: str = '合成主连') -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = np.round(3000 * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+    open_ = np.round(close * (1 + rng.normal(0, 0.003, n)))
+    high = np.maximum(open_, close) + np.round(np.abs(rng.normal(0, 5, n)))
+    low = np.minimum(open_, close) - np.round(np.abs(rng.normal(0, 5, n)))
+    return pd.DataFrame({
+        '交易日期': pd.date_range('2000-01-03', periods=n, freq='min'),
+        '交易所': '合成交易所',
+        '主连名称': symbol,
+        '合约代码': 'KQ.m@SYN.syn',
+        '开盘价': open_,
+        '最高价': high,
+        '最低价': low,
+        '收盘价': close,
+        '成交量': rng.integers(1, 100000, n).astype('float64'),
+    })
+
+
+# 运行一次 fn，测量耗时、CPU时间和内存
+# 计时和测内存分开跑：tracemalloc 会拖慢numpy的内存分配，计时取 repeat 次里最快的一次
+# 内存是运行期间tracemalloc记录的峰值减去运行前的占用，即这一步新分配的内存峰值
+# tracemalloc 看不到pyarrow内存池的分配，另外记录结果占用的arrow内存（parquet读写主要是这部分）
+def measure(fn, *args, repeat: int = 1, **kwargs) -> tuple:
+    wall, cpu = [], []
+    for _ in range(repeat):
+        t0, c0 = time.perf_counter(), time.process_time()
+        result = fn(*args, **kwargs)
+        wall.append(time.perf_counter() - t0)
+        cpu.append(time.process_time() - c0)
+        del result
+
+    arrow_base = pa.total_allocated_bytes()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    arrow = pa.total_allocated_bytes() - arrow_base
+
+    return result, {'wall_s': min(wall), 'cpu_s': min(cpu), 'peak_mb': peak / 2 ** 20, 'arrow_mb': arrow / 2 ** 20}
+
+
+# 读取 db_pq 写parquet文件用的参数（para_config.toml 的 [parquet]），保证测的是实际的写入设置
+def load_writer_options(config_path="../db_pq/utils/para_config.toml") -> dict:
+    with open(config_path, "rb") as f:
+        return tomllib.load(f)["parquet"]
+
+
+def _write(table: pa.Table, path, pq_cfg: dict):
+    pq.write_table(table, path, **pq_cfg)
+
+
+# 对每个规模的合成K线，分别测量回测流程每一步和parquet读写
+# 每一步的输入是上一步的输出，和 main_back_test 的流程相同
+# strategy：策略函数，如 quant_nest.s01
+def run_benchmark(sizes: list, cfg: dict, pq_cfg: dict, strategy, repeat: int = 3, tmp_dir: str = "./benchmark") -> list:
+    os.makedirs(tmp_dir, exist_ok=True)
+    path = os.path.join(tmp_dir, '.bench.parquet')
+    results = []
+
+    def record(stage, rows, stats):
+        results.append({'stage': stage, 'rows': rows, **stats})
+        print(f"{rows:>10} {stage:<20} {stats['wall_s']:>10.4f}s {stats['cpu_s']:>10.4f}s {stats['peak_mb']:>10.1f}MB {stats['arrow_mb']:>10.1f}MB", flush=True)
+
+    for n in sizes:
+        df = synthetic_bars(n)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        _, stats = measure(_write, table, path, pq_cfg, repeat=repeat)
+        stats['file_mb'] = os.path.getsize(path) / 2 ** 20
+        record('parquet_write', n, stats)
+        _, stats = measure(pd.read_parquet, path, engine='pyarrow', repeat=repeat)
+        record('parquet_read', n, stats)
+
+        df_ma_bias, stats = measure(calc_ma_bias, df, repeat=repeat)
+        record('calc_ma_bias', n, stats)
+        df_signal, stats = measure(strategy, df_ma_bias, repeat=repeat)
+        record(getattr(strategy, '__name__', 'strategy'), n, stats)
+        df_pos, stats = measure(next, df_signal, repeat=repeat)
+        record('next', n, stats)
+        _, stats = measure(instant, df_signal, repeat=repeat)
+        record('instant', n, stats)
+        df_equity, stats = measure(equity_curve, df_pos, cfg, repeat=repeat)
+        record('equity_curve', n, stats)
+        _, stats = measure(evaluate_strategy, df_equity, repeat=repeat)
+        record('evaluate_strategy', n, stats)
+
+        del df, table, df_ma_bias, df_signal, df_pos, df_equity
+
+    if os.path.exists(path):
+        os.remove(path)
+    return results
+
+
+# 保存结果和运行环境，文件名带时间，便于和以前的结果比较
+def save_results(results: list, out_dir: str = "./benchmark") -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    now = datetime.datetime.now()
+    path = os.path.join(out_dir, f"bench-{now.strftime('%Y%m%d-%H%M%S')}.json")
+    meta = {
+        'time': now.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_results(path) -> pd.DataFrame:
+    with open(path, 'r', encoding='utf-8') as f:
+        return pd.DataFrame(json.load(f)['results'])
+
+
+# 比较两次结果：同一步骤、同一规模的耗时和内存之比，超过 1+threshold 的标记为变慢
+# 很短的步骤（基准耗时小于 min_wall_s）计时误差大，不参与耗时的判断；内存同理（小于 min_peak_mb）
+def compare_results(base_path, new_path, threshold: float = 0.2, min_wall_s: float = 0.005, min_peak_mb: float = 1.0) -> pd.DataFrame:
+    base, new = load_results(base_path), load_results(new_path)
+    df = base.merge(new, on=['stage', 'rows'], suffixes=('_base', '_new'))
+    df['wall_ratio'] = df['wall_s_new'] / df['wall_s_base']
+    df['peak_ratio'] = df['peak_mb_new'] / df['peak_mb_base'].where(df['peak_mb_base'] > 0)
+    slower = (df['wall_ratio'] > 1 + threshold) & (df['wall_s_base'] >= min_wall_s)
+    bigger = (df['peak_ratio'] > 1 + threshold) & (df['peak_mb_base'] >= min_peak_mb)
+    df['regression'] = slower | bigger
+    return df[['stage', 'rows', 'wall_s_base', 'wall_s_new', 'wall_ratio', 'peak_mb_base', 'peak_mb_new', 'peak_ratio', 'regression']]
@@ -2,6 +2,7 @@ import pandas as pd
 from tabulate import tabulate
 import numpy as np
 from .methods import myprint
+from .vectorized import equity_2d, evaluate_2d
 
 
 # 计算每日涨跌幅，MA，bias，截取交易日期
@@ -33,172 +34,60 @@ def calc_ma_bias(df: pd.DataFrame, date_start: pd.Timestamp = None, date_end: pd
     return df.reset_index(drop=True)
 
 
+# 资金曲线的各列：position_side 为 (K线数,) 的持仓方向，其余为同样长度的价格和交易日期
+# 返回 {列名: 数组}，position_side 是止损、止盈触发后调整过的持仓，detail=False 时只有 position_side、equity_curve
+# equity_curve 和列式回测上下文（context.equity_stage）共用
+def equity_columns(position_side, trade_time, open_, high, low, close, cfg: dict, detail: bool = True) -> dict:
+    # 全部计算在 vectorized.equity_2d 里用连续的float64数组完成
+    position_side = np.asarray(position_side, dtype='float64')
+    res = equity_2d(position_side.reshape(-1, 1), open_, high, low, close, cfg)
+    res = {k: v[:, 0] for k, v in res.items()}
+    # 止损、止盈触发后持仓改为空仓，position_side 用调整后的持仓
+    position_side = res.pop('position_side')
+    if not detail:
+        return {'position_side': position_side, 'equity_curve': res['equity_curve']}
+
+    # 交易分组：每根持仓K线对应的开仓时间，空仓为NaT
+    trade_time = np.asarray(trade_time)
+    start_time = np.where(position_side != 0, trade_time[res['start']], np.datetime64('NaT'))
+
+    # 开仓、平仓的参考价格（未加滑点）
+    trade_price = np.asarray(open_ if cfg['trade_mode'] == 'NEXT' else close, dtype='float64')
+
+    columns = {
+        'position_side': position_side,
+        'start_time': start_time,
+        'signal_entry_price': np.where(res['open_pos'], trade_price, np.nan),
+        'signal_exit_price': np.where(res['close_pos'], np.append(trade_price[1:], np.nan), np.nan),
+    }
+    for column in ['contract_num', 'entry_price', 'cash', 'exit_price', 'exit_fee', 'profit', 'net_value',
+                   'price_min', 'profit_min', 'net_value_min', 'margin_ratio']:
+        columns[column] = res[column]
+    # 爆仓标记：1 表示爆仓，其余为空
+    columns['is_liquidated'] = np.where(res['is_liquidated'], 1.0, np.nan)
+    columns['equity_change'] = res['equity_change']
+    columns['equity_curve'] = res['equity_curve']
+    return columns
+
+
 # 计算账户净值曲线
-def equity_curve(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
-    # copy，避免修改传进来的参数,改个英文名字，打印出来能对齐
-    df = df.copy().rename(columns={'交易日期': 'trade_time', '开盘价': 'open', '收盘价': 'close', '最高价': 'high', '最低价': 'low'})
-
-    # 读取配置文件里的参数
-    initial_cash = cfg['initial_cash']
-    invest_ratio = cfg['invest_ratio']
-    slippage = cfg['slippage']
-    c_rate = cfg['c_rate']
-    invest_margin_ratio = cfg['invest_margin_ratio']
-    min_margin_ratio = cfg['min_margin_ratio']
-    volume_per_lot = cfg['volume_per_lot']
-    trade_mode = cfg['trade_mode']
-
-    # 公共条件：当前持仓非空（只需计算一次）
-    current_pos_non_zero = df['position_side'] != 0
-    # 开仓条件：当前持仓变化（与上一周期不同）
-    open_pos_condition = current_pos_non_zero & df['position_side'].ne(df['position_side'].shift(1))
-    print(type(open_pos_condition))
-    # 平仓条件：即将发生持仓变化（与下一周期不同）
-    close_pos_condition = current_pos_non_zero & df['position_side'].ne(df['position_side'].shift(-1))
-
-    # =====对每次交易进行分组
-    # 符合开仓的，把‘交易日期’这列复制给‘start_time’这一列
-    df.loc[open_pos_condition, 'start_time'] = df['trade_time']
-    # 填充‘start_time’列
-    df['start_time'] = df['start_time'].ffill()
-    # 仓位为0的，‘start_time’这列日期=pd.NaT
-    df.loc[df['position_side'] == 0, 'start_time'] = pd.NaT
-
-    # 判断交易模式
-    if trade_mode == "NEXT":
-        # ===== 计算开仓，平仓价格
-        # 开仓价()=出现交易信号的第二根K线的，开盘价
-        # 平仓价=出现交易信号的第二根K线的，开盘价
-        df.loc[open_pos_condition, 'signal_entry_price'] = df['open']
-        df.loc[close_pos_condition, 'signal_exit_price'] = df['open'].shift(-1)
-
-        # ===== 计算资金曲线
-        invest_cash = initial_cash * invest_ratio
-
-        # ===在开仓时
-        # 在open_pos_condition的K线，以ma均价计算买入合约的数量。（当资金量大的时候，可以提高5跳的价格买入）
-        df.loc[open_pos_condition, 'contract_num'] = invest_cash / (volume_per_lot * (df['signal_entry_price'] + slippage * df['position_side']) * invest_margin_ratio)
-        df['contract_num'] = np.floor(df['contract_num'])  # 对合约张数向下取整
-
-        # 加上滑点的开仓价格
-        df.loc[open_pos_condition, 'entry_price'] = (df['signal_entry_price'] + slippage * df['position_side'])
-
-        # 开仓之后， cash = 可用现金+持仓市值-开仓手续费
-        df['cash'] = initial_cash - df['entry_price'] * volume_per_lot * df['contract_num'] * c_rate
-
-        # 管理开仓后的持仓状态数据，确保在持仓期间关键信息（合约数量、开仓价、现金）保持不变，并在平仓时重置这些值
-        for column in ['contract_num', 'entry_price', 'cash']:
-            df.loc[df['position_side'] != 0, column] = df[column].ffill()
-
-        # 平仓后，清除合约数量、开仓价、现金的数值
-        df.loc[df['position_side'] == 0, ['contract_num', 'entry_price', 'cash']] = None
-
-        # ========平仓时
-        # 平仓价格，增加滑点影响，position_side=±1，无需区分多空，直接利用持仓方向（正/负）自动调整滑点的影响方向，确保公式适用于所有情况
-        df.loc[close_pos_condition, 'exit_price'] = (df['signal_exit_price'] - slippage * df['position_side'])
-        # 平仓手续费
-        df.loc[close_pos_condition, 'exit_fee'] = df['exit_price'] * volume_per_lot * df['contract_num'] * c_rate
-
-        # ==========计算利润
-        # 开仓至今持仓盈亏,净值波动
-        df['profit'] = volume_per_lot * df['contract_num'] * (df['close'] - df['entry_price']) * df['position_side']
-        # 平仓时理论额外处理,手续费扣除在后面的net_value中处理
-        df.loc[close_pos_condition, 'profit'] = volume_per_lot * df['contract_num'] * (df['exit_price'] - df['entry_price']) * df['position_side']
-        # 账户净值
-        df['net_value'] = df['cash'] + df['profit']
-
-        # ====计算爆仓
-        # 至今持仓盈亏最小值
-        df.loc[df['position_side'] == 1, 'price_min'] = df['low']
-        df.loc[df['position_side'] == -1, 'price_min'] = df['high']
-        df['profit_min'] = volume_per_lot * df['contract_num'] * (df['price_min'] - df['entry_price']) * df['position_side']
-
-        # 账户净值最小值
-        df['net_value_min'] = df['cash'] + df['profit_min']
-
-        # 计算保证金比例，当持仓保证金小于18%的时候即为爆仓，这是交易所规定的，目前18%为保守计算
-        # 保证金比例 = （保证金金额 / 合约总价值） × 100%
-        df['margin_ratio'] = df['net_value_min'] / (volume_per_lot * df['contract_num'] * df['price_min'])
-
-        # 计算是否爆仓
-        df.loc[df['margin_ratio'] <= (min_margin_ratio + c_rate), 'is_liquidated'] = 1
-
-        # ===平仓时扣除手续费
-        df.loc[close_pos_condition, 'net_value'] -= df['exit_fee']
-        # 应对偶然情况：下一根K线开盘价格价格突变，在平仓的时候爆仓。
-        df.loc[close_pos_condition & (df['net_value'] < 0), 'is_liquidated'] = 1
-
-        # ===对爆仓进行处理
-        df['is_liquidated'] = df.groupby('start_time')['is_liquidated'].ffill()
-        df.loc[df['is_liquidated'] == 1, 'net_value'] = 0
-
-        # ==== 计算资金曲线 ====
-        # 初始化收益率列
-        df['equity_change'] = 0.0
-
-        # 处理开仓日收益率
-        if df.index[0] in df[open_pos_condition].index:
-            # 首日开仓，直接以 initial_cash 为基准
-            df.loc[open_pos_condition, 'equity_change'] = df['net_value'] / initial_cash - 1
-        else:
-            # 非首日开仓，用前一日净值计算收益率
-            prev_net_value = df['net_value'].shift(1)
-            df.loc[open_pos_condition, 'equity_change'] = (df['net_value'] / prev_net_value) - 1
-
-        # 非开仓日用 pct_change() 计算（禁用填充）
-        non_open_mask = ~df.index.isin(df[open_pos_condition].index)
-        df.loc[non_open_mask, 'equity_change'] = df['net_value'].pct_change(fill_method=None)  # 修改点
-
-        # 填充缺失值（首日非开仓日或中间缺失）
-        df['equity_change'] = df['equity_change'].fillna(0)  # 确保无 NaN
-
-        # 生成资金曲线
-        df['equity_curve'] = (1 + df['equity_change']).cumprod()
+# detail=False 时只返回 trade_time、position_side、equity_curve 三列（评价策略只需要这些），不生成十几列明细
+def equity_curve(df: pd.DataFrame, cfg: dict, detail: bool = True) -> pd.DataFrame:
+    # rename 返回新的df，不会修改传进来的参数,改个英文名字，打印出来能对齐
+    df = df.rename(columns={'交易日期': 'trade_time', '开盘价': 'open', '收盘价': 'close', '最高价': 'high', '最低价': 'low'})
 
-        # myprint(df)
-
-
-    elif trade_mode == "INSTANTLY":
-        pass
+    columns = equity_columns(df['position_side'], df['trade_time'].to_numpy(), df['open'], df['high'], df['low'], df['close'],
+                             cfg, detail)
+    df['position_side'] = columns.pop('position_side')
+    if not detail:
+        return pd.DataFrame({'trade_time': df['trade_time'], 'position_side': df['position_side'], 'equity_curve': columns['equity_curve']})
 
-    return df
+    # 一次性拼接所有新列，避免逐列插入
+    return pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
 
 
-# 评价策略
+# 评价策略：单根资金曲线调用批量版本 vectorized.evaluate_2d，返回一行评价结果
+# df 需要 trade_time、equity_curve 两列；有 position_side 列时（equity_curve 的结果）同时统计交易
 def evaluate_strategy(df: pd.DataFrame) -> pd.DataFrame:
-    equity = df.copy()
-    equity['candle_end_time'] = equity['trade_time']
-    equity = equity[['candle_end_time', 'equity_curve']]
-    # print(equity)
-
-    # ===新建一个dataframe保存回测指标
-    results = pd.DataFrame()
-
-    # ===计算累积净值
-    results.loc[0, '累积净值'] = round(equity['equity_curve'].iloc[-1], 2)
-
-    # ===计算年化收益
-    annual_return = (equity['equity_curve'].iloc[-1]) ** ('1 days 00:00:00' / (equity['candle_end_time'].iloc[-1] - equity['candle_end_time'].iloc[0]) * 365) - 1
-    results.loc[0, '年化收益'] = str(round(annual_return * 100, 2)) + '%'
-
-    # 计算当日之前的资金曲线的最高点
-    equity['最高净值_至今'] = equity['equity_curve'].expanding().max()
-    # 计算到历史最高值到当日的跌幅
-    equity['当日净值/历史最高'] = equity['equity_curve'] / equity['最高净值_至今'] - 1
-    # 计算最大回撤，以及最大回撤结束时间
-    end_date, max_draw_down = tuple(equity.sort_values(by=['当日净值/历史最高']).iloc[0][['candle_end_time', '当日净值/历史最高']])
-    # 计算最大回撤开始时间
-    start_date = equity[equity['candle_end_time'] <= end_date].sort_values(by='equity_curve', ascending=False).iloc[0]['candle_end_time']
-    # 将无关的变量删除
-    # equity.drop(['最高净值_至今', '当日净值/历史最高'], axis=1, inplace=True)
-    # print(equity)
-    results.loc[0, '最大回撤'] = format(max_draw_down, '.2%')
-    results.loc[0, '最大回撤开始时间'] = str(start_date)
-    results.loc[0, '最大回撤结束时间'] = str(end_date)
-
-    # ===年化收益/回撤比：我个人比较关注的一个指标
-    results.loc[0, '年化收益/回撤比'] = round(annual_return / abs(max_draw_down), 2)
-    print('*' * 100)
-    print('回撤统计')
-    print(equity['当日净值/历史最高'].describe())
-    return results
+    position_side = df['position_side'].to_numpy() if 'position_side' in df.columns else None
+    return evaluate_2d(df['trade_time'], df['equity_curve'].to_numpy(), position_side)
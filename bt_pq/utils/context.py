@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .store import DATASET_ROOT, LATEST_ROOT
+from .features import FEATURE_ROOT, MA_LIST, feature_slice, strategy_columns
+from .calculate import equity_columns
+from .vectorized import shift_2d, evaluate_2d
+
+# 列式回测上下文：一次回测的所有列放在一个 {列名: 一维numpy数组} 里，各步骤从中读取输入列、追加输出列，
+# 不再像 DataFrame 流程那样每一步 df.copy() 一次整张表
+# 载入的K线和指标是内存映射的指标缓存（见 features.feature_table）上的视图，不拷贝；
+# 之后每一步只新建自己的输出列，峰值内存约为用到的列各一份
+# 步骤是普通函数 stage(ctx, **kwargs) -> {列名: 数组}，用 stage.inputs(**kwargs)、stage.outputs(**kwargs)
+# 声明输入、输出列（和 quant_nest.s01.inputs 相同的写法），由 BacktestContext.run 检查
+# 只有需要时（保存、打印、交易明细）才用 frame 拼成 DataFrame
+
+# equity_curve 结果里的英文列名
+EQUITY_NAMES = {'交易日期': 'trade_time', '开盘价': 'open', '收盘价': 'close', '最高价': 'high', '最低价': 'low'}
+# equity_columns 输出的列，detail=False 时只有 position_side、equity_curve
+EQUITY_COLUMNS = ['position_side', 'start_time', 'signal_entry_price', 'signal_exit_price', 'contract_num', 'entry_price',
+                  'cash', 'exit_price', 'exit_fee', 'profit', 'net_value', 'price_min', 'profit_min', 'net_value_min',
+                  'margin_ratio', 'is_liquidated', 'equity_change', 'equity_curve']
+
+
+class BacktestContext:
+    def __init__(self, columns: dict):
+        self.columns = dict(columns)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def names(self) -> list:
+        return list(self.columns)
+
+    # (K线数, 列数)，和DataFrame一样，StageRecorder 用它记录数据规模
+    @property
+    def shape(self) -> tuple:
+        return len(self), len(self.columns)
+
+    # 运行一个步骤：检查声明的输入列都在，把输出列加入上下文（同名的列被替换，原来的数组不修改）
+    def run(self, stage, **kwargs):
+        missing = [c for c in stage.inputs(**kwargs) if c not in self.columns]
+        if missing:
+            raise KeyError(f"{stage.__name__} 缺少输入列: {missing}")
+        outputs = stage(self, **kwargs)
+        declared = stage.outputs(**kwargs)
+        if list(outputs) != declared:
+            raise ValueError(f"{stage.__name__} 的输出列和声明不一致: {list(outputs)} != {declared}")
+        for name, values in outputs.items():
+            if len(values) != len(self):
+                raise ValueError(f"{stage.__name__} 的输出列 {name} 长度不一致: {len(values)} != {len(self)}")
+            self.columns[name] = values
+        return self
+
+    # 拼成DataFrame，这时才拷贝。names 为要输出的列（默认全部），rename 为列名映射
+    def frame(self, names: list = None, rename: dict = None) -> pd.DataFrame:
+        names = self.names if names is None else names
+        rename = rename or {}
+        return pd.DataFrame({rename.get(name, name): self.columns[name] for name in names})
+
+
+# 运行一个步骤，上下文既是第一个参数也是返回值，StageRecorder 可以记录步骤前后的数据规模：
+#   recorder.run('position', run_stage, ctx, position_stage, trade_mode='NEXT')
+def run_stage(ctx: BacktestContext, stage, **kwargs) -> BacktestContext:
+    return ctx.run(stage, **kwargs)
+
+
+# arrow列转换为numpy：没有null的数值列直接是arrow内存（内存映射）的视图；日K线的交易日期（date32）转换为datetime64[ns]
+def _column(column: pa.ChunkedArray) -> np.ndarray:
+    if pa.types.is_date32(column.type):
+        column = column.cast(pa.timestamp('ns'))
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    return column.to_numpy() if column.num_chunks == 1 else column.combine_chunks().to_numpy(zero_copy_only=False)
+
+
+# 载入一个品种的回测上下文：参数和 load_ma_bias 相同，columns 为None时载入全部列
+# 一般传入 strategy_columns(策略)，只映射策略用到的列
+def load_context(symbol: str, date_start: pd.Timestamp = None, date_end: pd.Timestamp = None, ma_list: list = MA_LIST,
+                 feature_root=FEATURE_ROOT, root=DATASET_ROOT, latest_root=LATEST_ROOT,
+                 columns: list = None, compact: bool = False, adjust: str = None) -> BacktestContext:
+    table = feature_slice(symbol, date_start, date_end, ma_list, feature_root, root, latest_root, columns, compact, adjust)
+    if table is None:
+        return None
+    return BacktestContext({name: _column(table.column(name)) for name in table.column_names})
+
+
+# 策略步骤：strategy(ctx) 返回signal列（1做多，-1做空，NaN不变），如 quant_nest.s01_signal
+# 输入列为策略声明的列（strategy_columns），没有声明时只检查交易日期
+def signal_stage(ctx: BacktestContext, strategy) -> dict:
+    return {'signal': np.asarray(strategy(ctx), dtype='float64')}
+
+
+signal_stage.inputs = lambda strategy: strategy_columns(strategy) or ['交易日期']
+signal_stage.outputs = lambda strategy: ['signal']
+
+
+# 持仓步骤：和 position.next / position.instant 相同，signal向下填充、开头的空值为0；
+# NEXT 模式持仓为上一根K线的信号
+def position_stage(ctx: BacktestContext, trade_mode: str) -> dict:
+    signal = pd.Series(ctx['signal']).ffill().fillna(0).to_numpy()
+    position_side = shift_2d(signal, 1, fill=0.0) if trade_mode == 'NEXT' else signal
+    return {'signal': signal, 'position_side': position_side}
+
+
+position_stage.inputs = lambda trade_mode: ['signal']
+position_stage.outputs = lambda trade_mode: ['signal', 'position_side']
+
+
+# 资金曲线步骤：和 calculate.equity_curve 相同的计算（共用 equity_columns），position_side 替换为止损、止盈调整后的持仓
+def equity_stage(ctx: BacktestContext, cfg: dict, detail: bool = True) -> dict:
+    return equity_columns(ctx['position_side'], ctx['交易日期'], ctx['开盘价'], ctx['最高价'], ctx['最低价'], ctx['收盘价'],
+                          cfg, detail)
+
+
+equity_stage.inputs = lambda cfg, detail=True: ['position_side', '交易日期', '开盘价', '最高价', '最低价', '收盘价']
+equity_stage.outputs = lambda cfg, detail=True: EQUITY_COLUMNS if detail else ['position_side', 'equity_curve']
+
+
+# 评价策略，和 evaluate_strategy 相同，返回一行评价结果
+def evaluate_context(ctx: BacktestContext) -> pd.DataFrame:
+    return evaluate_2d(ctx['交易日期'], ctx['equity_curve'], ctx['position_side'])
+
+
+# 一次完整的回测：策略 -> 持仓 -> 资金曲线，返回上下文，由调用者决定要不要拼成DataFrame
+def run_context(ctx: BacktestContext, strategy, cfg: dict, detail: bool = True) -> BacktestContext:
+    ctx.run(signal_stage, strategy=strategy)
+    ctx.run(position_stage, trade_mode=cfg['trade_mode'])
+    return ctx.run(equity_stage, cfg=cfg, detail=detail)
+
+
+# 和 equity_curve 结果相同列名的DataFrame：K线的交易日期和开高低收改为英文名，加上信号、持仓和资金曲线各列
+# detail=False 时只有 trade_time、position_side、equity_curve
+def equity_frame(ctx: BacktestContext, detail: bool = True) -> pd.DataFrame:
+    if not detail:
+        return ctx.frame(['交易日期', 'position_side', 'equity_curve'], EQUITY_NAMES)
+    return ctx.frame(['交易日期', '开盘价', '收盘价', '最高价', '最低价', 'signal'] + EQUITY_COLUMNS, EQUITY_NAMES)
@@ -0,0 +1,141 @@
+import os
+import hashlib
+from functools import partial
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from .store import DATASET_ROOT, LATEST_ROOT, ROLL_ROOT, load_table, source_files, compact_table
+
+# 指标缓存：每个品种一个不压缩的Arrow IPC（Feather v2）文件，放在价格数据旁边
+# ../db_pq/features/螺纹钢主连.arrow，内容是该品种全部历史K线 + 涨跌幅 + MA/bias 列
+# 文件的schema元数据里记录源数据文件的指纹，数据库更新后指纹变化，缓存自动重算
+FEATURE_ROOT = r"../db_pq/features"
+MA_LIST = [5, 10, 20, 30, 60, 120, 250]
+
+
+# 源数据指纹：文件名、大小、修改时间。增量更新新增文件、合并重写文件都会改变指纹
+# 复权的指标还取决于换月索引，adjust 不为None时换月索引文件也算在内
+def source_fingerprint(symbol: str, root=DATASET_ROOT, latest_root=LATEST_ROOT, adjust: str = None) -> str:
+    h = hashlib.sha1()
+    for path in source_files(symbol, root, latest_root):
+        st = os.stat(path)
+        h.update(f"{os.path.relpath(path, root if os.path.isdir(root) else latest_root)}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    roll_path = os.path.join(ROLL_ROOT, f"{symbol}.parquet")
+    if adjust is not None and os.path.exists(roll_path):
+        st = os.stat(roll_path)
+        h.update(f"{adjust}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+# 计算涨跌幅和均线、乖离率，算法和 calculate.calc_ma_bias 完全相同，保证结果逐位一致
+# 返回 {列名: float64数组}
+def _compute(close: np.ndarray, ma_list: list, with_change: bool) -> dict:
+    s = pd.Series(close)
+    columns = {}
+    if with_change:
+        columns['涨跌幅'] = s.pct_change(1).to_numpy()
+    for n in ma_list:
+        ma = s.rolling(n).mean()
+        columns[f'MA{n}'] = ma.to_numpy()
+        columns[f'bias{n}'] = ((s - ma) / ma).to_numpy()
+    return columns
+
+
+# 追加float64列。直接从numpy数组转换，NaN保留为NaN而不是null，读回pandas时才能零拷贝
+def _append(table: pa.Table, columns: dict) -> pa.Table:
+    for name, values in columns.items():
+        table = table.append_column(name, pa.array(values, pa.float64()))
+    return table
+
+
+# 原子写入：先写同目录的临时文件再改名，其他进程读到的要么是旧文件要么是完整的新文件
+# 临时文件名带进程号，多个进程（如并行回测）同时生成同一个缓存时不会互相覆盖临时文件
+# 不压缩，读取时可以直接内存映射
+def write_cache(table: pa.Table, path, fingerprint: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = table.replace_schema_metadata({'source': fingerprint})
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def _ma_names(ma_list: list) -> list:
+    return [name for n in ma_list for name in (f'MA{n}', f'bias{n}')]
+
+
+# 读取一个品种的指标表（pa.Table，内存映射，不拷贝数据）
+# 缓存不存在或源数据有变化时重新计算全部列；只缺少部分均线时只计算缺少的，追加后写回
+# adjust：复权方式（见 store.adjust_prices），复权后的K线和指标单独缓存为 螺纹钢主连.forward.arrow
+def feature_table(symbol: str, ma_list: list = MA_LIST, feature_root=FEATURE_ROOT,
+                  root=DATASET_ROOT, latest_root=LATEST_ROOT, adjust: str = None) -> pa.Table:
+    path = os.path.join(feature_root, f"{symbol}.arrow" if adjust is None else f"{symbol}.{adjust}.arrow")
+    fingerprint = source_fingerprint(symbol, root, latest_root, adjust)
+
+    table = None
+    if os.path.exists(path):
+        # 只读schema，判断缓存是否可用
+        schema = pa.ipc.open_file(pa.memory_map(path)).schema
+        if (schema.metadata or {}).get(b'source') == fingerprint.encode():
+            missing = [n for n in ma_list if f'MA{n}' not in schema.names]
+            if not missing:
+                return feather.read_table(path, memory_map=True)
+            # 读入内存（不用内存映射），写回时可以替换文件
+            table = feather.read_table(path, memory_map=False)
+            table = _append(table, _compute(table['收盘价'].to_numpy(), missing, with_change=False))
+
+    if table is None:
+        table = load_table(symbol, root=root, latest_root=latest_root, adjust=adjust).replace_schema_metadata(None)
+        if table.num_rows == 0:
+            print(f"❌ 没有找到品种的K线数据: {symbol}")
+            return None
+        table = _append(table, _compute(table['收盘价'].to_numpy(), ma_list, with_change=True))
+
+    write_cache(table, path, fingerprint)
+    return feather.read_table(path, memory_map=True)
+
+
+# 策略声明的输入列：策略函数的 inputs 属性（如 quant_nest.s01.inputs），functools.partial 绑定的参数一并传入
+# 没有声明时返回None，表示需要全部列
+def strategy_columns(strategy) -> list:
+    func, kwargs = (strategy.func, strategy.keywords) if isinstance(strategy, partial) else (strategy, {})
+    inputs = getattr(func, 'inputs', None)
+    return None if inputs is None else inputs(**kwargs)
+
+
+# calc_ma_bias 的缓存版本：返回结果和 calc_ma_bias(全部历史K线, date_start, date_end, ma_list) 相同
+# 日期筛选在arrow表上按行切片，数值列转换为pandas时不拷贝
+# 低内存模式：columns 只保留这些列（如 strategy_columns 的结果，交易日期总会保留），只计算其中用到的均线；
+# compact 见 store.compact_table；adjust 为复权方式，价格和均线都按复权后的价格计算
+def load_ma_bias(symbol: str, date_start: pd.Timestamp = None, date_end: pd.Timestamp = None, ma_list: list = MA_LIST,
+                 feature_root=FEATURE_ROOT, root=DATASET_ROOT, latest_root=LATEST_ROOT,
+                 columns: list = None, compact: bool = False, adjust: str = None) -> pd.DataFrame:
+    table = feature_slice(symbol, date_start, date_end, ma_list, feature_root, root, latest_root, columns, compact, adjust)
+    if table is None:
+        return None
+    df = table.to_pandas(split_blocks=True)
+    df['交易日期'] = pd.to_datetime(df['交易日期'], errors='coerce')
+    return df
+
+
+# load_ma_bias 的arrow版本：指标表按日期范围切片、按列筛选，仍是内存映射的视图，不拷贝
+def feature_slice(symbol: str, date_start: pd.Timestamp = None, date_end: pd.Timestamp = None, ma_list: list = MA_LIST,
+                  feature_root=FEATURE_ROOT, root=DATASET_ROOT, latest_root=LATEST_ROOT,
+                  columns: list = None, compact: bool = False, adjust: str = None) -> pa.Table:
+    if columns is not None:
+        ma_list = [n for n in ma_list if f'MA{n}' in columns or f'bias{n}' in columns]
+    table = feature_table(symbol, ma_list, feature_root, root, latest_root, adjust)
+    if table is None:
+        return None
+
+    # K线按交易日期排序，日期范围对应连续的行
+    dates = table['交易日期'].to_numpy().astype('datetime64[ns]')
+    lo = 0 if date_start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(date_start)), side='left')
+    hi = len(dates) if date_end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(date_end)), side='right')
+
+    names = [c for c in table.column_names if c != '涨跌幅' and not c.startswith(('MA', 'bias'))]
+    names = names + ['涨跌幅'] + _ma_names(ma_list)
+    if columns is not None:
+        names = [c for c in names if c in columns or c == '交易日期']
+    table = table.slice(lo, hi - lo).select(names)
+    return compact_table(table) if compact else table
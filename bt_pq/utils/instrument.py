@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import datetime
+import cProfile
+import tracemalloc
+import tomllib
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录RSS
+    resource = None
+
+
+# 进程的RSS峰值（MB）。Linux的ru_maxrss单位是KB，macOS是字节
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+# 数据规模：DataFrame、numpy数组、BacktestContext 都有 shape 属性
+def _shape(obj):
+    shape = getattr(obj, 'shape', None)
+    if shape is None:
+        return None, None
+    return shape[0], (shape[1] if len(shape) > 1 else 1)
+
+
+# 载入插桩配置，在 future.toml 的 [instrument] 里。环境变量 BT_PROFILE 可以临时指定要做cProfile的步骤
+def load_instrument_config(config_path="./utils/future.toml") -> dict:
+    try:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f).get("instrument", {})
+    except (FileNotFoundError, tomllib.TOMLDecodeError) as e:
+        print(f"❌ 插桩配置读取失败：{e}")
+        config = {}
+    return {
+        'report_dir': config.get('report_dir', './report'),
+        'trace_memory': config.get('trace_memory', True),
+        'profile': os.environ.get('BT_PROFILE', config.get('profile', '')),
+    }
+
+
+# 记录回测流程每一步的耗时、CPU时间、内存和数据规模
+#   recorder = StageRecorder('back_test', cfg)
+#   df = recorder.run('equity_curve', utils.equity_curve, df_pos, f_cfg)
+# 每一步记录：墙钟时间、CPU时间、进程RSS峰值及本步增长、tracemalloc记录的本步新分配内存峰值、输入输出的行列数
+# profile 为步骤名称时该步骤在cProfile下运行，结果保存为 .prof 文件（"all" 表示所有步骤）
+class StageRecorder:
+    def __init__(self, name: str, cfg: dict = None):
+        cfg = load_instrument_config() if cfg is None else cfg
+        self.name = name
+        self.report_dir = cfg['report_dir']
+        self.trace_memory = cfg['trace_memory']
+        self.profile = cfg['profile']
+        self.started = datetime.datetime.now()
+        self.records = []
+
+    def run(self, stage: str, fn, *args, **kwargs):
+        rows_in, cols_in = _shape(args[0]) if args else (None, None)
+        profiler = cProfile.Profile() if self.profile in (stage, 'all') else None
+
+        rss_before = _max_rss_mb()
+        if self.trace_memory:
+            tracemalloc.start()
+            traced_base = tracemalloc.get_traced_memory()[0]
+        t0, c0 = time.perf_counter(), time.process_time()
+
+        if profiler is not None:
+            result = profiler.runcall(fn, *args, **kwargs)
+        else:
+            result = fn(*args, **kwargs)
+
+        wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        traced_peak = None
+        if self.trace_memory:
+            traced_peak = (tracemalloc.get_traced_memory()[1] - traced_base) / 2 ** 20
+            tracemalloc.stop()
+        rss_after = _max_rss_mb()
+
+        rows_out, cols_out = _shape(result)
+        record = {
+            'stage': stage,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rss_peak_mb': rss_after,
+            'rss_growth_mb': None if rss_after is None else rss_after - rss_before,
+            'traced_peak_mb': traced_peak,
+            'rows_in': rows_in,
+            'cols_in': cols_in,
+            'rows_out': rows_out,
+            'cols_out': cols_out,
+        }
+        if profiler is not None:
+            record['profile'] = self._dump_profile(profiler, stage)
+        self.records.append(record)
+        return result
+
+    def _dump_profile(self, profiler: cProfile.Profile, stage: str) -> str:
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{self.name}-{self.started.strftime('%Y%m%d-%H%M%S')}-{stage}.prof")
+        profiler.dump_stats(path)
+        return path
+
+    def report(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records)
+
+    # 保存报告：同名的 .json 和 .csv，返回json文件路径
+    def save(self) -> str:
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{self.name}-{self.started.strftime('%Y%m%d-%H%M%S')}")
+        with open(f"{path}.json", 'w', encoding='utf-8') as f:
+            json.dump({'name': self.name, 'started': self.started.isoformat(timespec='seconds'), 'stages': self.records},
+                      f, ensure_ascii=False, indent=2)
+        self.report().to_csv(f"{path}.csv", index=False, encoding='utf-8-sig')
+        return f"{path}.json"
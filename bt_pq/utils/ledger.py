@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .vectorized import shift_2d, trade_returns_2d
+
+
+# 交易明细：每笔交易一行，由 equity_2d 的逐根K线结果按交易分段聚合，没有逐笔交易的Python循环
+# 一笔交易是持仓方向不变的一段连续K线（即 start_time 相同的K线），从开仓K线到平仓K线
+# 把 (K线数, 列数) 的数组按列展开成一维，每笔交易的开仓位置作为分段起点，用 ufunc.reduceat 一次算出所有交易的聚合值；
+# 两笔交易之间的空仓K线填入不影响结果的值（最小值填inf、最大值填-inf、爆仓填False）
+#   列：第几列资金曲线（参数扫描里的第几组参数）
+#   开仓时间、平仓时间：开仓K线和平仓K线的交易日期（NEXT 模式实际在下一根K线开盘成交）
+#   方向：1 做多，-1 做空；持仓K线数
+#   开仓价、平仓价：含滑点；合约数；手续费：开仓和平仓手续费之和
+#   盈亏：平仓后净值 - 初始资金（已扣手续费）；收益率：和 evaluate_strategy 统计胜率的口径相同
+#   最大不利波动(MAE)、最大有利波动(MFE)：持仓期间按K线最不利、最有利价格计算的浮动盈亏的最小值、最大值
+#   爆仓：持仓期间是否爆仓
+def ledger_2d(trade_time, position_side: np.ndarray, res: dict, high: np.ndarray, low: np.ndarray, cfg: dict) -> pd.DataFrame:
+    trade_time = np.asarray(trade_time, dtype='datetime64[ns]')
+    equity = res['equity_curve']
+    rows, cols = equity.shape
+    ps = np.asarray(position_side, dtype='float64').reshape(rows, cols)
+    holding = ps != 0
+
+    open_col, open_row = np.nonzero(res['open_pos'].T)
+    close_col, close_row = np.nonzero(res['close_pos'].T)
+    starts = open_col * rows + open_row
+
+    def reduce(ufunc, a, fill):
+        a = np.where(holding, a, fill).T.ravel()
+        return ufunc.reduceat(a, starts) if len(starts) else np.empty(0, dtype=a.dtype)
+
+    # 持仓期间K线内最有利的价格，和 equity_2d 计算爆仓用的最不利价格对应
+    high, low = (np.asarray(x, dtype='float64').reshape(-1, 1) for x in (high, low))
+    if cfg['trade_mode'] == 'INSTANTLY':
+        high, low = shift_2d(high, -1), shift_2d(low, -1)
+    with np.errstate(invalid='ignore'):
+        price_max = np.where(ps == 1, high, low)
+        profit_max = cfg['volume_per_lot'] * res['contract_num'] * (price_max - res['entry_price']) * ps
+
+    open_fee = cfg['initial_cash'] - res['cash'][open_row, open_col]
+    _, trade_return = trade_returns_2d(equity, ps)
+
+    return pd.DataFrame({
+        '列': open_col,
+        '开仓时间': trade_time[open_row],
+        '平仓时间': trade_time[close_row],
+        '方向': ps[open_row, open_col],
+        '持仓K线数': close_row - open_row + 1,
+        '开仓价': res['entry_price'][open_row, open_col],
+        '平仓价': res['exit_price'][close_row, close_col],
+        '合约数': res['contract_num'][open_row, open_col],
+        '手续费': open_fee + res['exit_fee'][close_row, close_col],
+        '盈亏': res['net_value'][close_row, close_col] - cfg['initial_cash'],
+        '收益率': trade_return,
+        '最大不利波动': reduce(np.fmin, res['profit_min'], np.inf),
+        '最大有利波动': reduce(np.fmax, profit_max, -np.inf),
+        '爆仓': reduce(np.logical_or, res['is_liquidated'], False),
+    })
+
+
+# 单个回测的交易明细：df 是 equity_curve 的结果（detail=True），去掉只有一列时没有意义的“列”
+def trade_ledger(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    def column(name):
+        return df[name].to_numpy(dtype='float64').reshape(-1, 1)
+
+    ps = column('position_side')
+    open_pos = (ps != 0) & (ps != shift_2d(ps, 1))
+    close_pos = (ps != 0) & (ps != shift_2d(ps, -1))
+    res = {
+        'open_pos': open_pos,
+        'close_pos': close_pos,
+        'equity_curve': column('equity_curve'),
+        'contract_num': column('contract_num'),
+        'entry_price': column('entry_price'),
+        'exit_price': column('exit_price'),
+        'exit_fee': column('exit_fee'),
+        'cash': column('cash'),
+        'net_value': column('net_value'),
+        'profit_min': column('profit_min'),
+        'is_liquidated': column('is_liquidated') == 1,
+    }
+    df_ledger = ledger_2d(df['trade_time'], ps, res, df['high'], df['low'], cfg)
+    return df_ledger.drop(columns=['列'])
+
+
+# 把交易明细写成parquet文件，先写临时文件再改名
+def write_ledger(df: pd.DataFrame, path, compression: str = 'zstd'):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression=compression)
+    os.replace(tmp_path, path)
@@ -60,7 +60,12 @@ def load_future_config(config_path="./utils/future.toml"):
             'invest_margin_ratio': config["invest_margin_ratio"],
             'min_margin_ratio': config["min_margin_ratio"],
             'volume_per_lot': config["volume_per_lot"],
-            'trade_mode': config["trade_mode"]
+            'trade_mode': config["trade_mode"],
+            'low_memory': config.get("low_memory", False),
+            'adjust': config.get("adjust") or None,
+            'stop_loss': config.get("stop_loss", 0),
+            'take_profit': config.get("take_profit", 0),
+            'trailing_stop': config.get("trailing_stop", 0),
         }
     except KeyError as e:
         print(f"❌ 配置项错误: {e}")
@@ -70,6 +75,78 @@ def load_future_config(config_path="./utils/future.toml"):
         return None
 
 
+# 载入各品种的单独配置，返回 {品种名称: {参数: 值}}
+def load_symbol_config(config_path="./utils/symbols.toml"):
+    try:
+        with open(config_path, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        print(f"❌ 错误：配置文件 {config_path} 不存在")
+        return None
+    except tomllib.TOMLDecodeError as e:
+        print(f"❌ TOML 格式错误：{e}")
+        return None
+
+
+# 载入滚动样本外测试的配置，在 future.toml 的 [walk_forward] 里
+def load_walk_forward_config(config_path="./utils/future.toml"):
+    try:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)["walk_forward"]
+    except FileNotFoundError:
+        print(f"❌ 错误：配置文件 {config_path} 不存在")
+        return None
+    except tomllib.TOMLDecodeError as e:
+        print(f"❌ TOML 格式错误：{e}")
+        return None
+    except KeyError:
+        print(f"❌ 配置项错误: 缺少 [walk_forward]")
+        return None
+
+    try:
+        return {
+            'train_bars': int(config["train_bars"]),
+            'test_bars': int(config["test_bars"]),
+            'metric': config["metric"],
+        }
+    except KeyError as e:
+        print(f"❌ 配置项错误: 缺少必要配置项 {e}")
+        return None
+
+
+# 载入蒙特卡洛稳健性分析的配置，在 future.toml 的 [robustness] 里，返回值可以直接作为 robustness 的参数
+def load_robustness_config(config_path="./utils/future.toml"):
+    try:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)["robustness"]
+    except FileNotFoundError:
+        print(f"❌ 错误：配置文件 {config_path} 不存在")
+        return None
+    except tomllib.TOMLDecodeError as e:
+        print(f"❌ TOML 格式错误：{e}")
+        return None
+    except KeyError:
+        print(f"❌ 配置项错误: 缺少 [robustness]")
+        return None
+
+    try:
+        return {
+            'simulations': int(config["simulations"]),
+            'method': config["method"],
+            'ruin': float(config["ruin"]),
+            'quantiles': [float(q) for q in config["quantiles"]],
+            'seed': int(config.get("seed", 0)),
+        }
+    except KeyError as e:
+        print(f"❌ 配置项错误: 缺少必要配置项 {e}")
+        return None
+
+
+# 合并配置：品种单独配置覆盖 future.toml 里的公共配置
+def merge_symbol_config(f_cfg: dict, s_cfg: dict, commodity: str) -> dict:
+    return {**f_cfg, **s_cfg.get(commodity, {}), 'commodity': commodity}
+
+
 def myprint(df: pd.DataFrame)->None:
     # 处理所有datetime类型的列，无需循环
     datetime_cols = df.select_dtypes(include=['datetime64']).columns
@@ -0,0 +1,179 @@
+import os
+import glob
+import json
+import time
+import numpy as np
+import pandas as pd
+from .store import DATASET_ROOT, LATEST_ROOT, list_symbols
+from .features import FEATURE_ROOT, MA_LIST, source_fingerprint, feature_table, _ma_names
+
+# 截面面板：所有品种按共同的交易日历对齐，放在一个连续的 (品种, 交易日期, 字段) float64 数组里
+# ../db_pq/panel/values-<版本>.f64 是数组本身（C顺序，没有文件头），用 np.memmap 映射，读取时不拷贝
+# ../db_pq/panel/meta.json 记录数组文件名、品种、交易日期、字段和每个品种的源数据指纹
+# 每次重建写一个新版本的数组文件，最后才替换 meta.json，读到的 meta.json 和它指向的数组总是配套的
+# 品种在某个交易日没有K线（还没上市、停牌、交易日历不同）时为NaN
+PANEL_ROOT = r"../db_pq/panel"
+PANEL_FIELDS = ['开盘价', '最高价', '最低价', '收盘价', '成交量', '涨跌幅']
+
+
+class Panel:
+    def __init__(self, values: np.ndarray, symbols: list, dates: np.ndarray, fields: list, fingerprints: dict):
+        self.values = values
+        self.symbols = list(symbols)
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.fields = list(fields)
+        self.fingerprints = dict(fingerprints)
+        self._symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self._field_index = {f: i for i, f in enumerate(self.fields)}
+
+    # 一个字段的截面数组 (品种, 交易日期)，是 values 的视图，不拷贝
+    def field(self, name: str) -> np.ndarray:
+        return self.values[:, :, self._field_index[name]]
+
+    # 一个品种的全部字段 (交易日期, 字段)，是 values 的视图，不拷贝
+    def symbol(self, name: str) -> np.ndarray:
+        return self.values[self._symbol_index[name]]
+
+    # 交易日期范围对应的列范围，用于 panel.field(...)[:, window]
+    def window(self, date_start=None, date_end=None) -> slice:
+        lo = 0 if date_start is None else np.searchsorted(self.dates, pd.Timestamp(date_start).to_datetime64(), side='left')
+        hi = len(self.dates) if date_end is None else np.searchsorted(self.dates, pd.Timestamp(date_end).to_datetime64(), side='right')
+        return slice(int(lo), int(hi))
+
+
+def _meta_path(panel_root):
+    return os.path.join(panel_root, 'meta.json')
+
+
+# 读取面板，只读内存映射。面板不存在时返回None
+def load_panel(panel_root=PANEL_ROOT) -> Panel:
+    meta_path = _meta_path(panel_root)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    values_path = os.path.join(panel_root, meta.get('values', 'values.f64'))
+    if not os.path.exists(values_path):
+        return None
+    shape = (len(meta['symbols']), len(meta['dates']), len(meta['fields']))
+    size = os.path.getsize(values_path)
+    if size != 8 * shape[0] * shape[1] * shape[2]:
+        raise ValueError(f"面板数组文件大小和meta.json不一致: {values_path} {size} != {shape}")
+    values = np.memmap(values_path, dtype='float64', mode='r', shape=shape) if all(shape) else np.empty(shape)
+    return Panel(values, meta['symbols'], np.array(meta['dates'], dtype='datetime64[ns]'), meta['fields'], meta['fingerprints'])
+
+
+# 删除旧版本的数组文件，只保留当前和上一个版本（可能还有进程刚读完旧的 meta.json 正要打开它）
+def _remove_old_values(panel_root, keep: list):
+    for path in glob.glob(os.path.join(panel_root, 'values*.f64')):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# 生成或增量更新面板：每个品种的源数据指纹（见 features.source_fingerprint）没有变化时，直接从旧面板复制，
+# 只有数据库更新过的品种才读取指标缓存。交易日历是所有品种交易日期的并集，新增日期时整个文件重写（顺序拷贝，很快），
+# 字段或品种列表变化（有品种被删除）时全部重建。新数组写成新版本的文件，正在读旧面板的进程不受影响
+# 字段：开高低收、成交量、涨跌幅，加上 ma_list 里每条均线的 MA/bias（来自指标缓存）
+def build_panel(symbols: list = None, ma_list: list = MA_LIST, panel_root=PANEL_ROOT, feature_root=FEATURE_ROOT,
+                root=DATASET_ROOT, latest_root=LATEST_ROOT) -> Panel:
+    symbols = sorted(list_symbols(root, latest_root) if symbols is None else symbols)
+    fields = PANEL_FIELDS + _ma_names(ma_list)
+    fingerprints = {s: source_fingerprint(s, root, latest_root) for s in symbols}
+
+    old = load_panel(panel_root)
+    if old is not None and (old.fields != fields or not set(old.symbols) <= set(symbols)):
+        old = None
+    if old is not None and old.symbols == symbols and old.fingerprints == fingerprints:
+        return old
+
+    # 只读取新增和有变化的品种
+    changed = {}
+    for s in symbols:
+        if old is not None and old.fingerprints.get(s) == fingerprints[s]:
+            continue
+        table = feature_table(s, ma_list, feature_root, root, latest_root)
+        if table is None:
+            continue
+        dates = table['交易日期'].to_numpy().astype('datetime64[ns]')
+        changed[s] = (dates, np.column_stack([table[f].to_numpy().astype('float64') for f in fields]))
+    symbols = [s for s in symbols if s in changed or (old is not None and s in old.fingerprints)]
+    # 重新读取失败的品种保留旧数据和旧指纹，下次重建时再读
+    fingerprints = {s: fingerprints[s] if s in changed else old.fingerprints[s] for s in symbols}
+
+    calendar = [old.dates] if old is not None else []
+    calendar = np.unique(np.concatenate(calendar + [dates for dates, _ in changed.values()] or [np.empty(0, 'datetime64[ns]')]))
+
+    os.makedirs(panel_root, exist_ok=True)
+    meta_path = _meta_path(panel_root)
+    previous = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            previous = json.load(f).get('values', 'values.f64')
+    name = f"values-{time.time_ns()}.f64"
+    values_path = os.path.join(panel_root, name)
+    shape = (len(symbols), len(calendar), len(fields))
+    if all(shape):
+        values = np.memmap(values_path, dtype='float64', mode='w+', shape=shape)
+        values[:] = np.nan
+        old_cols = None if old is None else np.searchsorted(calendar, old.dates)
+        for i, s in enumerate(symbols):
+            if s in changed:
+                dates, data = changed[s]
+                values[i, np.searchsorted(calendar, dates)] = data
+            elif len(calendar) == len(old.dates):
+                values[i] = old.symbol(s)
+            else:
+                values[i, old_cols] = old.symbol(s)
+        values.flush()
+        del values
+    else:
+        open(values_path, 'wb').close()
+
+    meta = {
+        'values': name,
+        'symbols': symbols,
+        'dates': [str(d) for d in calendar.astype('datetime64[D]')],
+        'fields': fields,
+        'fingerprints': fingerprints,
+    }
+    # meta.json 最后替换，之后读取的进程才会看到新的数组文件
+    tmp_path = os.path.join(panel_root, '.meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+    _remove_old_values(panel_root, [name, previous])
+    print(f"截面面板：{len(symbols)}个品种 × {len(calendar)}个交易日 × {len(fields)}个字段，重新读取{len(changed)}个品种")
+    return load_panel(panel_root)
+
+
+# 截面排名：每个交易日（axis=1 的每一列）在所有品种之间排名，缩放到 0~1，最小为0，最大为1
+# NaN不参与排名，结果也是NaN；只有一个有效值的交易日为0.5。数值相同时按品种顺序排
+# a 是 (品种, 交易日期) 的数组，如 panel.field('收盘价') 或由它算出的动量
+def cs_rank(a: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype='float64')
+    valid = ~np.isnan(a)
+    # NaN排在最后，排名只取决于前面的有效值
+    order = np.argsort(a, axis=0, kind='stable')
+    rank = np.empty(a.shape)
+    np.put_along_axis(rank, order, np.arange(a.shape[0], dtype='float64').reshape(-1, 1), axis=0)
+    count = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rank = np.where(count > 1, rank / (count - 1), 0.5)
+    return np.where(valid, rank, np.nan)
+
+
+# 截面标准化：每个交易日在所有品种之间减去均值、除以标准差（总体标准差），NaN不参与计算
+# 有效值少于2个或标准差为0的交易日结果为NaN
+def cs_zscore(a: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype='float64')
+    valid = ~np.isnan(a)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, a, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = filled.sum(axis=0) / count
+        std = np.sqrt(np.where(valid, (a - mean) ** 2, 0.0).sum(axis=0) / count)
+        z = (a - mean) / std
+    return np.where(valid & (count > 1) & (std > 0), z, np.nan)
@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from .methods import merge_symbol_config
+from .position import next, instant
+from .calculate import equity_curve, evaluate_strategy
+from .store import list_symbols
+from .features import load_ma_bias, strategy_columns, MA_LIST
+from .result_cache import result_key
+
+
+# 单个品种的完整回测流程：load_ma_bias（指标缓存） -> 策略 -> next/instant -> equity_curve -> evaluate_strategy
+# 在子进程中运行，所以只返回资金曲线和评价结果，不返回中间的大表
+# cfg['low_memory'] 为真时只载入策略声明的列，资金曲线不生成明细列
+# cache：结果缓存（ResultCache），输入都没有变化时直接返回上次的结果
+def back_test_symbol(commodity: str, cfg: dict, strategy, ma_list: list = MA_LIST, cache=None):
+    key = None
+    if cache is not None and cache.enabled:
+        key = result_key(commodity, strategy, cfg, ma_list)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    low_memory = cfg.get('low_memory', False)
+    columns = strategy_columns(strategy) if low_memory else None
+    df_ma_bias = load_ma_bias(commodity, cfg['date_start'], cfg['date_end'], ma_list, columns=columns, compact=low_memory,
+                              adjust=cfg.get('adjust'))
+    if df_ma_bias is None or len(df_ma_bias) < 2:
+        return None
+
+    df_signal = strategy(df_ma_bias)
+    df_pos = (next(df_signal) if cfg['trade_mode'] == 'NEXT' else instant(df_signal))
+    df_equity = equity_curve(df_pos, cfg, detail=not low_memory)
+    df_evaluate = evaluate_strategy(df_equity)
+
+    result = df_equity.set_index('trade_time')['equity_curve'], df_evaluate
+    if key is not None:
+        cache.put(key, result)
+    return result
+
+
+# 多品种组合回测：每个品种分到多个进程里回测，symbols 为空时回测数据集里的所有品种
+# 返回组合资金曲线（各品种等权）和每个品种的评价表
+def portfolio_back_test(f_cfg: dict, s_cfg: dict, strategy, symbols: list = None, ma_list: list = MA_LIST, max_workers: int = None,
+                        cache=None):
+    symbols = list_symbols() if symbols is None else symbols
+
+    curves, evaluates = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for commodity in symbols:
+            cfg = merge_symbol_config(f_cfg, s_cfg, commodity)
+            futures[pool.submit(back_test_symbol, commodity, cfg, strategy, ma_list, cache)] = commodity
+
+        for future in as_completed(futures):
+            commodity = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {commodity} 回测失败：{e}")
+                continue
+            if result is None:
+                print(f"{commodity} 在回测日期范围内没有足够的数据，跳过")
+                continue
+            curves[commodity], evaluates[commodity] = result
+
+    # 各品种资金曲线按日期对齐：品种上市前净值为1，停牌等缺失日期沿用前值
+    df_curves = pd.DataFrame(curves).sort_index().ffill().fillna(1.0)
+    df_curves = df_curves[sorted(df_curves.columns)]
+
+    # 组合资金曲线：每个品种分配相同资金，组合净值=各品种净值的平均
+    df_portfolio = pd.DataFrame({
+        'trade_time': df_curves.index,
+        'equity_curve': df_curves.mean(axis=1).to_numpy(),
+    })
+
+    df_symbols = pd.concat(evaluates, names=['品种']).droplevel(1).sort_index()
+    return df_portfolio, df_symbols, df_curves
@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from .store import load_table, source_files, list_symbols, compact_table
+from .features import source_fingerprint, write_cache
+
+# db_pq 维护的1分钟K线数据集，按品种、年份分区
+MINUTE_ROOT = r"../db_pq/dataset_1m"
+# 合成的X分钟K线缓存：../db_pq/resampled/15m/螺纹钢主连.arrow，记录源数据指纹，分钟数据更新后自动重算
+RESAMPLE_ROOT = r"../db_pq/resampled"
+RESAMPLE_MINUTES = [5, 15, 30, 60]
+
+_MINUTE_NS = 60 * 10 ** 9
+_DAY_NS = 24 * 60 * _MINUTE_NS
+
+
+# 每根分钟K线所属的交易日（1970-01-01起的天数）
+# 日盘（8:00~16:00）属于当天；夜盘（20:00以后、凌晨4:00以前）属于之后第一个有日盘的日期，
+# 这样周五夜盘归到下周一，节假日前的夜盘归到节后第一个交易日
+# 数据末尾还没有日盘的夜盘，按自然日推算到下一个工作日
+def _trading_day(t: np.ndarray) -> np.ndarray:
+    day = t // _DAY_NS
+    minute = t // _MINUTE_NS % (24 * 60)
+    day_session = (minute >= 8 * 60) & (minute < 16 * 60)
+
+    # 向后填充：每根K线取它之后（含自己）第一根日盘K线的日期
+    n = len(t)
+    nxt = np.where(day_session, np.arange(n), n)
+    nxt = np.minimum.accumulate(nxt[::-1])[::-1]
+    result = day[np.minimum(nxt, n - 1)]
+
+    tail = nxt == n
+    if tail.any():
+        # 晚上的夜盘属于第二天，凌晨的属于当天；遇到周六、周日顺延到周一（1970-01-01是周四）
+        guess = day[tail] + (minute[tail] >= 16 * 60)
+        weekday = (guess + 3) % 7
+        result[tail] = guess + np.where(weekday == 5, 2, np.where(weekday == 6, 1, 0))
+    return result
+
+
+# 把一个品种的1分钟K线合成为 minutes 分钟K线，全部是numpy的向量化运算
+# 时段划分：从18:00起按 minutes 分钟对齐时钟切分（如15分钟K线是 21:00、21:15 …、9:00、9:15 …），
+# 同一根K线不会跨交易日，午休、小节休息只是让所在的K线少几根分钟数据
+# minutes 不小于1440时按交易日合成日K线
+# 开盘价取第一根，收盘价、合约代码取最后一根，最高、最低、成交量分别取最大、最小、求和
+# 交易日期是K线的起始时间（日K线是交易日0点），另加一列 交易日
+def resample_table(table: pa.Table, minutes: int) -> pa.Table:
+    t = table['交易日期'].to_numpy().astype('datetime64[ns]').view('int64')
+    if len(t) == 0:
+        return table.append_column('交易日', pa.array([], pa.date32()))
+
+    trading_day = _trading_day(t)
+    # 距18:00的分钟数，夜盘在前、日盘在后，同一交易日内单调递增
+    offset = (t // _MINUTE_NS - 18 * 60) % (24 * 60)
+    bucket = offset // minutes if minutes < 24 * 60 else np.zeros_like(offset)
+    key = trading_day * (24 * 60) + bucket
+
+    starts = np.flatnonzero(np.diff(key, prepend=key[0] - 1))
+    ends = np.append(starts[1:], len(t)) - 1
+
+    if minutes < 24 * 60:
+        begin = t[starts] - (offset[starts] - bucket[starts] * minutes) * _MINUTE_NS
+    else:
+        begin = trading_day[starts] * _DAY_NS
+
+    columns = {
+        '交易日期': pa.array(begin.view('datetime64[ns]')),
+        '交易所': table['交易所'].take(starts),
+        '主连名称': table['主连名称'].take(starts),
+        '合约代码': table['合约代码'].take(ends),
+        '开盘价': pa.array(table['开盘价'].to_numpy()[starts]),
+        '最高价': pa.array(np.maximum.reduceat(table['最高价'].to_numpy(), starts)),
+        '最低价': pa.array(np.minimum.reduceat(table['最低价'].to_numpy(), starts)),
+        '收盘价': pa.array(table['收盘价'].to_numpy()[ends]),
+        '成交量': pa.array(np.add.reduceat(table['成交量'].to_numpy(), starts)),
+        '交易日': pa.array(trading_day[starts].astype('datetime64[D]')),
+    }
+    return pa.table(columns)
+
+
+# 读取一个品种的 minutes 分钟K线表（pa.Table，内存映射）
+# 缓存不存在或分钟数据有变化时，从分钟数据集重新合成
+def resampled_table(symbol: str, minutes: int, resample_root=RESAMPLE_ROOT, root=MINUTE_ROOT) -> pa.Table:
+    path = os.path.join(resample_root, f"{minutes}m", f"{symbol}.arrow")
+    # 分钟数据没有 latest 文件夹，源数据只看数据集
+    if not source_files(symbol, root, root):
+        print(f"❌ 没有找到品种的分钟K线数据: {symbol}")
+        return None
+    fingerprint = source_fingerprint(symbol, root, root)
+
+    if os.path.exists(path):
+        schema = pa.ipc.open_file(pa.memory_map(path)).schema
+        if (schema.metadata or {}).get(b'source') == fingerprint.encode():
+            return feather.read_table(path, memory_map=True)
+
+    table = load_table(symbol, root=root, latest_root=root).replace_schema_metadata(None)
+    write_cache(resample_table(table, minutes), path, fingerprint)
+    return feather.read_table(path, memory_map=True)
+
+
+# 载入 minutes 分钟K线，列和 load_bars 相同（外加 交易日），交易日期是K线起始时间
+# compact：低内存模式，见 store.compact_table
+def load_resampled(symbol: str, minutes: int, date_start=None, date_end=None,
+                   resample_root=RESAMPLE_ROOT, root=MINUTE_ROOT, compact: bool = False) -> pd.DataFrame:
+    table = resampled_table(symbol, minutes, resample_root, root)
+    if table is None:
+        return None
+
+    dates = table['交易日期'].to_numpy()
+    lo = 0 if date_start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(date_start)), side='left')
+    hi = len(dates) if date_end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(date_end)), side='right')
+    table = table.slice(lo, hi - lo)
+    return (compact_table(table) if compact else table).to_pandas(split_blocks=True)
+
+
+# 给分钟数据集里的所有品种生成各周期的缓存，返回生成的品种数量
+def build_resampled(minutes_list: list = RESAMPLE_MINUTES, resample_root=RESAMPLE_ROOT, root=MINUTE_ROOT) -> int:
+    symbols = list_symbols(root, root)
+    for symbol in symbols:
+        for minutes in minutes_list:
+            resampled_table(symbol, minutes, resample_root, root)
+    return len(symbols)
@@ -0,0 +1,131 @@
+import os
+import glob
+import json
+import pickle
+import hashlib
+import inspect
+import tomllib
+from functools import partial
+from .store import DATASET_ROOT, LATEST_ROOT
+from .features import MA_LIST, source_fingerprint
+
+# 回测结果缓存：相同的源数据、策略代码和参数、配置，直接返回上次的资金曲线和评价结果
+# 每个结果一个文件 ./cache/<键>.pkl，键是所有输入的哈希，任何输入变化键都会变，旧结果不会被读到，最终被淘汰
+# 缓存总大小超过上限时，按最后一次使用的时间（文件修改时间，命中时更新）从旧到新删除
+RESULT_ROOT = r"./cache"
+
+# 回测引擎的代码：这些文件修改后，所有缓存的结果都失效
+ENGINE_FILES = ['position.py', 'calculate.py', 'vectorized.py', 'features.py', 'store.py', 'portfolio.py', 'context.py']
+
+
+# 载入结果缓存配置，在 future.toml 的 [result_cache] 里
+def load_result_cache_config(config_path="./utils/future.toml") -> dict:
+    try:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f).get("result_cache", {})
+    except (FileNotFoundError, tomllib.TOMLDecodeError) as e:
+        print(f"❌ 结果缓存配置读取失败：{e}")
+        config = {}
+    return {
+        'enabled': config.get('enabled', True),
+        'root': config.get('root', RESULT_ROOT),
+        'max_mb': float(config.get('max_mb', 512)),
+    }
+
+
+def _hash_file(h, path):
+    with open(path, 'rb') as f:
+        h.update(f.read())
+
+
+# 策略的代码和参数：策略函数所在的整个源文件（策略里调用的辅助函数一般在同一个文件），
+# 函数名，以及 functools.partial 绑定的参数
+def strategy_fingerprint(strategy) -> str:
+    func, args, kwargs = (strategy.func, strategy.args, strategy.keywords) if isinstance(strategy, partial) else (strategy, (), {})
+    h = hashlib.sha256()
+    h.update(f"{func.__module__}.{func.__qualname__}|{args!r}|{sorted(kwargs.items())!r}\n".encode())
+    try:
+        _hash_file(h, inspect.getsourcefile(func))
+    except (TypeError, OSError):
+        h.update(func.__code__.co_code)
+    return h.hexdigest()
+
+
+def _engine_fingerprint() -> str:
+    h = hashlib.sha256()
+    for name in ENGINE_FILES:
+        _hash_file(h, os.path.join(os.path.dirname(__file__), name))
+    return h.hexdigest()
+
+
+# 一次回测的缓存键：源数据指纹（文件名、大小、修改时间，复权时包括换月索引）、策略指纹、配置、均线列表、引擎代码
+def result_key(commodity: str, strategy, cfg: dict, ma_list: list = MA_LIST, root=DATASET_ROOT, latest_root=LATEST_ROOT) -> str:
+    h = hashlib.sha256()
+    h.update(source_fingerprint(commodity, root, latest_root, cfg.get('adjust')).encode())
+    h.update(strategy_fingerprint(strategy).encode())
+    h.update(json.dumps({**cfg, 'commodity': commodity}, sort_keys=True, default=str, ensure_ascii=False).encode())
+    h.update(repr(list(ma_list)).encode())
+    h.update(_engine_fingerprint().encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cfg: dict = None):
+        cfg = load_result_cache_config() if cfg is None else cfg
+        self.enabled = cfg['enabled']
+        self.root = cfg['root']
+        self.max_bytes = int(cfg['max_mb'] * 1024 * 1024)
+
+    def _path(self, key: str):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    # 命中时返回缓存的结果，并更新文件修改时间作为最后一次使用的时间；没有命中返回None
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # 刚好被其他进程淘汰
+            pass
+        return value
+
+    # 保存结果：先写临时文件再改名，多个进程同时写同一个键也不会读到不完整的文件。写入后检查总大小
+    def put(self, key: str, value):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        tmp_path = os.path.join(self.root, f".{key}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    # 总大小超过上限时，从最久没有使用的结果开始删除
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.root, '*.pkl')):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.root, '*.pkl')):
+            os.remove(path)
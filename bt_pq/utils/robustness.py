@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from .vectorized import trade_returns_2d
+
+
+# 从 equity_curve 的结果里取出每笔交易的收益率：start_time（开仓时间）相同的连续K线是同一笔交易
+# 收益率 = 这笔交易最后一根K线的净值 / 开仓前一根K线的净值 - 1，和 evaluate_strategy 统计胜率的口径相同
+def trade_returns(df: pd.DataFrame) -> np.ndarray:
+    start_time = df['start_time'].to_numpy(dtype='datetime64[ns]').view('int64')
+    equity = df['equity_curve'].to_numpy(dtype='float64')
+    nat = np.datetime64('NaT').astype('datetime64[ns]').view('int64')
+
+    holding = start_time != nat
+    first = holding & (start_time != np.append(nat, start_time[:-1]))
+    last = holding & (start_time != np.append(start_time[1:], nat))
+    before = np.append(1.0, equity[:-1])
+    return equity[last] / before[first] - 1
+
+
+# 对交易收益率序列做蒙特卡洛模拟，每列资金曲线输出一行：最终净值、最大回撤的分位数，和爆仓概率
+# col, returns：每笔交易所在的列和收益率（trade_returns_2d 的结果，按列排序），cols 为总列数
+# method：bootstrap 为有放回地抽取同样笔数的交易；shuffle 为打乱交易顺序
+#         （shuffle 不改变最终净值，只看交易顺序对回撤的影响）
+# 模拟净值从1开始，每笔交易后乘以 1+收益率，跌到 ruin 及以下算爆仓
+# 多列、全部模拟放在一个 (列数, 模拟次数, 交易笔数) 的数组里一起计算。列按交易笔数排序后分批，
+# 同一批里交易少的列用收益率0补齐，补齐的部分很少；max_cells 控制每批的数组大小
+def simulate_trades(col: np.ndarray, returns: np.ndarray, cols: int, simulations: int = 10000, method: str = 'bootstrap',
+                    ruin: float = 0.5, quantiles: list = (0.05, 0.5, 0.95), seed: int = 0, max_cells: int = 4_000_000) -> pd.DataFrame:
+    if method not in ('bootstrap', 'shuffle'):
+        raise ValueError(f"未知的模拟方法: {method}")
+
+    rng = np.random.default_rng(seed)
+    count = np.bincount(col, minlength=cols)
+    offset = np.append(0, np.cumsum(count)[:-1])
+    growth = np.append(1 + np.asarray(returns, dtype='float64'), 1.0)  # 最后一个位置是补齐用的收益率0
+
+    final = np.ones((cols, simulations))
+    draw_down = np.zeros((cols, simulations))
+    ruined = np.zeros((cols, simulations), dtype=bool)
+
+    order = np.argsort(count, kind='stable')
+    i = np.searchsorted(count[order], 1)  # 没有交易的列净值一直是1
+    while i < cols:
+        # 这一批的列：交易笔数最多的列决定数组宽度
+        j = i + 1
+        while j < cols and (j + 1 - i) * simulations * count[order[j]] <= max_cells:
+            j += 1
+        batch = order[i:j]
+        width = count[batch[-1]]
+        k = count[batch].reshape(-1, 1, 1)
+        shape = (len(batch), simulations, width)
+
+        if method == 'bootstrap':
+            # 每次模拟抽k笔，放在前k个位置，之后的位置补齐
+            pick = rng.integers(0, k, size=shape)
+            pad = np.broadcast_to(np.arange(width) >= k, shape)
+        else:
+            # 每次模拟取一组随机数排序，得到 0 ~ width-1 的排列，其中不小于k的位置补齐。
+            # 补齐的收益率是0，不影响净值路径，剩下的k笔交易是随机顺序
+            pick = np.argsort(rng.random(shape), axis=2)
+            pad = pick >= k
+        index = offset[batch].reshape(-1, 1, 1) + pick
+        index[pad] = len(growth) - 1
+
+        path = growth[index]
+        np.cumprod(path, axis=2, out=path)
+        final[batch] = path[:, :, -1]
+        ruined[batch] = path.min(axis=2) <= ruin
+        # 回撤相对历史最高净值，初始净值1也算在内；原地计算，不再分配同样大的数组
+        peak = np.maximum.accumulate(path, axis=2)
+        np.maximum(peak, 1.0, out=peak)
+        np.divide(path, peak, out=path)
+        draw_down[batch] = np.minimum(path.min(axis=2) - 1, 0.0)
+        i = j
+
+    columns = {}
+    for q, value in zip(quantiles, np.quantile(final, quantiles, axis=1)):
+        columns[f'最终净值{q:.0%}分位'] = value
+    for q, value in zip(quantiles, np.quantile(draw_down, quantiles, axis=1)):
+        columns[f'最大回撤{q:.0%}分位'] = value
+    columns['爆仓概率'] = ruined.mean(axis=1)
+    return pd.DataFrame(columns)
+
+
+# 单个回测的稳健性分析：df 是 equity_curve 的结果（需要 start_time、equity_curve 两列），返回一行
+def robustness(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    returns = trade_returns(df)
+    return simulate_trades(np.zeros(len(returns), dtype='int64'), returns, 1, **kwargs)
+
+
+# 批量版本：每列资金曲线一行，可以直接和 evaluate_2d 的结果拼在一起，参数扫描里每组参数都能算
+def robustness_2d(equity: np.ndarray, position_side: np.ndarray, **kwargs) -> pd.DataFrame:
+    equity = np.asarray(equity, dtype='float64')
+    equity = equity.reshape(len(equity), -1)
+    col, returns = trade_returns_2d(equity, position_side)
+    return simulate_trades(col, returns, equity.shape[1], **kwargs)
@@ -0,0 +1,203 @@
+import re
+import json
+import time
+import tomllib
+import urllib.error
+import urllib.request
+from functools import partial
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+from .methods import merge_symbol_config
+from .position import next, instant
+from .calculate import equity_curve, evaluate_strategy
+from .store import DATASET_ROOT, LATEST_ROOT, list_symbols
+from .features import FEATURE_ROOT, MA_LIST, source_fingerprint, load_ma_bias, strategy_columns
+
+# 常驻的回测服务：进程启动时导入一次pandas、pyarrow，读一次配置，各品种的K线和指标解码后一直放在内存里，
+# 之后每个回测请求只运行 策略 -> next/instant -> equity_curve -> evaluate_strategy
+# 每个请求先检查这个品种的源数据指纹（只是几次 os.stat），数据库更新过的品种才重新读取
+
+
+# 载入回测服务配置，在 future.toml 的 [server] 里
+def load_server_config(config_path="./utils/future.toml") -> dict:
+    try:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f).get("server", {})
+    except (FileNotFoundError, tomllib.TOMLDecodeError) as e:
+        print(f"❌ 回测服务配置读取失败：{e}")
+        config = {}
+    return {
+        'host': config.get('host', '127.0.0.1'),
+        'port': int(config.get('port', 8765)),
+        'preload': config.get('preload', True),
+    }
+
+
+# 请求里的配置覆盖项：日期转换为Timestamp，其余原样覆盖
+def _overrides(overrides: dict) -> dict:
+    overrides = dict(overrides or {})
+    for key in ('date_start', 'date_end'):
+        if overrides.get(key) is not None:
+            overrides[key] = pd.to_datetime(overrides[key])
+    return overrides
+
+
+def _json_default(obj):
+    if hasattr(obj, 'item'):  # numpy 标量
+        return obj.item()
+    return str(obj)
+
+
+class BacktestServer:
+    # f_cfg、s_cfg：load_future_config、load_symbol_config 的结果，请求里的配置覆盖在它们之上
+    # strategies：{名称: 策略函数}，请求按名称选择策略，参数用 functools.partial 绑定
+    def __init__(self, f_cfg: dict, strategies: dict, s_cfg: dict = None, ma_list: list = MA_LIST,
+                 feature_root=FEATURE_ROOT, root=DATASET_ROOT, latest_root=LATEST_ROOT):
+        self.f_cfg = f_cfg
+        self.s_cfg = s_cfg or {}
+        self.strategies = strategies
+        self.ma_list = list(ma_list)
+        self.feature_root, self.root, self.latest_root = feature_root, root, latest_root
+        # (品种, 复权方式) -> {'fingerprint': 源数据指纹, 'df': 全部历史K线和指标, 'dates': 交易日期}
+        self.hot = {}
+
+    def _load(self, symbol: str, adjust: str, fingerprint: str) -> dict:
+        df = load_ma_bias(symbol, ma_list=self.ma_list, feature_root=self.feature_root, root=self.root,
+                          latest_root=self.latest_root, adjust=adjust)
+        if df is None:
+            raise ValueError(f"没有找到品种的K线数据: {symbol}")
+        entry = {'fingerprint': fingerprint, 'df': df, 'dates': df['交易日期'].to_numpy()}
+        self.hot[(symbol, adjust)] = entry
+        return entry
+
+    # 品种的全部历史K线和指标。源数据没有变化时直接返回内存里的，否则重新读取
+    # columns 里有内存中没有的均线（如 MA37）时，从指标缓存读取这几列追加进来
+    def bars(self, symbol: str, adjust: str = None, columns: list = None) -> dict:
+        fingerprint = source_fingerprint(symbol, self.root, self.latest_root, adjust)
+        entry = self.hot.get((symbol, adjust))
+        if entry is None or entry['fingerprint'] != fingerprint:
+            entry = self._load(symbol, adjust, fingerprint)
+
+        missing = sorted({int(m.group(1)) for c in columns or [] if c not in entry['df']
+                          for m in [re.fullmatch(r'(?:MA|bias)(\d+)', c)] if m})
+        if missing:
+            df_ma = load_ma_bias(symbol, ma_list=missing, feature_root=self.feature_root, root=self.root,
+                                 latest_root=self.latest_root, columns=[f'{p}{n}' for n in missing for p in ('MA', 'bias')],
+                                 adjust=adjust)
+            entry['df'] = pd.concat([entry['df'], df_ma.drop(columns=['交易日期'])], axis=1)
+        return entry
+
+    # 启动时载入所有品种
+    def preload(self, symbols: list = None):
+        symbols = list_symbols(self.root, self.latest_root) if symbols is None else symbols
+        for symbol in symbols:
+            self.bars(symbol, self.f_cfg.get('adjust'))
+        return len(symbols)
+
+    # 数据库更新后调用：重新读取源数据有变化的品种，返回这些品种
+    def refresh(self) -> list:
+        reloaded = []
+        for (symbol, adjust), entry in list(self.hot.items()):
+            fingerprint = source_fingerprint(symbol, self.root, self.latest_root, adjust)
+            if fingerprint != entry['fingerprint']:
+                self._load(symbol, adjust, fingerprint)
+                reloaded.append(symbol)
+        return reloaded
+
+    # 一个回测请求：{'symbol': 品种, 'strategy': 策略名称, 'params': {参数}, 'config': {配置覆盖}, 'equity': 是否返回资金曲线}
+    # 返回评价结果（和 evaluate_strategy 相同的指标），需要时附带资金曲线
+    def back_test(self, request: dict) -> dict:
+        started = time.perf_counter()
+        symbol = request['symbol']
+        name = request.get('strategy', 's01')
+        if name not in self.strategies:
+            raise ValueError(f"未知的策略: {name}")
+        strategy = partial(self.strategies[name], **(request.get('params') or {}))
+        cfg = {**merge_symbol_config(self.f_cfg, self.s_cfg, symbol), **_overrides(request.get('config'))}
+
+        entry = self.bars(symbol, cfg.get('adjust'), strategy_columns(strategy))
+        dates = entry['dates']
+        lo = 0 if cfg.get('date_start') is None else np.searchsorted(dates, cfg['date_start'].to_datetime64(), side='left')
+        hi = len(dates) if cfg.get('date_end') is None else np.searchsorted(dates, cfg['date_end'].to_datetime64(), side='right')
+        if hi - lo < 2:
+            raise ValueError(f"{symbol} 在回测日期范围内没有足够的数据")
+        df = entry['df'].iloc[lo:hi].reset_index(drop=True)
+
+        df_signal = strategy(df)
+        df_pos = next(df_signal) if cfg['trade_mode'] == 'NEXT' else instant(df_signal)
+        df_equity = equity_curve(df_pos, cfg, detail=False)
+        df_evaluate = evaluate_strategy(df_equity)
+
+        result = {'symbol': symbol, 'strategy': name, 'params': request.get('params') or {},
+                  'evaluate': df_evaluate.iloc[0].to_dict()}
+        if request.get('equity'):
+            result['equity'] = {'trade_time': [str(t.date()) for t in df_equity['trade_time']],
+                                'equity_curve': df_equity['equity_curve'].tolist()}
+        result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        return result
+
+
+# HTTP接口，只监听本机：
+#   POST /backtest  请求体是 back_test 的请求JSON
+#   POST /refresh   重新读取数据库更新过的品种
+#   GET  /symbols   内存里的品种
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'bt_pq'
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        backtest = self.server.backtest
+        if self.path == '/symbols':
+            self._reply(200, {'symbols': sorted({symbol for symbol, _ in backtest.hot})})
+        else:
+            self._reply(404, {'error': f"未知的路径: {self.path}"})
+
+    def do_POST(self):
+        backtest = self.server.backtest
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/backtest':
+                self._reply(200, backtest.back_test(request))
+            elif self.path == '/refresh':
+                self._reply(200, {'reloaded': backtest.refresh()})
+            else:
+                self._reply(404, {'error': f"未知的路径: {self.path}"})
+        except Exception as e:
+            print(f"❌ 请求失败：{e!r}")
+            self._reply(400, {'error': repr(e)})
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+
+# 启动服务，一直运行到 Ctrl+C。请求逐个处理，同一时间只有一个回测在运行
+def serve(backtest: BacktestServer, host: str = '127.0.0.1', port: int = 8765):
+    httpd = HTTPServer((host, port), _Handler)
+    httpd.backtest = backtest
+    print(f"回测服务已启动：http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+# 客户端：发送一个回测请求，返回结果字典；path 为 '/refresh' 时让服务重新读取更新过的品种
+def request_back_test(request: dict, host: str = '127.0.0.1', port: int = 8765, path: str = '/backtest', timeout: float = 60) -> dict:
+    data = json.dumps(request, ensure_ascii=False).encode('utf-8')
+    req = urllib.request.Request(f"http://{host}:{port}{path}", data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
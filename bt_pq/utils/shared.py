@@ -0,0 +1,44 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+# 把K线的各列放进共享内存，子进程按名称直接映射，不用每个进程各自读文件或反序列化DataFrame
+# 交易日期单独放一块int64（纳秒），其余float64列按列连续存放在一块 (K线数, 列数) 的内存里
+# 返回 (SharedMemory列表, spec)。spec 很小，可以传给子进程；主进程用完后调用 release_shared 释放
+def share_bars(df, columns: list) -> tuple:
+    n = len(df)
+    blocks, spec = [], {'rows': n, 'columns': list(columns)}
+
+    dates = np.asarray(df['交易日期'], dtype='datetime64[ns]').view('int64')
+    shm = shared_memory.SharedMemory(create=True, size=max(dates.nbytes, 1))
+    np.ndarray(dates.shape, dtype='int64', buffer=shm.buf)[:] = dates
+    blocks.append(shm)
+    spec['dates'] = shm.name
+
+    shm = shared_memory.SharedMemory(create=True, size=max(n * len(columns) * 8, 1))
+    values = np.ndarray((n, len(columns)), dtype='float64', buffer=shm.buf, order='F')
+    for i, col in enumerate(columns):
+        values[:, i] = np.asarray(df[col], dtype='float64')
+    blocks.append(shm)
+    spec['values'] = shm.name
+    return blocks, spec
+
+
+# 子进程里映射共享内存，返回 (SharedMemory列表, {列名: 数组})，数组直接指向共享内存，不拷贝
+# 返回的SharedMemory对象要一直持有，否则映射会被关闭
+# 进程池的子进程和主进程共用一个资源跟踪进程，子进程映射时的登记不会重复，由主进程统一 unlink
+def attach_bars(spec: dict) -> tuple:
+    blocks = [shared_memory.SharedMemory(name=spec['dates']), shared_memory.SharedMemory(name=spec['values'])]
+    n, columns = spec['rows'], spec['columns']
+    bars = {'交易日期': np.ndarray((n,), dtype='int64', buffer=blocks[0].buf).view('datetime64[ns]')}
+    values = np.ndarray((n, len(columns)), dtype='float64', buffer=blocks[1].buf, order='F')
+    for i, col in enumerate(columns):
+        bars[col] = values[:, i]
+    return blocks, bars
+
+
+# 主进程用完后关闭并删除共享内存
+def release_shared(blocks: list):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
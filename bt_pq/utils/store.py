@@ -0,0 +1,220 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# db_pq 维护的按品种分区的数据集；还没有生成数据集时，退回读取 latest 文件夹里每个品种一个的parquet文件
+DATASET_ROOT = r"../db_pq/dataset"
+LATEST_ROOT = r"../db_pq/latest"
+# db_pq 维护的换月索引，每个品种一个文件，记录每次换月的日期和复权因子
+ROLL_ROOT = r"../db_pq/roll"
+
+# K线文件的列顺序，载入后按这个顺序排列
+BAR_COLUMNS = ['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']
+
+
+# db_pq 写数据集时维护的目录（见 db_pq/utils/catalog.py），记录每个品种分区里的数据文件
+CATALOG_FILE = '_catalog.json'
+
+
+# 从目录取出这些品种的数据文件，不用遍历整个数据集目录
+# 没有目录、目录里缺少某个品种或者文件已经不在时返回None，退回遍历目录
+def _catalog_files(root, symbols: list) -> list:
+    path = os.path.join(root, CATALOG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        catalog = json.load(f)
+    files = []
+    for symbol in symbols:
+        if symbol not in catalog:
+            return None
+        files += [os.path.join(root, *entry['path'].split('/')) for entry in catalog[symbol]['files']]
+    return files if all(os.path.exists(f) for f in files) else None
+
+
+# 打开K线数据集。数据集目录名是“主连名称=螺纹钢主连”这样的中文，没有做url编码
+# symbols 不为None时只打开这些品种的文件（有目录时）
+def open_dataset(root=DATASET_ROOT, latest_root=LATEST_ROOT, symbols: list = None) -> ds.Dataset:
+    if os.path.isdir(root):
+        partitioning = ds.HivePartitioning.discover(segment_encoding='none')
+        files = None if symbols is None else _catalog_files(root, symbols)
+        if files:
+            return ds.dataset(files, format='parquet', partitioning=partitioning, partition_base_dir=root)
+        return ds.dataset(root, format='parquet', partitioning=partitioning)
+    return ds.dataset(sorted(glob.glob(os.path.join(latest_root, '*.parquet'))), format='parquet')
+
+
+# 数据集里的所有品种名称
+def list_symbols(root=DATASET_ROOT, latest_root=LATEST_ROOT) -> list:
+    if os.path.isdir(root):
+        return sorted(name.split('=', 1)[1] for name in os.listdir(root) if name.startswith('主连名称='))
+    return sorted(os.path.basename(path)[:-len('.parquet')] for path in glob.glob(os.path.join(latest_root, '*.parquet')))
+
+
+# 把日期转换为数据集里'交易日期'列的类型（日K线是date32，分钟K线是timestamp），用于构造过滤条件
+def _date_scalar(value, type_: pa.DataType) -> pa.Scalar:
+    return pa.scalar(pd.Timestamp(value).to_pydatetime(), pa.timestamp('us')).cast(type_)
+
+
+# 每个品种在 date_start 之前第 warmup 根K线的日期，计算均线等指标需要这段预热数据
+def _warmup_start(dataset: ds.Dataset, symbols: list, date_start, warmup: int) -> dict:
+    date_type = dataset.schema.field('交易日期').type
+    condition = ds.field('主连名称').isin(symbols) & (ds.field('交易日期') < _date_scalar(date_start, date_type))
+    # 只读两列，且只读 date_start 之前的部分
+    df = dataset.to_table(columns=['主连名称', '交易日期'], filter=condition).to_pandas()
+    starts = df.sort_values('交易日期').groupby('主连名称')['交易日期'].nth(-warmup)
+    return dict(zip(df.loc[starts.index, '主连名称'], starts))
+
+
+# 去除重复的K线，同一品种同一交易日期保留最后一行（数据集按文件名顺序读取，即写入先后）
+def _drop_duplicates(table: pa.Table) -> pa.Table:
+    table = table.append_column('_row', pa.array(range(table.num_rows), pa.int64()))
+    rows = table.group_by(['主连名称', '交易日期'], use_threads=False).aggregate([('_row', 'max')]).column('_row_max')
+    return table.take(rows).drop_columns(['_row'])
+
+
+# 低内存模式（compact=True）下的列处理：重复的字符串列改为字典编码，读回pandas是category；
+# 价格能无损表示为float32的降为float32，成交量是整数且不超出int32范围的降为int32，否则保持原类型
+# 后续的均线、资金曲线计算都先转换为float64，降精度前后结果相同
+# 日K线的交易日期（date32）转换为pandas时是一个个Python日期对象，这里改为 timestamp[ns]
+STRING_COLUMNS = ['交易所', '主连名称', '合约代码']
+PRICE_COLUMNS = ['开盘价', '最高价', '最低价', '收盘价']
+
+
+def _downcast(values: np.ndarray, name: str):
+    if name == '成交量':
+        finite = np.isfinite(values).all()
+        if finite and (values == np.floor(values)).all() and (len(values) == 0 or np.abs(values).max() < 2 ** 31):
+            return pa.array(values.astype('int32'))
+        return None
+    low = values.astype('float32')
+    return pa.array(low) if np.array_equal(low, values, equal_nan=True) else None
+
+
+def compact_table(table: pa.Table) -> pa.Table:
+    for i, name in enumerate(table.column_names):
+        column = table.column(i)
+        if name == '交易日期' and pa.types.is_date32(column.type):
+            table = table.set_column(i, name, column.cast(pa.timestamp('ns')))
+        elif name in STRING_COLUMNS and not pa.types.is_dictionary(column.type):
+            table = table.set_column(i, name, pc.dictionary_encode(column))
+        elif name in PRICE_COLUMNS + ['成交量'] and column.type == pa.float64():
+            low = _downcast(column.to_numpy(), name)
+            if low is not None:
+                table = table.set_column(i, name, low)
+    return table
+
+
+# 读取一个品种的换月索引，没有时返回None
+def load_roll_index(symbol: str, roll_root=ROLL_ROOT) -> pa.Table:
+    path = os.path.join(roll_root, f"{symbol}.parquet")
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path, columns=['交易日期', '前复权因子', '后复权因子'])
+
+
+# 复权：每根K线按它之前发生过几次换月取对应的复权因子，乘到价格列上
+# forward：前复权，最后一次换月之后的价格不变；backward：后复权，第一次换月之前的价格不变
+# table 需要按品种、交易日期排序（load_table 的结果），没有换月索引的品种不调整
+def adjust_prices(table: pa.Table, adjust: str, roll_root=ROLL_ROOT) -> pa.Table:
+    if adjust not in ('forward', 'backward'):
+        raise ValueError(f"未知的复权方式: {adjust}")
+
+    dates = table['交易日期'].cast(pa.timestamp('ns')).to_numpy()
+    symbols = table['主连名称'].to_numpy(zero_copy_only=False)
+    bounds = np.append(np.flatnonzero(symbols[1:] != symbols[:-1]) + 1, len(symbols))
+    factor = np.ones(table.num_rows)
+    start = 0
+    for stop in bounds[bounds > 0]:
+        rolls = load_roll_index(symbols[start], roll_root)
+        if rolls is not None and rolls.num_rows > 0:
+            roll_dates = rolls['交易日期'].cast(pa.timestamp('ns')).to_numpy()
+            k = np.searchsorted(roll_dates, dates[start:stop], side='right')
+            if adjust == 'forward':
+                factor[start:stop] = np.append(rolls['前复权因子'].to_numpy(), 1.0)[k]
+            else:
+                factor[start:stop] = np.append(1.0, rolls['后复权因子'].to_numpy())[k]
+        start = stop
+
+    for i, name in enumerate(table.column_names):
+        if name in PRICE_COLUMNS:
+            table = table.set_column(i, name, pc.multiply(table.column(i).cast(pa.float64()), pa.array(factor)))
+    return table
+
+
+# 载入K线：按品种、日期范围、列筛选，一次扫描完成
+# 过滤条件下推到parquet的row group统计信息，日期范围以外的row group不会被解压
+# warmup：额外载入 date_start 之前的K线根数，给 calc_ma_bias 计算均线用，之后仍由 calc_ma_bias 按日期截取
+# compact：低内存模式，见 compact_table
+# adjust：复权方式，None 为不复权，'forward' 前复权，'backward' 后复权，见 adjust_prices
+def load_bars(symbols, date_start=None, date_end=None, columns: list = None, warmup: int = 0,
+              root=DATASET_ROOT, latest_root=LATEST_ROOT, compact: bool = False, adjust: str = None,
+              roll_root=ROLL_ROOT) -> pd.DataFrame:
+    return load_table(symbols, date_start, date_end, columns, warmup, root, latest_root, compact, adjust, roll_root).to_pandas()
+
+
+# load_bars 的arrow版本，返回 pa.Table
+def load_table(symbols, date_start=None, date_end=None, columns: list = None, warmup: int = 0,
+               root=DATASET_ROOT, latest_root=LATEST_ROOT, compact: bool = False, adjust: str = None,
+               roll_root=ROLL_ROOT) -> pa.Table:
+    symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+    dataset = open_dataset(root, latest_root, symbols)
+    date_type = dataset.schema.field('交易日期').type
+
+    condition = ds.field('主连名称').isin(symbols)
+    if date_start is not None:
+        if warmup > 0:
+            # 每个品种的预热起点不同；历史数据不足 warmup 根的品种从头开始读
+            starts = _warmup_start(dataset, symbols, date_start, warmup)
+            lower = None
+            for symbol in symbols:
+                cond = ds.field('主连名称') == symbol
+                if symbol in starts:
+                    cond = cond & (ds.field('交易日期') >= _date_scalar(starts[symbol], date_type))
+                lower = cond if lower is None else lower | cond
+            condition = condition & lower
+            # 分钟数据按年份分区，用最早的预热日期裁剪年份目录
+            date_start = min(starts.values(), default=None) if len(starts) == len(symbols) else None
+        else:
+            condition = condition & (ds.field('交易日期') >= _date_scalar(date_start, date_type))
+    if date_end is not None:
+        condition = condition & (ds.field('交易日期') <= _date_scalar(date_end, date_type))
+
+    # 年份是分区字段，直接跳过不需要的目录
+    if '年份' in dataset.schema.names:
+        if date_start is not None:
+            condition = condition & (ds.field('年份') >= pd.Timestamp(date_start).year)
+        if date_end is not None:
+            condition = condition & (ds.field('年份') <= pd.Timestamp(date_end).year)
+
+    names = [c for c in BAR_COLUMNS if c in dataset.schema.names]
+    names += [c for c in dataset.schema.names if c not in names and c != '年份']
+    if columns is not None:
+        names = [c for c in names if c in columns]
+    # 排序需要品种和日期两列，没有要求的话最后再去掉
+    read_columns = names + [c for c in ['主连名称', '交易日期'] if c not in names]
+
+    table = dataset.to_table(columns=read_columns, filter=condition)
+    # 增量更新写入的 part-<时间戳>.parquet 可能和主文件有相同的交易日期，以最后写入的为准
+    if os.path.isdir(root) and any(os.path.basename(f) != 'part-0.parquet' for f in dataset.files):
+        table = _drop_duplicates(table)
+    table = table.sort_by([('主连名称', 'ascending'), ('交易日期', 'ascending')])
+    if adjust is not None:
+        table = adjust_prices(table, adjust, roll_root)
+    table = table.select(names)
+    return compact_table(table) if compact else table
+
+
+# 一个品种的源数据文件，数据集里是分区下的所有文件，没有数据集时是latest里的文件
+def source_files(symbol: str, root=DATASET_ROOT, latest_root=LATEST_ROOT) -> list:
+    if os.path.isdir(root):
+        files = glob.glob(os.path.join(root, f"主连名称={symbol}", '**', 'part-*.parquet'), recursive=True)
+        return sorted(files)
+    path = os.path.join(latest_root, f"{symbol}.parquet")
+    return [path] if os.path.exists(path) else []
@@ -0,0 +1,186 @@
+import os
+import json
+import math
+import pandas as pd
+from .features import MA_LIST
+from .store import DATASET_ROOT, LATEST_ROOT, load_table
+
+
+# 逐根K线更新的滚动均线，每根K线 O(1)
+# 完全按照pandas rolling(n).mean() 的算法（pandas/_libs/window/aggregations.pyx 的 roll_mean）累加，
+# 和 calc_ma_bias 的结果逐位相同：
+#   加入和移出窗口分别用Kahan补偿求和；
+#   连续相同的值个数不少于窗口内个数时，直接返回该值（消除浮点误差）；
+#   窗口内全为正数而结果为负（或全为负数而结果为正）时返回0
+class RollingMean:
+    def __init__(self, n: int):
+        self.n = int(n)
+        self.buffer = []  # 最近n个值，环形缓冲区
+        self.pos = 0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = math.nan
+
+    def _add(self, val):
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+    def _remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def update(self, val: float) -> float:
+        val = float(val)
+        if self.n == 1:
+            # 窗口长度为1时pandas每根K线都重新开始累加
+            self.__init__(1)
+        if len(self.buffer) < self.n:
+            self.buffer.append(val)
+        else:
+            self._remove(self.buffer[self.pos])
+            self.buffer[self.pos] = val
+            self.pos = (self.pos + 1) % self.n
+        self._add(val)
+
+        if self.nobs < self.n or self.nobs == 0:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+    def state(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls(state['n'])
+        obj.__dict__.update(state)
+        obj.buffer = list(state['buffer'])
+        return obj
+
+
+# 乖离率，除0时和pandas一样得到inf或NaN
+def _bias(close, ma):
+    if ma == 0:
+        return math.nan if close == 0 else math.copysign(math.inf, close) * math.copysign(1.0, ma)
+    return (close - ma) / ma
+
+
+# 流式信号引擎：每来一根K线，更新均线、乖离率，调用策略的逐根版本计算信号，再按 next/instant 的规则得到持仓
+# strategy(prev: dict, row: dict) -> 信号（1、-1或NaN），prev 是策略自己的状态，如 quant_nest.s01_step
+# 从K线历史开头逐根回放，结果与 calc_ma_bias(全部历史) -> 策略 -> next/instant 逐位相同
+class SignalEngine:
+    def __init__(self, strategy, trade_mode: str = 'NEXT', ma_list: list = MA_LIST):
+        if trade_mode not in ('NEXT', 'INSTANTLY'):
+            raise ValueError(f"未知的交易模式: {trade_mode}")
+        self.strategy = strategy
+        self.trade_mode = trade_mode
+        self.ma = {int(n): RollingMean(n) for n in ma_list}
+        self.strategy_state = {}
+        self.signal = 0.0  # ffill后的信号，开头没有信号时为0
+        self.last_time = None
+
+    # 输入一根K线，返回这根K线的均线、乖离率、信号和持仓方向
+    # K线必须按交易日期递增，重复或更早的K线返回None
+    def update(self, trade_time, open_, high, low, close) -> dict:
+        trade_time = pd.Timestamp(trade_time)
+        if self.last_time is not None and trade_time <= self.last_time:
+            print(f"❌ K线时间 {trade_time} 不晚于上一根K线 {self.last_time}，已忽略")
+            return None
+        self.last_time = trade_time
+
+        row = {'交易日期': trade_time, '开盘价': open_, '最高价': high, '最低价': low, '收盘价': close}
+        for n, rolling in self.ma.items():
+            ma = rolling.update(close)
+            row[f'MA{n}'] = ma
+            row[f'bias{n}'] = _bias(close, ma)
+
+        signal = self.strategy(self.strategy_state, row)
+        row['signal'] = signal
+        # NEXT：持仓是上一根K线为止的信号；INSTANTLY：持仓包含本根K线的信号
+        if self.trade_mode == 'NEXT':
+            row['position_side'] = self.signal
+        if signal == signal:
+            self.signal = float(signal)
+        if self.trade_mode == 'INSTANTLY':
+            row['position_side'] = self.signal
+        return row
+
+    # 引擎状态，可以json序列化
+    def checkpoint(self) -> dict:
+        return {
+            'trade_mode': self.trade_mode,
+            'ma': [rolling.state() for rolling in self.ma.values()],
+            'strategy_state': self.strategy_state,
+            'signal': self.signal,
+            'last_time': None if self.last_time is None else str(self.last_time),
+        }
+
+    @classmethod
+    def restore(cls, state: dict, strategy):
+        engine = cls(strategy, state['trade_mode'], [])
+        engine.ma = {s['n']: RollingMean.from_state(s) for s in state['ma']}
+        engine.strategy_state = dict(state['strategy_state'])
+        engine.signal = state['signal']
+        engine.last_time = None if state['last_time'] is None else pd.Timestamp(state['last_time'])
+        return engine
+
+    # 保存到文件：先写临时文件再改名，中途崩溃不会损坏旧的检查点
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, strategy):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.restore(json.load(f), strategy)
+
+
+# 从检查点恢复引擎（没有检查点时新建），再用数据库里比检查点新的K线补齐，返回 (引擎, 新K线的结果列表)
+def catch_up(symbol: str, strategy, trade_mode: str = 'NEXT', checkpoint_path=None, ma_list: list = MA_LIST,
+             root=DATASET_ROOT, latest_root=LATEST_ROOT):
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        engine = SignalEngine.load(checkpoint_path, strategy)
+        date_start = engine.last_time
+    else:
+        engine = SignalEngine(strategy, trade_mode, ma_list)
+        date_start = None
+
+    columns = ['交易日期', '开盘价', '最高价', '最低价', '收盘价']
+    df = load_table(symbol, date_start=date_start, columns=columns, root=root, latest_root=latest_root).to_pandas()
+    # 从检查点的最后一根K线开始读，已经处理过的K线跳过
+    if engine.last_time is not None:
+        df = df[pd.to_datetime(df['交易日期']) > engine.last_time]
+    rows = [engine.update(*values) for values in df[columns].itertuples(index=False)]
+    if checkpoint_path is not None:
+        engine.save(checkpoint_path)
+    return engine, rows
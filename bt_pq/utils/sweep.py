@@ -0,0 +1,73 @@
+import itertools
+import numpy as np
+import pandas as pd
+from .vectorized import position_2d, equity_2d, evaluate_2d
+from .robustness import robustness_2d
+from .ledger import ledger_2d
+
+
+# 参数扫描：整个参数网格一次性计算信号、持仓、资金曲线，每组参数输出一行评价结果
+# df：全部历史K线（calc_ma_bias之前的原始数据）
+# signal_grid：策略的网格版本，如 quant_nest.s01_grid(bars, window, **参数数组)
+# grid：参数网格，如 {'n': range(5, 251)}，多个参数时取笛卡尔积
+# max_cells：每批计算的 K线数×参数组数 上限，控制内存
+# robust：蒙特卡洛稳健性分析的参数（load_robustness_config 的结果），给出时每组参数的评价后面加上 robustness_2d 的结果
+def param_sweep(df: pd.DataFrame, cfg: dict, signal_grid, grid: dict, max_cells: int = 2_000_000, robust: dict = None) -> pd.DataFrame:
+    return sweep_window(df, _date_window(df, cfg), cfg, signal_grid, grid, max_cells, robust)
+
+
+# 和 calc_ma_bias 一样按日期筛选，只是不复制数据，只算出行范围
+def _date_window(df: pd.DataFrame, cfg: dict) -> slice:
+    trade_time = pd.to_datetime(df['交易日期'], errors='coerce')
+    mask = np.ones(len(df), dtype=bool)
+    if cfg.get('date_start') is not None:
+        mask &= (trade_time >= cfg['date_start']).to_numpy()
+    if cfg.get('date_end') is not None:
+        mask &= (trade_time <= cfg['date_end']).to_numpy()
+    rows = np.flatnonzero(mask)
+    return slice(rows[0], rows[-1] + 1)
+
+
+# 在给定的行范围 window 上扫描参数网格，walk_forward 的每个训练窗口也调用它
+# bars 可以是DataFrame，也可以是 {列名: 数组} 的字典（如共享内存里的数组）
+def sweep_window(bars, window: slice, cfg: dict, signal_grid, grid: dict, max_cells: int = 2_000_000, robust: dict = None) -> pd.DataFrame:
+    params = pd.DataFrame(list(itertools.product(*grid.values())), columns=list(grid))
+
+    prices = [np.asarray(bars[col], dtype='float64')[window] for col in ['开盘价', '最高价', '最低价', '收盘价']]
+    trade_time = pd.to_datetime(np.asarray(bars['交易日期'])[window], errors='coerce')
+
+    chunk = max(1, max_cells // len(prices[0]))
+    results = []
+    for i in range(0, len(params), chunk):
+        batch = params.iloc[i:i + chunk]
+        signal = signal_grid(bars, window, **{name: batch[name].to_numpy() for name in grid})
+        res = equity_2d(position_2d(signal, cfg['trade_mode']), *prices, cfg)
+        equity, position_side = res['equity_curve'], res['position_side']
+        df_evaluate = evaluate_2d(trade_time, equity, position_side)
+        if robust is not None:
+            df_evaluate = pd.concat([df_evaluate, robustness_2d(equity, position_side, **robust)], axis=1)
+        results.append(df_evaluate)
+
+    return pd.concat([params, pd.concat(results, ignore_index=True)], axis=1)
+
+
+# 参数扫描的交易明细：和 param_sweep 相同的分批计算，每批的资金曲线直接用 ledger_2d 拆成交易明细
+# “列”是这组参数在 param_sweep 结果里的行号，可以用它和评价结果、参数对应起来
+def param_ledger(df: pd.DataFrame, cfg: dict, signal_grid, grid: dict, max_cells: int = 2_000_000) -> pd.DataFrame:
+    window = _date_window(df, cfg)
+    params = pd.DataFrame(list(itertools.product(*grid.values())), columns=list(grid))
+
+    prices = [np.asarray(df[col], dtype='float64')[window] for col in ['开盘价', '最高价', '最低价', '收盘价']]
+    trade_time = pd.to_datetime(np.asarray(df['交易日期'])[window], errors='coerce')
+
+    chunk = max(1, max_cells // len(prices[0]))
+    ledgers = []
+    for i in range(0, len(params), chunk):
+        batch = params.iloc[i:i + chunk]
+        signal = signal_grid(df, window, **{name: batch[name].to_numpy() for name in grid})
+        res = equity_2d(position_2d(signal, cfg['trade_mode']), *prices, cfg)
+        df_ledger = ledger_2d(trade_time, res['position_side'], res, prices[1], prices[2], cfg)
+        df_ledger['列'] += i
+        ledgers.append(df_ledger)
+
+    return pd.concat(ledgers, ignore_index=True)
@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+
+
+# 二维数组（K线数 × 参数组数）的工具函数，供参数扫描等批量计算使用。
+# 所有函数都沿 axis=0（时间轴）计算，每一列是一组独立的参数。
+
+
+# 沿时间轴平移n行，空出来的位置用fill填充。n>0下移，n<0上移
+def shift_2d(a: np.ndarray, n: int, fill=np.nan) -> np.ndarray:
+    out = np.full_like(a, fill, dtype='float64')
+    if n > 0:
+        out[n:] = a[:-n]
+    elif n < 0:
+        out[:n] = a[-n:]
+    else:
+        out[:] = a
+    return out
+
+
+# 二维版本的ffill：NaN用同一列上方最近的非NaN值填充
+def ffill_2d(a: np.ndarray) -> np.ndarray:
+    rows = np.arange(a.shape[0]).reshape(-1, 1)
+    idx = np.where(np.isnan(a), 0, rows)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return np.take_along_axis(a, idx, axis=0)
+
+
+# 由交易信号产生持仓，逻辑与 position.next / position.instant 相同
+def position_2d(signal: np.ndarray, trade_mode: str = 'NEXT') -> np.ndarray:
+    signal = ffill_2d(signal)
+    signal[np.isnan(signal)] = 0
+    if trade_mode == 'NEXT':
+        return shift_2d(signal, 1, fill=0.0)
+    return signal
+
+
+# 分段累计最大值：open_pos 为True的行开始新的一段，每段内从头累计，列与列之间互不影响
+# 按列展开成一维后用 pandas 的 groupby.cummax（编译实现，一次遍历），结果精确
+def _segment_cummax(a: np.ndarray, open_pos: np.ndarray) -> np.ndarray:
+    rows, cols = a.shape
+    segment = np.cumsum(open_pos.T.ravel())
+    out = pd.Series(a.T.ravel()).groupby(segment, sort=False).cummax().to_numpy()
+    return out.reshape(cols, rows).T
+
+
+# 止损、止盈、移动止损：持仓后第一次触发时在这根K线内按触发价平仓，之后空仓，直到持仓方向改变（出现新的开仓）
+# 参数是相对开仓价（含滑点）的比例，0 表示不使用：
+#   stop_loss：做多时最低价跌到 开仓价×(1-stop_loss)，做空时最高价涨到 开仓价×(1+stop_loss)
+#   take_profit：做多时最高价涨到 开仓价×(1+take_profit)，做空时最低价跌到 开仓价×(1-take_profit)
+#   trailing_stop：做多时最低价跌到 持仓以来（不含当前K线）最高价×(1-trailing_stop)，做空反之，最高价从开仓价算起
+# 触发价：止损价和移动止损价取更近的一个；开盘就越过触发价时按开盘价成交
+# 同一根K线止损和止盈都触发时，无法知道先后，按止损算
+# 每笔交易只有第一次触发有效，之后这笔交易已经空仓，所以不需要逐根K线的状态机：
+# 触发条件只依赖开仓价和持仓以来的最高、最低价，全部用沿时间轴的累计计算，和逐根K线循环的结果相同（tests/test_stops.py）
+# 返回 (新的持仓, 触发K线的平仓参考价（未加滑点，其余为NaN）, 触发的是止损或移动止损的K线)，没有设置任何规则时原样返回
+def stops_2d(ps: np.ndarray, trade_price: np.ndarray, hold_open: np.ndarray, hold_high: np.ndarray,
+             hold_low: np.ndarray, cfg: dict) -> tuple:
+    stop_loss = cfg.get('stop_loss') or 0
+    take_profit = cfg.get('take_profit') or 0
+    trailing_stop = cfg.get('trailing_stop') or 0
+    if not (stop_loss or take_profit or trailing_stop):
+        return ps, None, None
+
+    rows = np.arange(ps.shape[0]).reshape(-1, 1)
+    with np.errstate(invalid='ignore'):
+        non_zero = ps != 0
+        open_pos = non_zero & (ps != shift_2d(ps, 1))
+        start = np.maximum.accumulate(np.where(open_pos, rows, 0), axis=0)
+        entry = np.take_along_axis(trade_price + cfg['slippage'] * ps, start, axis=0)
+
+        # 乘以持仓方向后，做多和做空可以用同一套比较：数值越大对持仓越有利
+        favorable = ps * np.where(ps == 1, hold_high, hold_low)
+        adverse = ps * np.where(ps == 1, hold_low, hold_high)
+        signed_open = ps * hold_open
+
+        # 止损线（乘以方向后取更大的，即离价格更近的）
+        stop = np.full(ps.shape, -np.inf)
+        if stop_loss:
+            stop = ps * entry * (1 - stop_loss * ps)
+        if trailing_stop:
+            peak = shift_2d(_segment_cummax(favorable, open_pos), 1)
+            peak[open_pos] = -np.inf
+            peak = np.fmax(peak, ps * entry)
+            stop = np.fmax(stop, peak * (1 - trailing_stop * ps))
+        hit_stop = non_zero & (adverse <= stop)
+
+        hit_profit = np.zeros(ps.shape, dtype=bool)
+        target = np.full(ps.shape, np.inf)
+        if take_profit:
+            target = ps * entry * (1 + take_profit * ps)
+            hit_profit = non_zero & (favorable >= target) & ~hit_stop
+
+        # 这笔交易在之前的K线已经触发过的，改为空仓；本根K线是第一次触发的，记下平仓参考价
+        hit = hit_stop | hit_profit
+        last_hit = shift_2d(np.maximum.accumulate(np.where(hit, rows, -1), axis=0), 1, fill=-1)
+        exited = non_zero & (last_hit >= start)
+        fill = np.where(hit_stop, np.minimum(signed_open, stop), np.maximum(signed_open, target)) * ps
+        stop_price = np.where(hit & ~exited, fill, np.nan)
+
+    return np.where(exited, 0.0, ps), stop_price, hit_stop & ~exited
+
+
+# 计算资金曲线的数组内核，每一列是一组独立的持仓，calculate.equity_curve 也调用它
+# position_side 为 (K线数, 参数组数)，价格为 (K线数,) 的一维数组
+# NEXT：信号出现后下一根K线开盘价开仓，平仓价为平仓K线下一根的开盘价
+# INSTANTLY：信号K线收盘价立即开仓，平仓价为平仓K线下一根（即反向信号K线）的收盘价
+def equity_2d(position_side: np.ndarray, open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, cfg: dict) -> dict:
+    trade_mode = cfg['trade_mode']
+    if trade_mode not in ('NEXT', 'INSTANTLY'):
+        raise ValueError(f"未知的交易模式: {trade_mode}")
+
+    initial_cash = cfg['initial_cash']
+    invest_cash = initial_cash * cfg['invest_ratio']
+    slippage = cfg['slippage']
+    c_rate = cfg['c_rate']
+    invest_margin_ratio = cfg['invest_margin_ratio']
+    min_margin_ratio = cfg['min_margin_ratio']
+    volume_per_lot = cfg['volume_per_lot']
+
+    ps = np.asarray(position_side, dtype='float64')
+    open_, high, low, close = (np.asarray(x, dtype='float64').reshape(-1, 1) for x in (open_, high, low, close))
+    rows = np.arange(ps.shape[0]).reshape(-1, 1)
+    # 开仓、平仓的参考价格，以及计算爆仓用的持仓期间最高、最低价
+    # INSTANTLY 模式在K线收盘时才持仓，持仓期间是下一根K线
+    if trade_mode == 'NEXT':
+        trade_price, hold_open, hold_high, hold_low = open_, open_, high, low
+    else:
+        trade_price, hold_open, hold_high, hold_low = close, shift_2d(open_, -1), shift_2d(high, -1), shift_2d(low, -1)
+
+    # 止损、止盈、移动止损：触发后的K线改为空仓，触发的K线按触发价平仓
+    ps, stop_price, stopped = stops_2d(ps, trade_price, hold_open, hold_high, hold_low, cfg)
+
+    # 爆仓后净值为0，下一笔交易的收益率会出现除0，和pandas一样保留inf/NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 开仓：持仓非空且与上一根K线不同；平仓：持仓非空且与下一根K线不同
+        non_zero = ps != 0
+        open_pos = non_zero & (ps != shift_2d(ps, 1))
+        close_pos = non_zero & (ps != shift_2d(ps, -1))
+
+        # 每根K线所在交易的开仓行号，相当于 start_time 的 ffill
+        start = np.maximum.accumulate(np.where(open_pos, rows, 0), axis=0)
+
+        # 开仓时的合约数量、开仓价、现金，整笔交易期间保持不变
+        entry_open = trade_price + slippage * ps
+        contract_open = np.floor(invest_cash / (volume_per_lot * entry_open * invest_margin_ratio))
+        cash_open = initial_cash - entry_open * volume_per_lot * contract_open * c_rate
+
+        def hold(a):
+            return np.where(non_zero, np.take_along_axis(a, start, axis=0), np.nan)
+
+        contract_num = hold(contract_open)
+        entry_price = hold(entry_open)
+        cash = hold(cash_open)
+
+        # 平仓价=下一根K线的参考价格，止损、止盈触发时为触发价，加上滑点影响
+        exit_ref = shift_2d(trade_price, -1)
+        if stop_price is not None:
+            exit_ref = np.where(np.isnan(stop_price), exit_ref, stop_price)
+        exit_price = np.where(close_pos, exit_ref - slippage * ps, np.nan)
+        exit_fee = exit_price * volume_per_lot * contract_num * c_rate
+
+        # 持仓盈亏，平仓K线按平仓价计算
+        profit = np.where(close_pos,
+                          volume_per_lot * contract_num * (exit_price - entry_price) * ps,
+                          volume_per_lot * contract_num * (close - entry_price) * ps)
+        net_value = cash + profit
+
+        # 爆仓：用K线内最不利价格计算保证金比例
+        price_min = np.where(ps == 1, hold_low, np.where(ps == -1, hold_high, np.nan))
+        # 止损在K线内平仓，持仓期间最不利的价格就是止损的成交价
+        if stopped is not None:
+            price_min = np.where(stopped, stop_price, price_min)
+        profit_min = volume_per_lot * contract_num * (price_min - entry_price) * ps
+        net_value_min = cash + profit_min
+        margin_ratio = net_value_min / (volume_per_lot * contract_num * price_min)
+        liquidated = margin_ratio <= (min_margin_ratio + c_rate)
+
+        # 平仓时扣除手续费，平仓后净值为负也算爆仓
+        net_value = np.where(close_pos, net_value - exit_fee, net_value)
+        liquidated |= close_pos & (net_value < 0)
+
+        # 同一笔交易内，爆仓之后的K线都视为爆仓
+        last_liquidated = np.maximum.accumulate(np.where(liquidated, rows, -1), axis=0)
+        liquidated = non_zero & (last_liquidated >= start)
+        net_value[liquidated] = 0
+
+        # 收益率：首根K线就开仓的列，开仓K线以初始资金为基准，其余都是净值的pct_change
+        equity_change = net_value / shift_2d(net_value, 1) - 1
+        first_open = open_pos & open_pos[0]
+        equity_change[first_open] = net_value[first_open] / initial_cash - 1
+        equity_change[np.isnan(equity_change)] = 0
+        equity_curve = np.cumprod(1 + equity_change, axis=0)
+
+    return {
+        'position_side': ps,
+        'open_pos': open_pos,
+        'close_pos': close_pos,
+        'start': start,
+        'contract_num': contract_num,
+        'entry_price': entry_price,
+        'cash': cash,
+        'exit_price': exit_price,
+        'exit_fee': exit_fee,
+        'profit': profit,
+        'net_value': net_value,
+        'price_min': price_min,
+        'profit_min': profit_min,
+        'net_value_min': net_value_min,
+        'margin_ratio': margin_ratio,
+        'is_liquidated': liquidated,
+        'equity_change': equity_change,
+        'equity_curve': equity_curve,
+    }
+
+
+# 批量评价策略，每一列资金曲线输出一行，calculate.evaluate_strategy 也调用它
+# 前6列与原来的 evaluate_strategy 相同（格式化后的字符串，便于打印），之后是新增指标：
+#   夏普比率、索提诺比率：按K线收益率计算（无风险利率取0），按每年K线数年化
+#   卡玛比率：年化收益/最大回撤，和“年化收益/回撤比”相同，但不四舍五入，适合排序
+#   胜率、交易次数、持仓时间占比：需要 position_side；没有持仓时（如组合资金曲线）为NaN
+# 所有指标都是沿时间轴的线性计算，不排序
+def evaluate_2d(trade_time, equity: np.ndarray, position_side: np.ndarray = None) -> pd.DataFrame:
+    trade_time = pd.DatetimeIndex(trade_time)
+    equity = np.asarray(equity, dtype='float64').reshape(len(trade_time), -1)
+    rows, cols = equity.shape
+    columns = np.arange(cols)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final = equity[-1]
+        years = (trade_time[-1] - trade_time[0]) / pd.Timedelta('365 days')
+        annual_return = final ** (1 / years) - 1
+
+        # 历史最高净值（跳过NaN，和 expanding().max() 相同）及其第一次出现的行号
+        running_max = np.fmax.accumulate(equity, axis=0)
+        new_high = equity > shift_2d(running_max, 1, fill=-np.inf)
+        peak_row = np.maximum.accumulate(np.where(new_high, np.arange(rows).reshape(-1, 1), 0), axis=0)
+
+        # 最大回撤及其结束时间，NaN和sort_values一样排在最后，并列时取第一次出现；开始时间是结束之前净值最高的K线
+        draw_down = equity / running_max - 1
+        end = np.argmin(np.where(np.isnan(draw_down), np.inf, draw_down), axis=0)
+        max_draw_down = draw_down[end, columns]
+        start = peak_row[end, columns]
+        calmar = annual_return / np.abs(max_draw_down)
+
+        # K线收益率，第一根K线相对初始净值1
+        returns = equity / shift_2d(equity, 1, fill=1.0) - 1
+        periods = (rows - 1) / years if years > 0 else np.nan
+        mean = np.nanmean(returns, axis=0)
+        sharpe = mean / np.nanstd(returns, axis=0, ddof=1) * np.sqrt(periods)
+        downside = np.sqrt(np.nanmean(np.minimum(returns, 0) ** 2, axis=0))
+        sortino = mean / downside * np.sqrt(periods)
+
+        win_rate, trades, exposure = _trade_stats(equity, position_side)
+
+    return pd.DataFrame({
+        '累积净值': [round(x, 2) for x in final],
+        '年化收益': [str(round(x * 100, 2)) + '%' for x in annual_return],
+        '最大回撤': [format(x, '.2%') for x in max_draw_down],
+        '最大回撤开始时间': [str(trade_time[i]) for i in start],
+        '最大回撤结束时间': [str(trade_time[i]) for i in end],
+        '年化收益/回撤比': [round(x, 2) for x in calmar],
+        '夏普比率': np.round(sharpe, 4),
+        '索提诺比率': np.round(sortino, 4),
+        '卡玛比率': calmar,
+        '胜率': np.round(win_rate, 4),
+        '交易次数': trades,
+        '持仓时间占比': np.round(exposure, 4),
+    })
+
+
+# 每笔交易的收益率：一笔交易从开仓K线到平仓K线，收益率 = 平仓K线的净值 / 开仓前一根K线的净值 - 1
+# 返回 (每笔交易所在的列, 收益率)，按列、再按时间排序。每一笔开仓都有对应的平仓（最后一根K线仍持仓也算平仓）
+def trade_returns_2d(equity: np.ndarray, position_side: np.ndarray) -> tuple:
+    ps = np.asarray(position_side, dtype='float64').reshape(equity.shape)
+    non_zero = ps != 0
+    open_pos = non_zero & (ps != shift_2d(ps, 1))
+    close_pos = non_zero & (ps != shift_2d(ps, -1))
+
+    open_col, open_row = np.nonzero(open_pos.T)
+    close_col, close_row = np.nonzero(close_pos.T)
+    before_open = shift_2d(equity, 1, fill=1.0)
+    return open_col, equity[close_row, close_col] / before_open[open_row, open_col] - 1
+
+
+# 每列持仓的胜率、交易次数、持仓时间占比，收益率大于0的交易算盈利
+def _trade_stats(equity: np.ndarray, position_side: np.ndarray = None) -> tuple:
+    cols = equity.shape[1]
+    if position_side is None:
+        return np.full(cols, np.nan), np.full(cols, np.nan), np.full(cols, np.nan)
+
+    open_col, trade_return = trade_returns_2d(equity, position_side)
+    trades = np.bincount(open_col, minlength=cols)
+    wins = np.bincount(open_col, weights=trade_return > 0, minlength=cols)
+    win_rate = np.where(trades > 0, wins / np.maximum(trades, 1), np.nan)
+    non_zero = np.asarray(position_side, dtype='float64').reshape(equity.shape) != 0
+    return win_rate, trades, non_zero.mean(axis=0)
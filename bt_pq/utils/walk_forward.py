@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .vectorized import position_2d, equity_2d, evaluate_2d
+from .sweep import sweep_window
+from .shared import share_bars, attach_bars, release_shared
+
+# 子进程里映射好的共享内存K线，进程池初始化时设置一次，之后每个窗口的任务直接使用
+_worker = {}
+
+
+def _init_worker(spec: dict, cfg: dict, signal_grid, grid: dict, metric: str):
+    blocks, bars = attach_bars(spec)
+    _worker.update(blocks=blocks, bars=bars, cfg=cfg, signal_grid=signal_grid, grid=grid, metric=metric)
+
+
+# 一个窗口：在训练窗口上扫描参数网格，选出 metric 最好的参数，再用这组参数回测紧接着的测试窗口
+# 指标相同时取累积净值高的，再相同时取网格里靠前的参数
+def _run_window(train: slice, test: slice) -> dict:
+    bars, cfg, signal_grid, grid = _worker['bars'], _worker['cfg'], _worker['signal_grid'], _worker['grid']
+
+    df_train = sweep_window(bars, train, cfg, signal_grid, grid)
+    best = df_train.sort_values(by=[_worker['metric'], '累积净值'], ascending=False, kind='stable').iloc[0]
+    params = {name: best[name] for name in grid}
+
+    prices = [bars[col][test] for col in ['开盘价', '最高价', '最低价', '收盘价']]
+    signal = signal_grid(bars, test, **{name: np.array([value]) for name, value in params.items()})
+    res = equity_2d(position_2d(signal, cfg['trade_mode']), *prices, cfg)
+    equity, position_side = res['equity_curve'][:, 0], res['position_side']
+    df_test = evaluate_2d(bars['交易日期'][test], equity.reshape(-1, 1), position_side)
+
+    return {
+        'train': train,
+        'test': test,
+        'params': params,
+        'train_evaluate': best.drop(list(grid)),
+        'test_evaluate': df_test.iloc[0],
+        'equity': equity,
+        'position_side': position_side[:, 0],
+    }
+
+
+# 滚动窗口：日期范围内的K线按 train_bars 训练、test_bars 测试切分，每次向后滚动 test_bars 根
+# 训练窗口之前的K线只用于均线预热；最后一个测试窗口不足 test_bars 根时取到日期范围结束
+def walk_forward_windows(trade_time, date_start, date_end, train_bars: int, test_bars: int) -> list:
+    trade_time = pd.to_datetime(trade_time, errors='coerce')
+    mask = np.ones(len(trade_time), dtype=bool)
+    if date_start is not None:
+        mask &= np.asarray(trade_time >= date_start)
+    if date_end is not None:
+        mask &= np.asarray(trade_time <= date_end)
+    rows = np.flatnonzero(mask)
+    first, last = rows[0], rows[-1] + 1
+
+    windows = []
+    for start in range(first, last - train_bars, test_bars):
+        windows.append((slice(start, start + train_bars), slice(start + train_bars, min(start + train_bars + test_bars, last))))
+    return windows
+
+
+# 滚动样本外测试：每个训练窗口优化参数，在随后的测试窗口上回测，测试窗口的资金曲线首尾相接
+# df：全部历史K线和策略要用的指标列（如 load_ma_bias 读出的 MA{n}）
+# columns：放进共享内存的float64列，默认是df里所有float64列
+# 每个窗口在进程池里并行计算，子进程从共享内存读取K线，任务参数只有窗口的行范围
+# 返回 (样本外资金曲线[trade_time, equity_curve, position_side], 每个窗口的参数和训练、测试评价)
+def walk_forward(df: pd.DataFrame, cfg: dict, wf_cfg: dict, signal_grid, grid: dict, columns: list = None, max_workers: int = None):
+    windows = walk_forward_windows(df['交易日期'], cfg['date_start'], cfg['date_end'], wf_cfg['train_bars'], wf_cfg['test_bars'])
+    if not windows:
+        print(f"❌ K线数量不足一个训练窗口: {wf_cfg['train_bars']}")
+        return None
+
+    columns = [c for c in df.columns if df[c].dtype == 'float64'] if columns is None else columns
+    blocks, spec = share_bars(df, columns)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(spec, cfg, signal_grid, grid, wf_cfg['metric'])) as pool:
+            results = list(pool.map(_run_window, *zip(*windows)))
+    finally:
+        release_shared(blocks)
+
+    trade_time = pd.to_datetime(df['交易日期'], errors='coerce').to_numpy()
+    curves, rows = [], []
+    scale = 1.0
+    for res in results:
+        # 每个测试窗口从初始资金开始回测，拼接时乘上之前窗口的累积净值
+        curves.append(pd.DataFrame({'trade_time': trade_time[res['test']], 'equity_curve': res['equity'] * scale,
+                                    'position_side': res['position_side']}))
+        scale *= res['equity'][-1]
+        row = {
+            '训练开始': trade_time[res['train'].start],
+            '训练结束': trade_time[res['train'].stop - 1],
+            '测试开始': trade_time[res['test'].start],
+            '测试结束': trade_time[res['test'].stop - 1],
+            **res['params'],
+        }
+        row.update({f'训练{k}': v for k, v in res['train_evaluate'].items()})
+        row.update({f'测试{k}': v for k, v in res['test_evaluate'].items()})
+        rows.append(row)
+
+    return pd.concat(curves, ignore_index=True), pd.DataFrame(rows)
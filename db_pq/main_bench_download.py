@@ -0,0 +1,38 @@
+import utils, time, os, tempfile
+
+
+# 离线测速：用本地模拟的天勤api，比较逐个品种下载写入和流水线下载写入的耗时
+# latency 是模拟的单次请求网络延迟，可以按实际网络情况调整
+def bench_sequential(api, tasks, cfg):
+    for symbol_name, exchange_cn, symbol_cn in tasks:
+        df_latest_kline = utils.kline_get(api, symbol_name, cfg['days'])
+        table = utils.clean_kline(df_latest_kline, exchange_cn, symbol_cn)
+        utils.write_parquet(table, os.path.join(cfg['temp'], f"{symbol_cn}.parquet"), cfg['parquet'])
+
+
+def bench_pipeline(api, tasks, cfg):
+    utils.download_to_temp(utils.FakeKlineSource(api), tasks, cfg)
+
+
+def main(latency=0.2):
+    cfg = utils.load_para_config()
+    dict_dc = utils.build_contract_map()
+    api = utils.FakeTqApi(dict_dc, latency=latency)
+    tasks = [(symbol_name, *utils.get_exchange_symbol_cn(dict_dc, symbol_name)) for symbol_name in sorted(api.query_quotes())]
+
+    results = {}
+    for name, bench in [('逐个下载', bench_sequential), ('流水线', bench_pipeline)]:
+        # 写到临时目录，不影响 ./temp 里的数据
+        with tempfile.TemporaryDirectory() as temp:
+            t0 = time.perf_counter()
+            bench(api, tasks, {**cfg, 'temp': temp})
+            results[name] = time.perf_counter() - t0
+
+    print(f"品种数{len(tasks)}，K线数{cfg['days']}，模拟延迟{latency}秒")
+    for name, seconds in results.items():
+        print(f"{name}: {seconds:.2f}秒")
+    print(f"加速比: {results['逐个下载'] / results['流水线']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
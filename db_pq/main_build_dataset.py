@@ -0,0 +1,26 @@
+import utils, os, glob, datetime
+import pyarrow.parquet as pq
+
+
+# 把 latest 文件夹里每个品种一个的parquet文件，转换为按品种分区的数据集
+# 只需要运行一次，之后 main_update_database 会同时更新数据集
+# 换月索引不在这里生成：需要登录天勤，由 main_build_roll.py 一次性回补全部历史的换月
+def main():
+    cfg = utils.load_para_config()
+    paths = sorted(glob.glob(os.path.join(cfg['latest'], '*.parquet')))
+
+    time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"**************** {time}  准备转换{len(paths)}个品种到数据集 {cfg['dataset']}！****************")
+    # 目录在内存里更新，全部品种写完后写一次；中途出错也把已写入的品种记进目录
+    catalog = utils.read_catalog(cfg['dataset'])
+    try:
+        for i, path in enumerate(paths, start=1):
+            table = pq.read_table(path)
+            utils.write_symbol_dataset(table, cfg['dataset'], cfg['parquet'], cfg['rows_per_group'], catalog=catalog)
+            print(f"{i:>2} : {os.path.basename(path)[:-8]} -> {table.num_rows}根K线已写入数据集", flush=True)
+    finally:
+        utils.write_catalog(cfg['dataset'], catalog)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import utils, tqsdk, datetime
+
+
+# 一次性回补所有品种全部历史的换月索引（最近 roll_history 个交易日），第一次使用、新增品种时运行
+# 之后 main_update_database 每天只检查最近的换月。已经记录的换月不会重复下载
+# 换月前一天新旧合约的日K线通过 pipeline 的数据源并发下载，同时在途的请求数为 concurrency
+def main():
+    cfg = utils.load_para_config()
+    dict_dc = utils.build_contract_map()
+    api = tqsdk.TqApi(account=tqsdk.TqKq(), auth=tqsdk.TqAuth(cfg['user'], cfg['pwd']))
+    tasks = [(symbol_name, *utils.get_exchange_symbol_cn(dict_dc, symbol_name)) for symbol_name in sorted(api.query_quotes(ins_class="CONT"))]
+    tasks = [task for task in tasks if task[1:] != (None, None)]
+
+    time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"**************** {time}  准备回补{len(tasks)}个品种最近{cfg['roll_history']}个交易日的换月！****************")
+    n_roll = utils.update_roll_index(utils.TqKlineSource(api), tasks, cfg, n=cfg['roll_history'])
+    time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"**************** {time}  换月索引回补完毕，{n_roll}个品种有新的换月 ****************")
+    api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,74 @@ import utils, tqsdk, datetime, os, json
 import pandas as pd
 import pyarrow.parquet as pq
 import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# 增量更新一个品种：只写入比数据集中最后交易日期新的K线，写入时间与新K线数量成正比
+# 最后一个交易日期的K线也一并写入，盘中下载的不完整K线会被新版本覆盖
+# catalog 是本次运行在内存里更新的数据集目录，运行结束时写一次
+def update_incremental(cfg, cn, df_temp, last_date, path_latest_pq, path_historical_pq, catalog):
+    if not (df_temp['交易日期'] > last_date).any():
+        print(f"{cn[:12]} -> 没有新的日K线，跳过")
+        return
+
+    df_new = df_temp[df_temp['交易日期'] >= last_date].reset_index(drop=True)
+    n_delta = utils.append_symbol_dataset(pa.Table.from_pandas(df_new), cfg['dataset'], cfg['parquet'], cfg['rows_per_group'],
+                                          catalog=catalog)
+    print(f"{cn[:12]} -> 追加{len(df_new)}根日K线，增量文件{n_delta}个")
+
+    # latest 文件夹是对外发布的每个品种一个文件（README的流程、notebook、没有数据集时的回测都读它），
+    # 每次追加后都原子地刷新，和数据集保持一致；一个品种只有几千根日K线，重写很快
+    table = utils.read_symbol_dataset(cfg['dataset'], cn)
+    utils.publish_latest(table, path_latest_pq, path_historical_pq, cfg['parquet'])
+
+    # 增量文件太多时合并为一个主文件
+    if n_delta >= cfg['compact_every']:
+        utils.write_symbol_dataset(table, cfg['dataset'], cfg['parquet'], cfg['rows_per_group'], catalog=catalog)
+        print(f"{cn[:12]} -> 增量文件已合并")
+
+
+# 更新分钟K线：下载最近 bars 根1分钟K线，增量写入按品种、年份分区的分钟数据集
+# 和日K线的增量模式相同：只追加比数据集中最后一根K线新的部分，最后一根也重新写入，增量文件多了就合并
+def update_minute(source, tasks: list, cfg: dict):
+    m_cfg = cfg['minute']
+    time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"**************** {time}  准备下载所有交易品种最近{m_cfg['bars']}根1分钟K线！****************")
+    downloaded = utils.download_to_temp(source, tasks, cfg, n=m_cfg['bars'], duration=60, path_temp=m_cfg['temp'])
+
+    # 数据集目录在内存里更新，全部品种处理完后写一次；中途出错也把已写入的品种记进目录
+    catalog = utils.read_catalog(m_cfg['dataset'])
+    try:
+        for cn in sorted(downloaded):
+            table = pq.read_table(os.path.join(m_cfg['temp'], f"{cn}.parquet"))
+            table = table.select(['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量'])
+            last_time = utils.last_trade_date(m_cfg['dataset'], cn, catalog)
+
+            # 新品种直接写入主文件
+            if last_time is None:
+                utils.write_symbol_dataset(table, m_cfg['dataset'], cfg['parquet'], m_cfg['rows_per_group'], minute=True,
+                                           catalog=catalog)
+                print(f"{cn[:12]} -> 写入{table.num_rows}根分钟K线")
+                continue
+
+            table = table.filter(pc.greater_equal(table['交易日期'], pa.scalar(last_time, table.schema.field('交易日期').type)))
+            if table.num_rows <= 1:
+                print(f"{cn[:12]} -> 没有新的分钟K线，跳过")
+                continue
+            n_delta = utils.append_symbol_dataset(table, m_cfg['dataset'], cfg['parquet'], m_cfg['rows_per_group'], minute=True,
+                                                  catalog=catalog)
+            print(f"{cn[:12]} -> 追加{table.num_rows}根分钟K线，增量文件{n_delta}个")
+
+            if n_delta >= cfg['compact_every']:
+                table = utils.read_symbol_dataset(m_cfg['dataset'], cn)
+                utils.write_symbol_dataset(table, m_cfg['dataset'], cfg['parquet'], m_cfg['rows_per_group'], minute=True,
+                                           catalog=catalog)
+                print(f"{cn[:12]} -> 分钟增量文件已合并")
+    finally:
+        utils.write_catalog(m_cfg['dataset'], catalog)
+
+    time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"**************** {time}  所有交易品种分钟K线更新完毕！****************")
 
 
 def main():
@@ -9,8 +77,8 @@ def main():
     cfg = utils.load_para_config()
     # 构建映射字典，从合约代码到（交易所名称，品种名称）的映射 ，方便查询
     dict_dc = utils.build_contract_map()
-    # 将path_latest中的parquet文件复制到path_historical
-    utils.copy_directory(cfg['historical'], cfg['latest'])
+    # 不再整体复制latest到historical，每个品种更新时由 publish_latest 备份旧版本
+    os.makedirs(cfg['historical'], exist_ok=True)
     # 登录api, 输入TQ账户和密码
     api = tqsdk.TqApi(account=tqsdk.TqKq(), auth=tqsdk.TqAuth(cfg['user'], cfg['pwd']))
     # 从天勤api中查询交易品种 —— dc指主连合约
@@ -20,57 +88,12 @@ def main():
     time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"**************** {time}  准备下载所有交易品种最近{cfg['days']}根日K线！****************")
     # 更新品种计数
-    i, j = 0, 0
-    # 遍历交易品种
-    for symbol_name in dc:
-        # 根据交易品种代码，获取交易所名称，交易品种名称
-        exchange_cn, symbol_cn = utils.get_exchange_symbol_cn(dict_dc, symbol_name)
-
-        # 判断是交易品种否在json中，如果是的话，下载K线，存入临时文件夹
-        if (exchange_cn, symbol_cn) != (None, None):
-            # 获取交易品种的最新日K线,num为k线个数
-            df_latest_kline = utils.kline_get(api, symbol_name, cfg['days'])
-            # 拼接临时数据.parquet的地址
-            path_temp_pq = os.path.join(cfg['temp'], f"{symbol_cn}.parquet")
-            # 选择需要的列
-            df_latest_kline = df_latest_kline[['candle_begin_time_GMT8', 'symbol', 'open', 'high', 'low', 'close', 'volume']]
-            # 删除空数据
-            df_latest_kline.dropna(how='any')
-            # 删除交易量为0的数据
-            df_latest_kline = df_latest_kline[df_latest_kline['volume'] != 0]
-
-            # 将获取的最新df_latest_kline,复制给df_temp_kline
-            df_temp_kline = df_latest_kline.copy()
-            # 新增两列
-            df_temp_kline["交易所"] = exchange_cn
-            df_temp_kline["主连名称"] = symbol_cn
-
-            # 交易时间去掉后面的字符串 8:00:00
-            df_temp_kline['candle_begin_time_GMT8'] = df_temp_kline['candle_begin_time_GMT8'].astype('str').str[0:10]
-            # 取出需要的列
-            df_temp_kline = df_temp_kline[
-                ['candle_begin_time_GMT8', '交易所', '主连名称', 'symbol', 'open', 'high', 'low', 'close', 'volume']]
-            # 给列重新命名
-            rename_dict = {'candle_begin_time_GMT8': '交易日期', 'symbol': '合约代码', 'open': '开盘价', 'high': '最高价', 'low': '最低价', 'close': '收盘价', 'volume': '成交量'}
-            df_temp_kline.rename(columns=rename_dict, inplace=True)
-
-            df_temp_kline['交易日期'] = pd.to_datetime(df_temp_kline['交易日期'], format='%Y-%m-%d', errors='coerce')
-
-            # 将读取的日k线，‘交易日期’这一列的数据格式改为pa.date32
-            df_temp_kline_date32 = utils.convert_to_date32(pa.Table.from_pandas(df_temp_kline))
-
-            # 写入Parquet文件,存入临时文件夹
-            pq.write_table(
-                df_temp_kline_date32,
-                path_temp_pq,
-                compression='zstd',
-                compression_level=9,
-                row_group_size=100000,
-                use_dictionary=['合约代码'],  # 对商品代码启用字典编码
-                data_page_size=1024 * 1024,  # 1MB
-                version='2.6',  # 使用Parquet 2.6格式以支持所有特性
-            )
-            print(f"{(i := i + 1):>2}: {symbol_cn} -> 日K线数据已下载", flush=True)
+    j = 0
+    # 在json中的交易品种才下载：(合约代码, 交易所名称, 品种名称)
+    tasks = [(symbol_name, *utils.get_exchange_symbol_cn(dict_dc, symbol_name)) for symbol_name in dc]
+    tasks = [task for task in tasks if task[1:] != (None, None)]
+    # 并发下载K线，整理后存入临时文件夹，下载和写文件同时进行
+    downloaded = set(utils.download_to_temp(utils.TqKlineSource(api), tasks, cfg))
     # 从json中取出期货名称，以数组形式存入 symbol_cn 中
     with open('./utils/dominant_contract.json', 'r', encoding='utf-8') as f:
         zl_js = json.load(f)
@@ -79,62 +102,77 @@ def main():
     time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"**************** {time}  准备合并更新所有交易品种日K线！****************")
     # 拼接K数据
-    for cn in symbol_cn:
-        # 拼接parquet文件名
-        path_temp_pq = os.path.join(cfg['temp'], f"{cn}.parquet")
-        path_historical_pq = os.path.join(cfg['historical'], f"{cn}.parquet")
-        path_latest_pq = os.path.join(cfg['latest'], f"{cn}.parquet")
-
-        # print(path_temp_pq, path_historical_pq, path_latest_pq)
-        df_temp = pd.read_parquet(path_temp_pq, engine="pyarrow")
-        df_temp = df_temp[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
-
-        # 如果不是新增的品种
-        if os.path.exists(path_historical_pq):
-            df_historical = pd.read_parquet(path_historical_pq, engine="pyarrow")
-            df_historical = df_historical[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
-
-            # 合并保存
-            df = pd.concat([df_historical, df_temp], axis=0)
-            # 数据去重
-            df.drop_duplicates(subset=['交易日期'], keep='last', inplace=True)
-
-            # 统一输出格式
-            df = df[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
-            # 按时间排序
-            df.sort_values(by='交易日期', ascending=True, inplace=True)
-            df = df.reset_index(drop=True)
-
-            # 写入Parquet文件,存入latest文件夹
-            pq.write_table(
-                pa.Table.from_pandas(df),
-                path_latest_pq,
-                compression='zstd',
-                compression_level=9,
-                row_group_size=100000,
-                use_dictionary=['合约代码'],  # 对商品代码启用字典编码
-                data_page_size=1024 * 1024,  # 1MB
-                version='2.6',  # 使用Parquet 2.6格式以支持所有特性
-            )
-
-            print(f"{(j := j + 1):>2} : {cn[:12]} -> 日K线数据已更新！")
-
-        # 如果是新增品种，则不用合并，直接写入
-        else:
-            # 写入Parquet文件,存入latest文件夹
-            pq.write_table(
-                pa.Table.from_pandas(df_temp),
-                path_latest_pq,
-                compression='zstd',
-                compression_level=9,
-                row_group_size=100000,
-                use_dictionary=['合约代码'],  # 对商品代码启用字典编码
-                data_page_size=1024 * 1024,  # 1MB
-                version='2.6',  # 使用Parquet 2.6格式以支持所有特性
-            )
-            print(f"{(j := j + 1):>2} : {cn[:12]} -> 日K线数据已更新")
+    # 数据集目录（_catalog.json）在内存里更新，全部品种处理完后写一次，不再每个品种重写整个目录文件
+    # 中途出错也把已写入的品种记进目录
+    catalog = utils.read_catalog(cfg['dataset'])
+    try:
+        for cn in symbol_cn:
+            # 下载失败的品种不更新，避免读到上次残留的临时文件
+            if cn not in downloaded:
+                print(f"❌ {cn[:12]} -> 没有下载到日K线，跳过")
+                continue
+            # 拼接parquet文件名
+            path_temp_pq = os.path.join(cfg['temp'], f"{cn}.parquet")
+            path_historical_pq = os.path.join(cfg['historical'], f"{cn}.parquet")
+            path_latest_pq = os.path.join(cfg['latest'], f"{cn}.parquet")
+
+            # print(path_temp_pq, path_historical_pq, path_latest_pq)
+            df_temp = pd.read_parquet(path_temp_pq, engine="pyarrow")
+            df_temp = df_temp[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
+
+            # 增量模式：数据集里已有该品种时，只追加新K线
+            last_date = utils.last_trade_date(cfg['dataset'], cn, catalog) if cfg['mode'] == 'incremental' else None
+            if last_date is not None:
+                update_incremental(cfg, cn, df_temp, last_date, path_latest_pq, path_historical_pq, catalog)
+                continue
+
+            # 如果不是新增的品种
+            if os.path.exists(path_latest_pq):
+                # 只读文件尾部的统计信息，没有新K线就跳过
+                last_date = utils.parquet_last_date([path_latest_pq])
+                if not (df_temp['交易日期'] > last_date).any():
+                    print(f"{cn[:12]} -> 没有新的日K线，跳过")
+                    continue
+
+                df_historical = pd.read_parquet(path_latest_pq, engine="pyarrow")
+                df_historical = df_historical[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
+
+                # 合并保存
+                df = pd.concat([df_historical, df_temp], axis=0)
+                # 数据去重
+                df.drop_duplicates(subset=['交易日期'], keep='last', inplace=True)
+
+                # 统一输出格式
+                df = df[['交易日期', '交易所', '主连名称', '合约代码', '开盘价', '最高价', '最低价', '收盘价', '成交量']]
+                # 按时间排序
+                df.sort_values(by='交易日期', ascending=True, inplace=True)
+                df = df.reset_index(drop=True)
+
+                # 写入Parquet文件,原子地替换latest文件夹里的文件，旧版本备份到historical
+                table = pa.Table.from_pandas(df)
+                utils.publish_latest(table, path_latest_pq, path_historical_pq, cfg['parquet'])
+
+                print(f"{(j := j + 1):>2} : {cn[:12]} -> 日K线数据已更新！")
+
+            # 如果是新增品种，则不用合并，直接写入
+            else:
+                # 写入Parquet文件,存入latest文件夹
+                table = pa.Table.from_pandas(df_temp)
+                utils.publish_latest(table, path_latest_pq, path_historical_pq, cfg['parquet'])
+                print(f"{(j := j + 1):>2} : {cn[:12]} -> 日K线数据已更新")
+
+            # 同步更新按品种分区的数据集
+            utils.write_symbol_dataset(table, cfg['dataset'], cfg['parquet'], cfg['rows_per_group'], catalog=catalog)
+    finally:
+        utils.write_catalog(cfg['dataset'], catalog)
     # 北京时间
     print(f"**************** {time}  所有交易品种日K线更新完毕！****************")
+    # 检查最近的换月，更新每个品种的换月索引（回测时用来复权）；全部历史的换月由 main_build_roll.py 一次性回补
+    n_roll = utils.update_roll_index(utils.TqKlineSource(api), tasks, cfg)
+    print(f"**************** 换月索引更新完毕，{n_roll}个品种有新的换月 ****************")
+    # 配置里打开了分钟K线时，接着更新分钟数据集
+    if cfg['minute']['enabled']:
+        update_minute(utils.TqKlineSource(api), tasks, cfg)
     api.close()
     exit()
 
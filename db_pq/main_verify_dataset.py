@@ -0,0 +1,23 @@
+import utils, sys, time
+
+
+# 校验按品种分区的数据集和它的目录（dataset/_catalog.json）是否一致
+#   python main_verify_dataset.py             只读文件尾部：文件列表、大小、行数、row group、键值元数据
+#   python main_verify_dataset.py --checksum  再计算每个文件的crc32
+#   python main_verify_dataset.py --rebuild   从文件重新生成目录（目录丢失，或数据集是在有目录之前生成的）
+def main():
+    cfg = utils.load_para_config()
+    t0 = time.perf_counter()
+    for root in [cfg['dataset']] + ([cfg['minute']['dataset']] if cfg['minute']['enabled'] else []):
+        if '--rebuild' in sys.argv:
+            print(f"{root} -> 已重新生成{utils.rebuild_catalog(root)}个品种的目录")
+        problems = utils.verify_dataset(root, checksum='--checksum' in sys.argv)
+        for problem in problems:
+            print(f"❌ {problem}")
+        print(f"{root} -> {len(utils.read_catalog(root))}个品种，{'发现' + str(len(problems)) + '个问题' if problems else '目录和数据集一致'}")
+    print(f"耗时{time.perf_counter() - t0:.2f}秒")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import datetime
+import numpy as np
+import pyarrow as pa
+import pytest
+
+# 测试从 db_pq 目录导入 utils，和 main_*.py 相同
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 和 para_config.toml [parquet] 相同的写文件参数
+@pytest.fixture
+def pq_cfg() -> dict:
+    return {'compression': 'zstd', 'compression_level': 9, 'use_dictionary': ['合约代码'], 'data_page_size': 1048576}
+
+
+# 随机的日K线表，列和 clean_kline 的结果相同，交易日期从 start 起每天一根
+def random_daily(symbol_cn: str, start: datetime.date, n: int, seed: int, contract: str = 'SHFE.rb2410') -> pa.Table:
+    rng = np.random.default_rng(seed)
+    close = (3000 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))).round()
+    return pa.table({
+        '交易日期': pa.array([start + datetime.timedelta(days=i) for i in range(n)], pa.date32()),
+        '交易所': ['SHFE'] * n, '主连名称': [symbol_cn] * n, '合约代码': [contract] * n,
+        '开盘价': close, '最高价': close + 10, '最低价': close - 10, '收盘价': close,
+        '成交量': rng.integers(1000, 100000, n).astype('float64'),
+    })
+
+
+@pytest.fixture
+def daily():
+    return random_daily
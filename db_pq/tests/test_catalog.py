@@ -0,0 +1,53 @@
+import os
+import datetime
+import utils
+from utils.catalog import CATALOG_FILE
+
+
+def _write_symbols(root, pq_cfg, daily, catalog=None) -> list:
+    symbols = [f"品种{i}主连" for i in range(5)]
+    for i, symbol_cn in enumerate(symbols):
+        table = daily(symbol_cn, datetime.date(2020, 1, 1), 200 + i, seed=i)
+        utils.write_symbol_dataset(table, root, pq_cfg, rows_per_group=50, catalog=catalog)
+        new = daily(symbol_cn, datetime.date(2020, 1, 1) + datetime.timedelta(days=199 + i), 3, seed=10 + i)
+        utils.append_symbol_dataset(new, root, pq_cfg, rows_per_group=50, catalog=catalog)
+    return symbols
+
+
+# 一次运行写多个品种：目录只在内存里更新，最后写一次，结果和重新生成的目录相同
+def test_batched_catalog_written_once(tmp_path, pq_cfg, daily):
+    root = str(tmp_path / 'dataset')
+    catalog = utils.read_catalog(root)
+    symbols = _write_symbols(root, pq_cfg, daily, catalog)
+    assert not os.path.exists(os.path.join(root, CATALOG_FILE))
+    assert sorted(catalog) == sorted(symbols)
+    assert all(catalog[s]['rows'] == 202 + i for i, s in enumerate(symbols))
+
+    utils.write_catalog(root, catalog)
+    assert utils.verify_dataset(root) == []
+    assert utils.last_trade_date(root, symbols[0], catalog) == datetime.date(2020, 1, 1) + datetime.timedelta(days=201)
+
+    utils.rebuild_catalog(root)
+    assert utils.read_catalog(root) == catalog
+
+
+# 不传 catalog 时每次写入都更新目录文件，和原来一样
+def test_unbatched_catalog_matches_batched(tmp_path, pq_cfg, daily):
+    root = str(tmp_path / 'dataset')
+    symbols = _write_symbols(root, pq_cfg, daily)
+    catalog = utils.read_catalog(root)
+    assert [catalog[s]['rows'] for s in symbols] == [202, 203, 204, 205, 206]
+    assert utils.verify_dataset(root) == []
+
+
+# 文件大小不变、修改时间变了（重写了同样大小的文件），目录的记录不再可用
+def test_catalog_entry_checks_mtime(tmp_path, pq_cfg, daily):
+    root = str(tmp_path / 'dataset')
+    symbols = _write_symbols(root, pq_cfg, daily)
+    paths = utils.partition_files(root, symbols[0])
+    assert utils.catalog_entry(root, symbols[0], paths) is not None
+
+    st = os.stat(paths[-1])
+    os.utime(paths[-1], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert os.path.getsize(paths[-1]) == st.st_size
+    assert utils.catalog_entry(root, symbols[0], paths) is None
@@ -0,0 +1,31 @@
+import datetime
+import pyarrow.parquet as pq
+import utils
+from utils.catalog import CATALOG_KEY
+
+
+# 增量追加后发布的 latest 文件：内容是合并去重后的全部K线，schema元数据里不能留着主文件的 catalog 摘要
+def test_append_publishes_consistent_latest(tmp_path, pq_cfg, daily):
+    root = str(tmp_path / 'dataset')
+    base = daily('螺纹钢主连', datetime.date(2015, 1, 1), 3893, seed=1)
+    utils.write_symbol_dataset(base, root, pq_cfg, rows_per_group=500)
+
+    # 新K线和最后一根重叠一天，和 update_incremental 相同
+    new = daily('螺纹钢主连', datetime.date(2015, 1, 1) + datetime.timedelta(days=3892), 6, seed=2)
+    utils.append_symbol_dataset(new, root, pq_cfg, rows_per_group=500)
+
+    table = utils.read_symbol_dataset(root, '螺纹钢主连')
+    assert table.num_rows == 3898
+    assert table['收盘价'][3892].as_py() == new['收盘价'][0].as_py()
+
+    path_latest, path_historical = str(tmp_path / 'latest.parquet'), str(tmp_path / 'historical.parquet')
+    utils.publish_latest(table, path_latest, path_historical, pq_cfg)
+    latest = pq.ParquetFile(path_latest)
+    metadata = latest.schema_arrow.metadata or {}
+    assert CATALOG_KEY not in metadata
+    assert latest.metadata.num_rows == 3898
+    assert latest.read().equals(table)
+
+    # 目录和数据集也一致
+    assert utils.verify_dataset(root) == []
+    assert utils.read_catalog(root)['螺纹钢主连']['rows'] == 3898
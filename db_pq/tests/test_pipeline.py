@@ -0,0 +1,54 @@
+import os
+import asyncio
+import zlib
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+import utils
+
+CONTRACT_JSON = os.path.join(os.path.dirname(__file__), '..', 'utils', 'dominant_contract.json')
+
+
+# 记录同时在途的请求数；每个品种的延迟不同，下载完成的顺序和任务顺序不一样
+class CountingApi(utils.FakeTqApi):
+    def __init__(self, contract_map, latency):
+        super().__init__(contract_map, latency=latency, end_date='2024-06-28')
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_kline_serial_async(self, symbol, duration_seconds, data_length=200):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency * (1 + zlib.crc32(symbol.encode()) % 4))
+            return self.make_kline(symbol, duration_seconds, data_length)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def download_cfg(tmp_path, pq_cfg) -> dict:
+    return {'days': 300, 'concurrency': 3, 'queue_size': 2, 'workers': 2, 'parquet': pq_cfg, 'temp': str(tmp_path / 'temp')}
+
+
+# 流水线下载：每个品种的临时文件都写了，内容和逐个下载整理的结果相同（K线按时间排序、行数不变），
+# 同时在途的请求数不超过 concurrency
+@pytest.mark.parametrize('duration, n', [(60 * 60 * 24, None), (60, 2000)])
+def test_download_to_temp_writes_every_symbol(tmp_path, download_cfg, duration, n):
+    contract_map = dict(sorted(utils.build_contract_map(CONTRACT_JSON).items())[:12])
+    api = CountingApi(contract_map, latency=0.02)
+    tasks = [(symbol_name, *utils.get_exchange_symbol_cn(contract_map, symbol_name)) for symbol_name in api.query_quotes()]
+    path_temp = str(tmp_path / 'out')
+
+    done = utils.download_to_temp(utils.FakeKlineSource(api), tasks, download_cfg, n=n, duration=duration, path_temp=path_temp)
+
+    assert sorted(done) == sorted(symbol_cn for _, _, symbol_cn in tasks)
+    assert 1 < api.max_in_flight <= download_cfg['concurrency']
+    minute = duration < 60 * 60 * 24
+    for symbol_name, exchange_cn, symbol_cn in tasks:
+        table = pq.read_table(os.path.join(path_temp, f"{symbol_cn}.parquet"))
+        expected = utils.clean_kline(utils.format_kline(api.make_kline(symbol_name, duration, n or download_cfg['days'])),
+                                     exchange_cn, symbol_cn, minute)
+        assert table.num_rows == expected.num_rows == (n or download_cfg['days'])
+        assert pc.all(pc.greater(table['交易日期'][1:], table['交易日期'][:-1])).as_py()
+        assert table.select(expected.column_names).equals(expected), symbol_cn
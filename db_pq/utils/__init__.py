@@ -1 +1,6 @@
-from .methods import *
\ No newline at end of file
+from .methods import *
+from .catalog import *
+from .dataset import *
+from .pipeline import *
+from .fake_api import *
+from .roll import *
@@ -0,0 +1,185 @@
+import os
+import json
+import zlib
+import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 数据集目录：写数据集的同时维护，更新程序和回测程序不用打开parquet文件就能知道每个品种有哪些数据
+# dataset/_catalog.json（以'_'开头，pyarrow读取数据集时会忽略），每个品种一项：
+#   rows：去重后的K线数；first_date、last_date：第一个、最后一个交易日期；last_contract：最后一根K线的合约代码
+#   schema：[[列名, 类型], ...]
+#   files：分区里的每个数据文件（按写入先后排序）：相对路径、行数、首尾交易日期、每个row group的交易日期范围、
+#          文件大小、修改时间、crc32校验和
+# 每个数据文件自己的首尾日期、行数、最后合约代码也写在parquet的键值元数据 catalog 里，目录丢失时可以从文件尾部恢复
+# 一次运行写多个品种时（建数据集、每日更新）在内存里更新目录，运行结束时只写一次目录文件
+CATALOG_FILE = '_catalog.json'
+CATALOG_KEY = b'catalog'
+
+
+def _iso(value) -> str:
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+# 把目录里的日期字符串转换回和parquet统计信息相同的类型：日K线是 date，分钟K线是 datetime
+def parse_catalog_date(value: str):
+    if value is None:
+        return None
+    return datetime.date.fromisoformat(value) if len(value) == 10 else datetime.datetime.fromisoformat(value)
+
+
+# 一张按交易日期排序的表的概要
+def table_summary(table: pa.Table) -> dict:
+    if table.num_rows == 0:
+        return {'rows': 0, 'first_date': None, 'last_date': None, 'last_contract': None}
+    dates = table['交易日期']
+    contract = table['合约代码'][-1].as_py() if '合约代码' in table.column_names else None
+    return {'rows': table.num_rows, 'first_date': _iso(dates[0].as_py()), 'last_date': _iso(dates[-1].as_py()),
+            'last_contract': contract}
+
+
+# 写文件前把概要放进parquet的键值元数据
+def with_catalog_metadata(table: pa.Table, symbol_cn: str) -> pa.Table:
+    metadata = dict(table.schema.metadata or {})
+    metadata[CATALOG_KEY] = json.dumps({'symbol': symbol_cn, **table_summary(table)}, ensure_ascii=False).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+
+def file_checksum(path) -> str:
+    crc = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            crc = zlib.crc32(chunk, crc)
+    return f"{crc:08x}"
+
+
+# 一个数据文件在目录里的记录：行数和row group的日期范围来自文件尾部，不读数据
+def file_entry(path, root) -> dict:
+    meta = pq.ParquetFile(path).metadata
+    summary = json.loads(meta.metadata.get(CATALOG_KEY, b'{}')) if meta.metadata else {}
+    column = meta.schema.to_arrow_schema().get_field_index('交易日期')
+    row_groups = []
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(column).statistics
+        if stats is not None and stats.has_min_max:
+            row_groups.append([_iso(stats.min), _iso(stats.max), meta.row_group(i).num_rows])
+    last_contract = summary.get('last_contract')
+    if last_contract is None and meta.num_row_groups and '合约代码' in meta.schema.names:
+        # 目录之前写入的文件没有键值元数据，只读最后一个row group的合约代码列
+        last_contract = pq.ParquetFile(path).read_row_group(meta.num_row_groups - 1, columns=['合约代码'])['合约代码'][-1].as_py()
+    st = os.stat(path)
+    return {
+        'path': os.path.relpath(path, root).replace(os.sep, '/'),
+        'rows': meta.num_rows,
+        'first_date': row_groups[0][0] if row_groups else None,
+        'last_date': max((rg[1] for rg in row_groups), default=None),
+        'last_contract': last_contract,
+        'row_groups': row_groups,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'crc32': file_checksum(path),
+    }
+
+
+def read_catalog(root) -> dict:
+    path = os.path.join(root, CATALOG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_catalog(root, catalog: dict):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, CATALOG_FILE)
+    tmp_path = os.path.join(root, f".{CATALOG_FILE}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# 去重后的K线数：读取所有文件的交易日期一列，目录里没有记录时才需要
+def _count_dates(paths: list) -> int:
+    dates = [pq.read_table(path, columns=['交易日期'], partitioning=None)['交易日期'] for path in paths]
+    return len(pc.unique(pa.chunked_array([c for d in dates for c in d.chunks])))
+
+
+# 写入数据文件后更新一个品种的记录。paths 为品种分区里现在的全部数据文件
+# rows 为去重后的K线数（写入的程序知道），为None时读取交易日期列计算
+# catalog 为内存里的目录（read_catalog 的结果）时只更新它，由调用者一次运行结束时 write_catalog 一次，
+# 不再每个品种都重写整个目录文件；为None时读取、写回目录文件
+def record_symbol(root, symbol_cn: str, paths: list, schema: pa.Schema, rows: int = None, catalog: dict = None):
+    batch = catalog is not None
+    catalog = catalog if batch else read_catalog(root)
+    old = {f['path']: f for f in catalog.get(symbol_cn, {}).get('files', [])}
+
+    files = []
+    for path in paths:
+        rel = os.path.relpath(path, root).replace(os.sep, '/')
+        st = os.stat(path)
+        f = old.get(rel)
+        # 没有变化的文件沿用原来的记录，不重新计算校验和
+        if f is None or f['size'] != st.st_size or f['mtime_ns'] != st.st_mtime_ns:
+            f = file_entry(path, root)
+        files.append(f)
+
+    dated = [f for f in files if f['last_date'] is not None]
+    # 最后一个交易日期相同时以最后写入的文件为准
+    last = max(reversed(dated), key=lambda f: f['last_date']) if dated else None
+    catalog[symbol_cn] = {
+        'rows': _count_dates(paths) if rows is None else int(rows),
+        'first_date': min((f['first_date'] for f in dated), default=None),
+        'last_date': None if last is None else last['last_date'],
+        'last_contract': None if last is None else last['last_contract'],
+        'schema': [[field.name, str(field.type)] for field in schema],
+        'files': files,
+    }
+    if not batch:
+        write_catalog(root, catalog)
+
+
+# 从目录读取一个品种的记录，只检查文件是否还是目录里记录的那些（文件名、大小、修改时间），不打开parquet文件
+# 目录里没有这个品种或者文件有变化时返回None，调用者退回读取文件尾部
+# 同一次运行里传入内存里的目录（catalog），不重复读取目录文件
+def catalog_entry(root, symbol_cn: str, paths: list, catalog: dict = None) -> dict:
+    entry = (read_catalog(root) if catalog is None else catalog).get(symbol_cn)
+    if entry is None:
+        return None
+    recorded = {f['path']: (f['size'], f['mtime_ns']) for f in entry['files']}
+    actual = {}
+    for path in paths:
+        st = os.stat(path)
+        actual[os.path.relpath(path, root).replace(os.sep, '/')] = (st.st_size, st.st_mtime_ns)
+    return entry if recorded == actual else None
+
+
+# 校验一个品种的记录和磁盘上的文件是否一致，返回发现的问题（空列表表示一致）
+# 默认只比较文件列表、大小和文件尾部的行数、row group数量、键值元数据（只读文件尾部，很快）；checksum=True 时再计算crc32
+def verify_symbol(root, symbol_cn: str, entry: dict, paths: list, checksum: bool = False) -> list:
+    problems = []
+    recorded = {f['path']: f for f in entry['files']}
+    actual = {os.path.relpath(p, root).replace(os.sep, '/'): p for p in paths}
+    for rel in sorted(set(actual) - set(recorded)):
+        problems.append(f"{symbol_cn}：文件不在目录里 {rel}")
+    for rel in sorted(set(recorded) - set(actual)):
+        problems.append(f"{symbol_cn}：文件已不存在 {rel}")
+
+    for rel in sorted(set(actual) & set(recorded)):
+        f, path = recorded[rel], actual[rel]
+        if os.path.getsize(path) != f['size']:
+            problems.append(f"{symbol_cn}：文件大小不一致 {rel}")
+            continue
+        try:
+            meta = pq.ParquetFile(path).metadata
+        except Exception as e:
+            problems.append(f"{symbol_cn}：文件无法读取 {rel}：{e}")
+            continue
+        if meta.num_rows != f['rows'] or meta.num_row_groups != len(f['row_groups']):
+            problems.append(f"{symbol_cn}：行数或row group数量不一致 {rel}")
+        summary = json.loads((meta.metadata or {}).get(CATALOG_KEY, b'{}'))
+        if summary and (summary.get('rows'), summary.get('last_date')) != (f['rows'], f['last_date']):
+            problems.append(f"{symbol_cn}：文件的键值元数据和目录不一致 {rel}")
+        if checksum and file_checksum(path) != f['crc32']:
+            problems.append(f"{symbol_cn}：校验和不一致 {rel}")
+    return problems
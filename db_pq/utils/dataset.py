@@ -0,0 +1,177 @@
+import os
+import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from .catalog import (with_catalog_metadata, record_symbol, catalog_entry, parse_catalog_date, read_catalog,
+                      write_catalog, verify_symbol)
+
+
+# 数据集按品种分区，分钟数据再按年份分区，目录名为 hive 风格的“字段=值”：
+# dataset/主连名称=螺纹钢主连/part-0.parquet
+# dataset/主连名称=螺纹钢主连/年份=2024/part-0.parquet
+# pyarrow的write_dataset会对中文目录名做url编码，所以这里自己写文件，读取时用 segment_encoding='none'
+#
+# part-0.parquet 是合并后的主文件，增量更新时新K线写入 part-<时间戳>.parquet，文件名按写入先后排序，
+# 同一交易日期出现在多个文件里时以最后写入的为准（bt_pq 的 load_bars 负责去重）。
+# 增量文件达到一定数量后合并回 part-0.parquet。
+BASE_FILE = 'part-0.parquet'
+
+
+def partition_dir(root, symbol_cn: str, year: int = None) -> str:
+    path = os.path.join(root, f"主连名称={symbol_cn}")
+    return path if year is None else os.path.join(path, f"年份={year}")
+
+
+# 原子写入：先写到同目录下以'.'开头的临时文件（数据集读取时会忽略），写完再改名
+# 程序中途崩溃时，目标文件要么是旧版本，要么是完整的新版本
+def atomic_write_table(table: pa.Table, path, pq_cfg: dict):
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path, **pq_cfg)
+    os.replace(tmp_path, path)
+
+
+# 一个品种分区里的所有数据文件（含年份子目录），按写入先后排序
+def partition_files(root, symbol_cn: str) -> list:
+    files = []
+    for dirpath, _, filenames in os.walk(partition_dir(root, symbol_cn)):
+        files += [os.path.join(dirpath, f) for f in filenames if f.startswith('part-') and f.endswith('.parquet')]
+    return sorted(files, key=lambda f: (os.path.basename(f) != BASE_FILE, os.path.basename(f), f))
+
+
+# 从parquet文件尾部的统计信息读取最后一个交易日期，不解压数据
+def parquet_last_date(paths: list):
+    last = None
+    for path in paths:
+        meta = pq.ParquetFile(path).metadata
+        column = meta.schema.to_arrow_schema().get_field_index('交易日期')
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(column).statistics
+            if stats is not None and stats.has_min_max and (last is None or stats.max > last):
+                last = stats.max
+    return last
+
+
+# 数据集中某个品种最后一个交易日期，没有该品种时返回None
+# 先查数据集目录（_catalog.json），目录没有记录或文件有变化时才读取文件尾部；catalog 见 record_symbol
+def last_trade_date(root, symbol_cn: str, catalog: dict = None):
+    paths = partition_files(root, symbol_cn)
+    entry = catalog_entry(root, symbol_cn, paths, catalog) if paths else None
+    if entry is not None:
+        return parse_catalog_date(entry['last_date'])
+    return parquet_last_date(paths)
+
+
+# 分钟数据按年份拆分，日线数据不拆分：返回 [(年份或None, 子表)]
+def _split_by_year(table: pa.Table, minute: bool) -> list:
+    if not minute:
+        return [(None, table)]
+    years = pc.year(table['交易日期'])
+    return [(year, table.filter(pc.equal(years, year))) for year in pc.unique(years).to_pylist()]
+
+
+# 写入数据集前的统一处理：按时间排序，分区字段由目录名表示，不写进文件
+# 字符串统一为string类型（新版pandas转换出来的是large_string），保证主文件和增量文件的schema一致
+def _prepare(table: pa.Table) -> pa.Table:
+    table = table.sort_by('交易日期').replace_schema_metadata(None)
+    table = table.drop_columns(['主连名称'])
+    schema = pa.schema([f.with_type(pa.string()) if pa.types.is_large_string(f.type) else f for f in table.schema])
+    return table.cast(schema)
+
+
+# 把一个品种的全部K线写入数据集，替换该品种原有的主文件和增量文件
+# 每个row group的行数较少，row group里记录了交易日期的最小、最大值，读取时按日期过滤可以跳过整组
+# 一次写入多个品种时传入内存里的目录 catalog，最后由调用者 write_catalog 一次（见 record_symbol）
+def write_symbol_dataset(table: pa.Table, root, pq_cfg: dict, rows_per_group: int, minute: bool = False,
+                         catalog: dict = None):
+    symbol_cn = table['主连名称'][0].as_py()
+    old_files = partition_files(root, symbol_cn)
+    pq_cfg = {**pq_cfg, 'row_group_size': rows_per_group}
+
+    table = _prepare(table)
+    written = []
+    for year, part in _split_by_year(table, minute):
+        path = partition_dir(root, symbol_cn, year)
+        os.makedirs(path, exist_ok=True)
+        atomic_write_table(with_catalog_metadata(part, symbol_cn), os.path.join(path, BASE_FILE), pq_cfg)
+        written.append(os.path.join(path, BASE_FILE))
+
+    # 新主文件已经就位，再删除旧的增量文件。中途崩溃只会留下重复的K线，读取时会去重
+    for path in old_files:
+        if path not in written:
+            os.remove(path)
+    record_symbol(root, symbol_cn, partition_files(root, symbol_cn), table.schema, rows=table.num_rows, catalog=catalog)
+
+
+# 增量追加：新K线写成一个新的增量文件，返回该品种现有的增量文件数量。catalog 同 write_symbol_dataset
+def append_symbol_dataset(table: pa.Table, root, pq_cfg: dict, rows_per_group: int, minute: bool = False,
+                          catalog: dict = None) -> int:
+    symbol_cn = table['主连名称'][0].as_py()
+    pq_cfg = {**pq_cfg, 'row_group_size': rows_per_group}
+    name = f"part-{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}.parquet"
+
+    # 去重后的K线数：目录里原来的K线数 + 比原来最后交易日期新的K线数
+    entry = catalog_entry(root, symbol_cn, partition_files(root, symbol_cn), catalog)
+    table = _prepare(table)
+    rows = None
+    if entry is not None and entry['last_date'] is not None:
+        last = pa.scalar(parse_catalog_date(entry['last_date']), table.schema.field('交易日期').type)
+        rows = entry['rows'] + pc.sum(pc.greater(table['交易日期'], last)).as_py()
+
+    for year, part in _split_by_year(table, minute):
+        path = partition_dir(root, symbol_cn, year)
+        os.makedirs(path, exist_ok=True)
+        atomic_write_table(with_catalog_metadata(part, symbol_cn), os.path.join(path, name), pq_cfg)
+
+    files = partition_files(root, symbol_cn)
+    record_symbol(root, symbol_cn, files, table.schema, rows=rows, catalog=catalog)
+    return sum(os.path.basename(f) != BASE_FILE for f in files)
+
+
+# 读取一个品种的全部K线（主文件+增量文件），同一交易日期以最后写入的为准
+def read_symbol_dataset(root, symbol_cn: str) -> pa.Table:
+    tables = [pq.read_table(path, partitioning=None) for path in partition_files(root, symbol_cn)]
+    # 各文件的 catalog 元数据只描述该文件本身（拼接后保留的是第一个文件的），去掉，以免发布到latest后和内容不符
+    table = pa.concat_tables(tables, promote_options='default').replace_schema_metadata(None)
+    table = table.drop_columns([c for c in ['年份'] if c in table.column_names])
+
+    # 同一交易日期保留最后写入的一行：给每行编号，按交易日期分组取最大编号
+    table = table.append_column('_row', pa.array(range(table.num_rows), pa.int64()))
+    rows = table.group_by('交易日期', use_threads=False).aggregate([('_row', 'max')]).column('_row_max')
+    table = table.take(rows).drop_columns(['_row']).sort_by('交易日期')
+
+    # 分区字段加回到原来的位置（交易所之后）
+    symbol = pa.array([symbol_cn] * table.num_rows, pa.string())
+    return table.add_column(table.column_names.index('交易所') + 1, '主连名称', symbol)
+
+
+# 数据集里的所有品种（分区目录名）
+def dataset_symbols(root) -> list:
+    if not os.path.isdir(root):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(root) if name.startswith('主连名称='))
+
+
+# 重新生成整个数据集目录：目录丢失，或者数据集是在有目录之前生成的。只读文件尾部和交易日期列
+# 所有品种记录完后只写一次目录文件
+def rebuild_catalog(root) -> int:
+    symbols = dataset_symbols(root)
+    catalog = {}
+    for symbol_cn in symbols:
+        paths = partition_files(root, symbol_cn)
+        if paths:
+            record_symbol(root, symbol_cn, paths, pq.read_schema(paths[0]).remove_metadata(), catalog=catalog)
+    write_catalog(root, catalog)
+    return len(symbols)
+
+
+# 校验数据集和目录是否一致，返回发现的问题，见 catalog.verify_symbol
+def verify_dataset(root, checksum: bool = False) -> list:
+    catalog = read_catalog(root)
+    symbols = dataset_symbols(root)
+    problems = [f"{s}：数据集里有，目录里没有" for s in symbols if s not in catalog]
+    problems += [f"{s}：目录里有，数据集里没有" for s in sorted(catalog) if s not in symbols]
+    for symbol_cn in symbols:
+        if symbol_cn in catalog:
+            problems += verify_symbol(root, symbol_cn, catalog[symbol_cn], partition_files(root, symbol_cn), checksum)
+    return problems
@@ -0,0 +1,94 @@
+import time
+import asyncio
+import zlib
+import numpy as np
+import pandas as pd
+
+
+# 本地模拟的天勤api，不联网，用于离线测试和测速下载流水线
+# get_kline_serial 返回和天勤相同的列：datetime 为K线起始时间（UTC纳秒），日K线是北京时间0点即UTC前一天16点
+# latency：模拟一次K线请求的网络延迟（秒）
+# 每个品种的价格是以品种代码为种子的随机游走，同一品种多次请求结果相同
+class FakeTqApi:
+    def __init__(self, contract_map: dict, latency: float = 0.2, end_date=None):
+        self.contract_map = contract_map
+        self.latency = latency
+        self.end_date = pd.Timestamp(end_date if end_date is not None else pd.Timestamp.now().normalize())
+
+    # 和 api.query_quotes(ins_class="CONT") 一样返回主连合约代码
+    def query_quotes(self, ins_class="CONT", **kwargs):
+        return list(self.contract_map)
+
+    # 和 api.query_his_cont_quotes 一样返回最近n个交易日每个主连的标的合约：date 列和每个主连一列
+    # 模拟的标的合约从2000年起每60个工作日换一次月，合约月份取换月后约3个月，如 SHFE.rb2405
+    def query_his_cont_quotes(self, symbol, n=200):
+        symbols = [symbol] if isinstance(symbol, str) else list(symbol)
+        days = pd.bdate_range(end=self.end_date, periods=n)
+        segment = np.busday_count(np.datetime64('2000-01-03'), days.values.astype('datetime64[D]')) // 60
+        start = pd.DatetimeIndex(np.busday_offset(np.datetime64('2000-01-03'), segment * 60))
+        months = (start + pd.Timedelta(days=90)).strftime('%y%m')
+        df = pd.DataFrame({'date': days})
+        for s in symbols:
+            df[s] = [f"{s.split('@', 1)[1]}{m}" for m in months]
+        return df
+
+    # 阻塞版本，和天勤在协程外调用 get_kline_serial 一样要等数据到齐才返回
+    def get_kline_serial(self, symbol, duration_seconds, data_length=200, **kwargs):
+        time.sleep(self.latency)
+        return self.make_kline(symbol, duration_seconds, data_length)
+
+    # 协程版本，等待期间其他品种的请求可以同时进行
+    async def get_kline_serial_async(self, symbol, duration_seconds, data_length=200):
+        await asyncio.sleep(self.latency)
+        return self.make_kline(symbol, duration_seconds, data_length)
+
+    # 日内K线的起始时间（北京时间）：每个交易日从前一个工作日的夜盘开始，到当天下午收盘
+    # 交易时段为 21:00-23:00、9:00-10:15、10:30-11:30、13:30-15:00，最后一根K线属于 end_date 这个交易日
+    def _intraday_times(self, duration_seconds, data_length) -> pd.DatetimeIndex:
+        sessions = [(-3 * 60, -1 * 60), (9 * 60, 10 * 60 + 15), (10 * 60 + 30, 11 * 60 + 30), (13 * 60 + 30, 15 * 60)]
+        offsets = np.concatenate([np.arange(start * 60, end * 60, duration_seconds) for start, end in sessions])
+        n_days = -(-data_length // len(offsets)) + 1
+        days = pd.bdate_range(end=self.end_date, periods=n_days + 1)
+        # 夜盘在前一个工作日晚上，周一的夜盘是上周五晚上
+        night = offsets < 0
+        times = [np.where(night, prev.value + (offsets + 24 * 3600) * 10 ** 9, day.value + offsets * 10 ** 9)
+                 for prev, day in zip(days[:-1], days[1:])]
+        return pd.DatetimeIndex(np.concatenate(times)[-data_length:])
+
+    # 主连（KQ.m@SHFE.rb）的价格是品种的随机游走；具体合约（SHFE.rb2405）用同一个随机游走，
+    # 再乘上每个合约固定的升贴水比例，换月时新旧合约之间有价差
+    def make_kline(self, symbol, duration_seconds, data_length) -> pd.DataFrame:
+        level, walk = 1.0, symbol
+        if '@' not in symbol:
+            level = 1 + 0.01 * (zlib.crc32(symbol.encode()) % 7)
+            walk = f"KQ.m@{symbol.rstrip('0123456789')}"
+        rng = np.random.default_rng(zlib.crc32(walk.encode()))
+        # 只生成工作日的K线，最后一根是 end_date；日内K线见 _intraday_times
+        if duration_seconds < 60 * 60 * 24:
+            begin = self._intraday_times(duration_seconds, data_length) - pd.Timedelta(hours=8)
+        else:
+            begin = pd.bdate_range(end=self.end_date, periods=data_length) - pd.Timedelta(hours=8)
+
+        close = 3000 * level * np.exp(np.cumsum(rng.normal(0, 0.015, data_length)))
+        open_ = close * (1 + rng.normal(0, 0.005, data_length))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, data_length)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, data_length)))
+        volume = rng.integers(0, 200000, data_length).astype('float64')
+        open_oi = rng.integers(100000, 500000, data_length).astype('float64')
+
+        return pd.DataFrame({
+            'datetime': begin.as_unit('ns').asi8,
+            'id': np.arange(data_length, dtype='int64'),
+            'open': open_.round(),
+            'high': high.round(),
+            'low': low.round(),
+            'close': close.round(),
+            'volume': volume,
+            'open_oi': open_oi,
+            'close_oi': open_oi,
+            'symbol': symbol,
+            'duration': duration_seconds,
+        })
+
+    def close(self):
+        pass
@@ -7,15 +7,51 @@ import tomllib
 from pathlib import Path
 
 
-# 获取K线的方法
-def kline_get(api: tqsdk.TqApi, symbol_name, n):  # 初始化kline和signal
-    kline_data = api.get_kline_serial(symbol_name, 60 * 60 * 24, data_length=n)
+# 获取K线的方法，duration 是K线周期（秒），默认日K线，60 为1分钟K线
+def kline_get(api: tqsdk.TqApi, symbol_name, n, duration=60 * 60 * 24):  # 初始化kline和signal
+    kline_data = api.get_kline_serial(symbol_name, duration, data_length=n)
+    return format_kline(kline_data)
+
+
+# 给天勤返回的K线加上北京时间列。天勤的K线序列会被后台持续更新，这里先复制一份
+def format_kline(kline_data: pd.DataFrame) -> pd.DataFrame:
+    kline_data = kline_data.copy()
     kline_data['candle_begin_time'] = pd.to_datetime(kline_data['datetime'], unit='ns')
     kline_data['candle_begin_time_GMT8'] = kline_data['candle_begin_time'] + datetime.timedelta(hours=8)
-    kline_data['trade_time'] = kline_data['candle_begin_time_GMT8'].astype('str').str[-8:]
     return kline_data
 
 
+# 把下载的K线整理成数据库的格式：选列、去掉空数据和成交量为0的K线、改中文列名
+# 日K线的交易日期是pa.date32；分钟K线（minute=True）保留完整的北京时间，类型为 timestamp[ns]
+# 全部是向量化的日期运算，不经过字符串转换，分钟K线几十万行也很快
+def clean_kline(df_latest_kline: pd.DataFrame, exchange_cn, symbol_cn, minute: bool = False) -> pa.Table:
+    # 选择需要的列
+    df_temp_kline = df_latest_kline[['candle_begin_time_GMT8', 'symbol', 'open', 'high', 'low', 'close', 'volume']]
+    # 删除空数据
+    df_temp_kline = df_temp_kline.dropna(how='any')
+    # 删除交易量为0的数据
+    df_temp_kline = df_temp_kline[df_temp_kline['volume'] != 0].copy()
+
+    # 新增两列
+    df_temp_kline["交易所"] = exchange_cn
+    df_temp_kline["主连名称"] = symbol_cn
+
+    # 日K线的开始时间是北京时间0点，去掉时间部分
+    if not minute:
+        df_temp_kline['candle_begin_time_GMT8'] = df_temp_kline['candle_begin_time_GMT8'].dt.normalize()
+    df_temp_kline['candle_begin_time_GMT8'] = df_temp_kline['candle_begin_time_GMT8'].astype('datetime64[ns]')
+    # 取出需要的列
+    df_temp_kline = df_temp_kline[
+        ['candle_begin_time_GMT8', '交易所', '主连名称', 'symbol', 'open', 'high', 'low', 'close', 'volume']]
+    # 给列重新命名
+    rename_dict = {'candle_begin_time_GMT8': '交易日期', 'symbol': '合约代码', 'open': '开盘价', 'high': '最高价', 'low': '最低价', 'close': '收盘价', 'volume': '成交量'}
+    df_temp_kline = df_temp_kline.rename(columns=rename_dict)
+
+    table = pa.Table.from_pandas(df_temp_kline, preserve_index=False)
+    # 将读取的日k线，‘交易日期’这一列的数据格式改为pa.date32
+    return table if minute else convert_to_date32(table)
+
+
 # 清空destination_folder(目标文件夹)，将source_folder（源文件夹）的内容复制过去
 def copy_directory(destination_folder, source_folder):
     try:
@@ -34,6 +70,25 @@ def copy_directory(destination_folder, source_folder):
         print(f"未知错误：{str(e)}")
 
 
+# 原子地发布latest文件：旧版本先硬链接到historical作为备份，新版本写临时文件后改名覆盖
+# 只处理有变化的品种，不再整体复制文件夹；中途崩溃不会留下写了一半的latest文件
+def publish_latest(table: pa.Table, path_latest, path_historical, pq_cfg: dict):
+    if os.path.exists(path_latest):
+        backup_tmp = os.path.join(os.path.dirname(path_historical), f".{os.path.basename(path_historical)}.tmp")
+        if os.path.exists(backup_tmp):
+            os.remove(backup_tmp)
+        try:
+            os.link(path_latest, backup_tmp)
+        except OSError:
+            # 不支持硬链接的文件系统，退回复制
+            shutil.copy2(path_latest, backup_tmp)
+        os.replace(backup_tmp, path_historical)
+
+    tmp_path = os.path.join(os.path.dirname(path_latest), f".{os.path.basename(path_latest)}.tmp")
+    write_parquet(table, tmp_path, pq_cfg)
+    os.replace(tmp_path, path_latest)
+
+
 # 根据品种代号，获取交易所，交易品种名称
 def get_exchange_symbol_cn(dict, a):
     value = dict.get(a, (None, None))  # 默认值可自定义
@@ -77,5 +132,27 @@ def load_para_config(file=r'./utils/para_config.toml'):
         "pwd": conf["credentials"]["password"],
         "temp": Path(conf["paths"]["path_temp"]),
         "historical": Path(conf["paths"]["path_historical"]),
-        "latest": Path(conf["paths"]["path_latest"])
+        "latest": Path(conf["paths"]["path_latest"]),
+        "dataset": Path(conf["paths"]["path_dataset"]),
+        "roll": Path(conf["paths"]["path_roll"]),
+        "roll_history": conf["roll"]["history"],
+        "parquet": conf["parquet"],
+        "rows_per_group": conf["dataset"]["rows_per_group"],
+        "mode": conf["update"]["mode"],
+        "compact_every": conf["update"]["compact_every"],
+        "concurrency": conf["download"]["concurrency"],
+        "queue_size": conf["download"]["queue_size"],
+        "workers": conf["download"]["workers"],
+        "minute": {
+            "enabled": conf["minute"]["enabled"],
+            "bars": conf["minute"]["bars"],
+            "temp": Path(conf["minute"]["path_temp"]),
+            "dataset": Path(conf["minute"]["path_dataset"]),
+            "rows_per_group": conf["minute"]["rows_per_group"],
+        }
     }
+
+
+# 按配置文件里的参数写parquet文件
+def write_parquet(table: pa.Table, path, pq_cfg: dict):
+    pq.write_table(table, path, **pq_cfg)
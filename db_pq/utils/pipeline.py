@@ -0,0 +1,111 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import tqsdk
+from .methods import format_kline, clean_kline, write_parquet
+
+
+# 下载流水线分三段，网络等待和压缩写文件的时间互相重叠：
+# 1. 协程并发请求K线，同时在途的请求数由 concurrency 限制
+# 2. 下载完的K线放进长度为 queue_size 的队列，写入跟不上时下载会暂停等待，内存占用有上限
+# 3. workers 个线程做pandas整理和parquet压缩写入（zstd压缩和pyarrow写文件时会释放GIL）
+#
+# 数据源需要提供两个方法：
+#   kline(symbol_name, n, duration)：协程，返回 format_kline 格式的K线，duration 为K线周期（秒）
+#   run(coro)：在数据源自己的事件循环里运行协程，返回协程的结果
+
+
+# 天勤数据源：协程在天勤api的事件循环里运行，get_kline_serial 在协程中调用时立即返回，
+# 数据到齐前用 register_update_notify 等待，期间其他品种的请求同时进行
+class TqKlineSource:
+    def __init__(self, api: tqsdk.TqApi):
+        self.api = api
+
+    async def kline(self, symbol_name, n, duration=60 * 60 * 24):
+        kline_data = self.api.get_kline_serial(symbol_name, duration, data_length=n)
+        async with self.api.register_update_notify(kline_data) as update_chan:
+            while not self.api.is_serial_ready(kline_data):
+                await update_chan.recv()
+        return format_kline(kline_data)
+
+    def run(self, coro):
+        task = self.api.create_task(coro)
+        while not task.done():
+            self.api.wait_update()
+        return task.result()
+
+
+# 本地模拟数据源，配合 fake_api.FakeTqApi 使用
+class FakeKlineSource:
+    def __init__(self, api):
+        self.api = api
+
+    async def kline(self, symbol_name, n, duration=60 * 60 * 24):
+        return format_kline(await self.api.get_kline_serial_async(symbol_name, duration, data_length=n))
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+
+# 一个品种的整理和写入，在线程池里执行
+def _write_temp(df_latest_kline: pd.DataFrame, exchange_cn, symbol_cn, path_temp, pq_cfg: dict, minute: bool):
+    path_temp_pq = os.path.join(path_temp, f"{symbol_cn}.parquet")
+    write_parquet(clean_kline(df_latest_kline, exchange_cn, symbol_cn, minute), path_temp_pq, pq_cfg)
+    return symbol_cn
+
+
+async def _pipeline(source, tasks: list, cfg: dict, n: int, duration: int, path_temp) -> list:
+    minute = duration < 60 * 60 * 24
+    name = 'K线' if minute else '日K线'
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=cfg['queue_size'])
+    semaphore = asyncio.Semaphore(cfg['concurrency'])
+    done = []
+
+    async def fetch(symbol_name, exchange_cn, symbol_cn):
+        async with semaphore:
+            try:
+                df = await source.kline(symbol_name, n, duration)
+            except Exception as e:
+                print(f"❌ {symbol_cn} -> {name}下载失败：{e}", flush=True)
+                return
+        await queue.put((df, exchange_cn, symbol_cn))
+
+    async def produce():
+        await asyncio.gather(*(fetch(*task) for task in tasks))
+        await queue.put(None)
+
+    # 线程池里同时最多 workers 个品种，线程都忙时不再从队列取数据，队列满了下载就会暂停
+    async def consume(pool):
+        pending = set()
+        while (item := await queue.get()) is not None:
+            if len(pending) >= cfg['workers']:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            df, exchange_cn, symbol_cn = item
+            future = loop.run_in_executor(pool, _write_temp, df, exchange_cn, symbol_cn, path_temp, cfg['parquet'], minute)
+            future.add_done_callback(lambda f, cn=symbol_cn: report(f, cn))
+            pending.add(future)
+        if pending:
+            await asyncio.wait(pending)
+
+    def report(future, symbol_cn):
+        if future.exception() is not None:
+            print(f"❌ {symbol_cn} -> {name}写入失败：{future.exception()}", flush=True)
+            return
+        done.append(symbol_cn)
+        print(f"{len(done):>2}: {symbol_cn} -> {name}数据已下载", flush=True)
+
+    with ThreadPoolExecutor(max_workers=cfg['workers']) as pool:
+        await asyncio.gather(produce(), consume(pool))
+    return done
+
+
+# 下载所有品种的K线，整理后写入临时文件夹，返回成功写入的品种名称
+# tasks：[(合约代码, 交易所名称, 品种名称)]
+# 默认下载 cfg['days'] 根日K线写入 cfg['temp']；分钟K线传入 n、duration（秒）和临时文件夹 path_temp
+def download_to_temp(source, tasks: list, cfg: dict, n: int = None, duration: int = 60 * 60 * 24, path_temp=None) -> list:
+    n = cfg['days'] if n is None else n
+    path_temp = cfg['temp'] if path_temp is None else path_temp
+    os.makedirs(path_temp, exist_ok=True)
+    return source.run(_pipeline(source, tasks, cfg, n, duration, path_temp))
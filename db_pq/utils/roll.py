@@ -0,0 +1,140 @@
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .dataset import atomic_write_table
+
+
+# 换月索引：主连K线由不同的标的合约拼接而成，换月时价格会跳空
+# 每个品种一个很小的parquet文件，放在 latest 旁边的 roll 文件夹里：roll/螺纹钢主连.parquet，每次换月一行：
+#   交易日期：新合约作为主力的第一个交易日
+#   旧合约、新合约，旧合约收盘价、新合约收盘价：换月前一个交易日两个合约的收盘价
+#   比例 = 新合约收盘价 / 旧合约收盘价，价差 = 新合约收盘价 - 旧合约收盘价
+#   前复权因子：乘到 上一次换月 ~ 这次换月前一天 的K线上，历史价格和最新的合约衔接（最后一次换月之后为1）
+#   后复权因子：乘到 这次换月 ~ 下一次换月前一天 的K线上，价格和最早的合约衔接（第一次换月之前为1）
+ROLL_COLUMNS = ['交易日期', '旧合约', '新合约', '旧合约收盘价', '新合约收盘价', '比例', '价差', '前复权因子', '后复权因子']
+
+
+# 从每个交易日的标的合约里找出换月：标的合约和前一个交易日不同的日期，返回 [(下标, 旧合约, 新合约)]
+# 还没有上市的日期标的合约是空字符串，不算换月
+def detect_rolls(contracts) -> list:
+    contracts = np.asarray(contracts, dtype=object)
+    changed = np.flatnonzero((contracts[1:] != contracts[:-1]) & (contracts[:-1] != '') & (contracts[1:] != '')) + 1
+    return [(i, contracts[i - 1], contracts[i]) for i in changed]
+
+
+# 由每次换月的比例计算累积的复权因子
+def roll_factors(ratio: np.ndarray) -> tuple:
+    ratio = np.asarray(ratio, dtype='float64')
+    forward = np.cumprod(ratio[::-1])[::-1]
+    backward = 1 / np.cumprod(ratio)
+    return forward, backward
+
+
+def read_roll_index(path) -> pd.DataFrame:
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ROLL_COLUMNS)
+    return pq.read_table(path).to_pandas()
+
+
+# 写入换月索引：按交易日期排序，重新计算比例、价差和累积的复权因子，原子写入
+def write_roll_index(df: pd.DataFrame, path, pq_cfg: dict):
+    df = df.sort_values('交易日期').reset_index(drop=True)
+    df['比例'] = df['新合约收盘价'] / df['旧合约收盘价']
+    df['价差'] = df['新合约收盘价'] - df['旧合约收盘价']
+    df['前复权因子'], df['后复权因子'] = roll_factors(df['比例'].to_numpy())
+
+    schema = pa.schema([('交易日期', pa.date32()), ('旧合约', pa.string()), ('新合约', pa.string())] +
+                       [(name, pa.float64()) for name in ROLL_COLUMNS[3:]])
+    table = pa.Table.from_pandas(df[ROLL_COLUMNS], schema=schema, preserve_index=False)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    atomic_write_table(table, path, pq_cfg)
+
+
+# 并发下载换月用到的合约日K线：lengths 为 {合约: 需要的K线根数}，返回 {合约: 日K线}，下载失败的为None
+# 和 pipeline.download_to_temp 一样用数据源的协程并发请求，同时在途的请求数由 concurrency 限制
+# 同一个合约（上一次换月的新合约就是这一次的旧合约）只下载一次，根数取需要的最大值
+async def _fetch_contracts(source, lengths: dict, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(contract, n):
+        async with semaphore:
+            try:
+                return contract, await source.kline(contract, n)
+            except Exception as e:
+                print(f"❌ {contract} -> 日K线下载失败：{e}", flush=True)
+                return contract, None
+
+    return dict(await asyncio.gather(*(fetch(contract, n) for contract, n in lengths.items())))
+
+
+# 合约在某个交易日的收盘价，df 为 _fetch_contracts 下载的日K线
+def _close_on(df: pd.DataFrame, date):
+    if df is None:
+        return None
+    df = df[df['candle_begin_time_GMT8'].dt.normalize() == pd.Timestamp(date)]
+    return None if df.empty else float(df['close'].iloc[-1])
+
+
+def _roll_path(cfg: dict, symbol_cn: str):
+    return os.path.join(cfg['roll'], f"{symbol_cn}.parquet")
+
+
+# 更新所有品种的换月索引：一次查询最近 n 个交易日每个主连的标的合约，找出换月，
+# 并发下载换月前一天新旧两个合约的收盘价，追加到索引里。只有发生换月的品种才会改写文件
+# 每天的更新只检查最近 cfg['days'] 个交易日；全部历史的换月由 main_build_roll.py 一次性回补（n=cfg['roll_history']）
+# source：pipeline 的数据源（TqKlineSource、FakeKlineSource），标的合约用 source.api 查询
+# tasks：[(主连合约代码, 交易所名称, 品种名称)]
+def update_roll_index(source, tasks: list, cfg: dict, n: int = None) -> int:
+    n = cfg['days'] if n is None else n
+    df_cont = source.api.query_his_cont_quotes([task[0] for task in tasks], n=n)
+    dates = pd.to_datetime(df_cont['date']).dt.normalize()
+
+    # 先找出所有品种的新换月，以及每个合约需要下载到哪一天
+    pending, lengths, missing = [], {}, []
+    for symbol_name, exchange_cn, symbol_cn in tasks:
+        if symbol_name not in df_cont:
+            continue
+        path = _roll_path(cfg, symbol_cn)
+        if not os.path.exists(path):
+            missing.append(symbol_cn)
+        df_index = read_roll_index(path)
+        known = set(pd.to_datetime(df_index['交易日期']))
+        rolls = [(i, old, new) for i, old, new in detect_rolls(df_cont[symbol_name].fillna('').to_numpy())
+                 if dates[i] not in known]
+        if not rolls:
+            continue
+        for i, old, new in rolls:
+            # 请求的K线根数要覆盖到换月前一天
+            length = len(dates) - i + 10
+            for contract in (old, new):
+                lengths[contract] = max(lengths.get(contract, 0), length)
+        pending.append((symbol_cn, path, df_index, rolls))
+
+    klines = source.run(_fetch_contracts(source, lengths, cfg['concurrency'])) if lengths else {}
+
+    updated = 0
+    for symbol_cn, path, df_index, rolls in pending:
+        rows = []
+        for i, old, new in rolls:
+            old_close, new_close = _close_on(klines.get(old), dates[i - 1]), _close_on(klines.get(new), dates[i - 1])
+            if old_close is None or new_close is None or old_close == 0:
+                print(f"❌ {symbol_cn} -> {dates[i].date()} 换月 {old} -> {new} 缺少换月前一天的收盘价，跳过")
+                continue
+            rows.append({'交易日期': dates[i].date(), '旧合约': old, '新合约': new,
+                         '旧合约收盘价': old_close, '新合约收盘价': new_close})
+
+        if rows:
+            df_new = pd.DataFrame(rows)
+            df_index = df_new if df_index.empty else pd.concat([df_index, df_new], ignore_index=True)
+            write_roll_index(df_index, path, cfg['parquet'])
+            updated += 1
+            switches = ', '.join(f"{r['旧合约']}->{r['新合约']}" for r in rows)
+            print(f"{symbol_cn[:12]} -> 新增换月{len(rows)}次：{switches}")
+
+    if missing and n < cfg['roll_history']:
+        print(f"❌ {len(missing)}个品种还没有换月索引（{'、'.join(missing[:5])}等），"
+              f"只记录了最近{n}个交易日的换月，请运行 main_build_roll.py 回补全部历史")
+    return updated